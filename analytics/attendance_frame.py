@@ -0,0 +1,222 @@
+import numpy as np
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from utils import database_manager as db
+from utils import metrics
+
+STATUSES = ['on_time', 'late', 'incomplete']
+PERIODS = ('day', 'week', 'month')
+
+def _parse_times(values: List[Optional[str]]):
+    """Vectorized 'HH:MM:SS' -> seconds since midnight. Returns (seconds, valid_mask)."""
+    valid = np.array([v is not None and len(v) == 8 for v in values], dtype=bool)
+    text = np.array([v if ok else '00:00:00' for v, ok in zip(values, valid)], dtype='U8')
+    digits = text.view(np.uint32).reshape(-1, 8).astype(np.int32) - ord('0')
+    seconds = (digits[:, 0] * 10 + digits[:, 1]) * 3600 + (digits[:, 3] * 10 + digits[:, 4]) * 60 + digits[:, 6] * 10 + digits[:, 7]
+    return np.where(valid, seconds, -1).astype(np.int32), valid
+
+def _seconds(hhmmss: str) -> int:
+    h, m, s = (int(x) for x in hhmmss.split(':'))
+    return h * 3600 + m * 60 + s
+
+def valid_dates(*dates: Optional[str]) -> bool:
+    """Whether every given date is a YYYY-MM-DD string (None means unbounded)."""
+    for date_str in dates:
+        if date_str is None:
+            continue
+        try:
+            datetime.strptime(date_str, "%Y-%m-%d")
+        except ValueError:
+            return False
+    return True
+
+def _day_number(date_str: str) -> int:
+    return int(np.datetime64(date_str, 'D').astype(np.int32))
+
+class AttendanceFrame:
+    """
+    Columnar attendance table for long-range HR analytics.
+    Persons, departments and statuses are categorical int codes, dates are int32
+    day numbers (days since 1970-01-01) and times are int32 seconds since midnight
+    (-1 when missing). All reports are grouped reductions over these arrays.
+    """
+    def __init__(self, records: List[Dict], person_lookup: Dict[str, Dict], settings: Dict):
+        self.person_ids = np.array(sorted(person_lookup), dtype=str)
+        self.departments = np.array(sorted({p['department'] or 'Unknown' for p in person_lookup.values()} | {'Unknown'}), dtype=str)
+        self.late_threshold = _seconds(settings.get('late_threshold', '09:00:00'))
+
+        person_index = {pid: i for i, pid in enumerate(self.person_ids)}
+        dept_index = {d: i for i, d in enumerate(self.departments)}
+        # Department of each person code; unknown persons get their own extra code
+        self.person_dept = np.array(
+            [dept_index[person_lookup[pid]['department'] or 'Unknown'] for pid in self.person_ids] + [dept_index['Unknown']],
+            dtype=np.int16
+        )
+        unknown_person = len(self.person_ids)
+
+        self.person = np.array([person_index.get(r['person_id'], unknown_person) for r in records], dtype=np.int32)
+        self.dept = self.person_dept[self.person]
+        self.day = np.array([r['date'] for r in records], dtype='datetime64[D]').astype(np.int32)
+        status_index = {s: i for i, s in enumerate(STATUSES)}
+        self.status = np.array([status_index.get(r['status'], len(STATUSES)) for r in records], dtype=np.int8)
+        self.check_in, self.has_check_in = _parse_times([r['check_in'] for r in records])
+        self.check_out, self.has_check_out = _parse_times([r['check_out'] for r in records])
+
+    def __len__(self):
+        return len(self.day)
+
+    @classmethod
+    def from_database(cls):
+        database = db.load_database()
+        lookup = {p['id']: {"name": p['name'], "department": p['department']} for p in database['persons']}
+        return cls(database['attendance'], lookup, database['settings'])
+
+    def _mask(self, start_date: Optional[str], end_date: Optional[str], department: Optional[str] = None):
+        mask = np.ones(len(self), dtype=bool)
+        if start_date:
+            mask &= self.day >= _day_number(start_date)
+        if end_date:
+            mask &= self.day <= _day_number(end_date)
+        if department:
+            codes = np.flatnonzero(self.departments == department)
+            mask &= self.dept == (codes[0] if len(codes) else -1)
+        return mask
+
+    def _period_codes(self, days: np.ndarray, period: str):
+        """Map day numbers to period numbers and a function giving each period's first day."""
+        if period == 'day':
+            return days, lambda p: np.datetime64(int(p), 'D')
+        if period == 'week':
+            # Day 0 (1970-01-01) is a Thursday; shift so weeks start on Monday
+            return (days + 3) // 7, lambda p: np.datetime64(int(p) * 7 - 3, 'D')
+        if period == 'month':
+            months = days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int32)
+            return months, lambda p: np.datetime64(int(p), 'M').astype('datetime64[D]')
+        raise ValueError(f"Unknown period: {period}")
+
+    def late_trends(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                    period: str = 'week') -> Dict:
+        """Late arrivals and late rate per department per period."""
+        mask = self._mask(start_date, end_date)
+        if not mask.any():
+            return {"periods": [], "departments": {}}
+
+        periods, period_start = self._period_codes(self.day[mask], period)
+        base = periods.min()
+        n_periods = int(periods.max() - base + 1)
+        n_depts = len(self.departments)
+
+        group = (periods - base) * n_depts + self.dept[mask]
+        size = n_periods * n_depts
+        present = np.bincount(group, minlength=size).reshape(n_periods, n_depts)
+        late = np.bincount(group, weights=self.status[mask] == 1, minlength=size).reshape(n_periods, n_depts)
+        rate = np.divide(late, present, out=np.zeros_like(late), where=present > 0)
+
+        departments = {}
+        for d, name in enumerate(self.departments):
+            if present[:, d].any():
+                departments[str(name)] = {
+                    "present": present[:, d].tolist(),
+                    "late": late[:, d].astype(int).tolist(),
+                    "late_rate": np.round(rate[:, d], 4).tolist()
+                }
+        return {
+            "period": period,
+            "periods": [str(period_start(base + i)) for i in range(n_periods)],
+            "departments": departments
+        }
+
+    def weekly_rates(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                     department: Optional[str] = None) -> List[Dict]:
+        """Week-by-week on-time and late rates with week-over-week change."""
+        mask = self._mask(start_date, end_date, department)
+        if not mask.any():
+            return []
+
+        weeks, week_start = self._period_codes(self.day[mask], 'week')
+        base = weeks.min()
+        n_weeks = int(weeks.max() - base + 1)
+        index = weeks - base
+        present = np.bincount(index, minlength=n_weeks)
+        status = self.status[mask]
+        late = np.bincount(index, weights=status == 1, minlength=n_weeks)
+        on_time = np.bincount(index, weights=status == 0, minlength=n_weeks)
+        late_rate = np.divide(late, present, out=np.zeros(n_weeks), where=present > 0)
+        on_time_rate = np.divide(on_time, present, out=np.zeros(n_weeks), where=present > 0)
+        change = np.concatenate([[np.nan], np.diff(late_rate)])
+
+        return [
+            {
+                "week_start": str(week_start(base + i)),
+                "present": int(present[i]),
+                "late": int(late[i]),
+                "on_time": int(on_time[i]),
+                "late_rate": round(float(late_rate[i]), 4),
+                "on_time_rate": round(float(on_time_rate[i]), 4),
+                "late_rate_change": None if i == 0 or present[i - 1] == 0 else round(float(change[i]), 4)
+            }
+            for i in range(n_weeks) if present[i] > 0
+        ]
+
+    def punctuality(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                    department: Optional[str] = None) -> List[Dict]:
+        """Per-person punctuality: late rate, mean/stddev arrival time and minutes late, most punctual first."""
+        mask = self._mask(start_date, end_date, department)
+        n = len(self.person_ids) + 1
+        person = self.person[mask]
+        arrived = self.has_check_in[mask]
+        arrival = self.check_in[mask].astype(np.float64)
+        stayed = arrived & self.has_check_out[mask]
+
+        present = np.bincount(person, minlength=n)
+        late = np.bincount(person, weights=self.status[mask] == 1, minlength=n)
+        arrivals = np.bincount(person, weights=arrived, minlength=n)
+        arrival_sum = np.bincount(person, weights=np.where(arrived, arrival, 0), minlength=n)
+        arrival_sq = np.bincount(person, weights=np.where(arrived, arrival ** 2, 0), minlength=n)
+        lateness = np.bincount(person, weights=np.where(arrived, np.maximum(arrival - self.late_threshold, 0), 0), minlength=n)
+        hours_n = np.bincount(person, weights=stayed, minlength=n)
+        hours_sum = np.bincount(person, weights=np.where(stayed, self.check_out[mask] - arrival, 0), minlength=n)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_arrival = arrival_sum / arrivals
+            std_arrival = np.sqrt(np.maximum(arrival_sq / arrivals - mean_arrival ** 2, 0))
+            late_rate = late / present
+            mean_late_minutes = lateness / np.maximum(late, 1) / 60
+            mean_hours = hours_sum / hours_n / 3600
+
+        report = []
+        for i in np.flatnonzero(present[:-1] > 0):
+            report.append({
+                "person_id": str(self.person_ids[i]),
+                "department": str(self.departments[self.person_dept[i]]),
+                "days_present": int(present[i]),
+                "late_count": int(late[i]),
+                "late_rate": round(float(late_rate[i]), 4),
+                "mean_check_in": _format_seconds(mean_arrival[i]),
+                "check_in_stddev_minutes": None if arrivals[i] == 0 else round(float(std_arrival[i]) / 60, 2),
+                "mean_minutes_late": round(float(mean_late_minutes[i]), 2),
+                "mean_hours_worked": None if hours_n[i] == 0 else round(float(mean_hours[i]), 2)
+            })
+        return sorted(report, key=lambda r: (r['late_rate'], r['mean_check_in'] or ''))
+
+def _format_seconds(value) -> Optional[str]:
+    if not np.isfinite(value):
+        return None
+    value = int(round(value))
+    return f"{value // 3600:02d}:{value % 3600 // 60:02d}:{value % 60:02d}"
+
+# Frame shared by all requests until the database version changes
+_frame = None
+_frame_version = None
+
+def get_frame() -> AttendanceFrame:
+    """Get the columnar frame for the current database version."""
+    global _frame, _frame_version
+    version = db.get_version()
+    stale = _frame is None or version != _frame_version
+    metrics.cache_lookup('attendance_frame', not stale)
+    if stale:
+        _frame = AttendanceFrame.from_database()
+        _frame_version = version
+    return _frame
@@ -0,0 +1,571 @@
+"""
+Async entry point for the IDentix API.
+
+Serves the same /api/* contract as server.py. Uploads are read on the event
+loop, database access runs in the thread pool, and face detection/embedding
+and MFCC extraction run in a bounded process pool whose workers preload the
+models (feature_extraction/worker_pool.py). Throughput under concurrent kiosk
+load therefore scales with cores instead of being serialized behind one
+worker thread per slow DeepFace call.
+
+Run with:
+    uvicorn asgi_server:app --host 0.0.0.0 --port 5001
+"""
+
+import asyncio
+import io
+import os
+import sys
+import time
+import zipfile
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import FastAPI, File, Form, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+
+# Add project root to path to import existing modules
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from analytics.attendance_frame import PERIODS, get_frame, valid_dates
+from feature_extraction import worker_pool
+from pipeline import batch, bulk_import, jobs
+from pipeline.admission import DEADLINE_HEADER, Deadline, DeadlineExceeded, Overloaded
+from fusion.fusion_config import load_fusion_config
+from fusion.fusion_engine import FusionEngine
+from models.gallery import get_gallery
+from pipeline.verification import (
+    AdminMatch, AttendancePersist, FaceOnlyDecision, FeatureFileMatch, GalleryMatch,
+    VerificationPipeline, WeightedFusion
+)
+from utils import database_manager as db
+from utils import metrics, profiling, serialization
+from utils.attendance_export import gzip_stream, iter_attendance_csv
+from utils.pagination import decode_cursor, etag_matches, make_etag, paginate, parse_fields, parse_limit, project
+
+# --- Configuration ---
+FEATURE_DIR = 'data/features'
+FACE_FEAT_PATH = os.path.join(FEATURE_DIR, "face_embeddings.npy")
+VOICE_FEAT_PATH = os.path.join(FEATURE_DIR, "voice_mfccs.npy")
+FACE_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+VOICE_EXTENSIONS = {'wav', 'mp3'}
+# Face-only threshold of the admin login
+ADMIN_THRESHOLD = 0.7
+
+# Initialize Fusion Engine with the latest calibrated weights and threshold (fusion/calibration.py)
+fusion_config = load_fusion_config()
+fusion_engine = FusionEngine(face_weight=fusion_config['face_weight'], voice_weight=fusion_config['voice_weight'])
+DECISION_THRESHOLD = fusion_config['threshold']
+
+# --- Verification Pipelines (see pipeline/verification.py) ---
+verify_pipeline = VerificationPipeline(
+    match=FeatureFileMatch(FACE_FEAT_PATH, VOICE_FEAT_PATH, matcher=fusion_engine.matcher),
+    fuse=WeightedFusion(fusion_engine, DECISION_THRESHOLD),
+    executor=worker_pool.get_executor(),
+    admission=worker_pool.get_admission(),
+    name='verify'
+)
+admin_pipeline = VerificationPipeline(
+    match=AdminMatch(),
+    fuse=FaceOnlyDecision(ADMIN_THRESHOLD),
+    executor=worker_pool.get_executor(),
+    admission=worker_pool.get_admission(),
+    name='admin'
+)
+attendance_pipelines = {
+    action: VerificationPipeline(
+        match=GalleryMatch(fusion_config['normalization']),
+        fuse=WeightedFusion(fusion_engine, DECISION_THRESHOLD, require_identity=True),
+        persist=AttendancePersist(action),
+        executor=worker_pool.get_executor(),
+        admission=worker_pool.get_admission(),
+        name=action
+    )
+    for action in ("checkin", "checkout")
+}
+
+@asynccontextmanager
+async def lifespan(app):
+    # Start every worker now so model loading happens before the first request
+    executor = worker_pool.get_executor()
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*[loop.run_in_executor(executor, os.getpid) for _ in range(worker_pool.MAX_WORKERS)])
+    # Build the gallery up front, so neither the first check-in nor the first metrics scrape loads it
+    await run_in_threadpool(get_gallery)
+    yield
+    worker_pool.shutdown_executor()
+
+class FastJSONResponse(JSONResponse):
+    """JSON responses through utils/serialization (orjson when installed)."""
+    def render(self, content) -> bytes:
+        return serialization.dumps(content)
+
+app = FastAPI(title="IDentix API", lifespan=lifespan, default_response_class=FastJSONResponse)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"],
+                   expose_headers=["Retry-After", "Location", "X-Profile-Id"])
+
+@app.middleware('http')
+async def record_request_metrics(request: Request, call_next):
+    metrics.HTTP_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    # Clients may send their remaining time budget; the clock starts on arrival, before the upload is read
+    request.state.deadline = Deadline.from_header(request.headers.get(DEADLINE_HEADER))
+    # Opt-in per request (admin token header) or sampled 1-in-N; see utils/profiling.py.
+    # Handlers share the event loop and a thread pool, so the sampling profiler watches every thread.
+    profile = profiling.begin(request.method, request.url.path, request.headers.get(profiling.PROFILE_HEADER),
+                              request.headers.get(profiling.MODE_HEADER), all_threads=True)
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        if profile is not None:
+            profile_id, profile = profile.stop(status), None
+            if profile_id:
+                response.headers['X-Profile-Id'] = profile_id
+        return response
+    finally:
+        if profile is not None:
+            profile.stop(None)
+        metrics.HTTP_IN_FLIGHT.dec()
+        # Label by route pattern, not raw path, to keep the series count bounded
+        route = request.scope.get('route')
+        endpoint = route.path if route else 'unmatched'
+        metrics.HTTP_REQUESTS.inc(method=request.method, endpoint=endpoint, status=status)
+        metrics.HTTP_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+
+def error(message, status_code):
+    return FastJSONResponse({"error": message}, status_code=status_code)
+
+@app.exception_handler(Overloaded)
+async def handle_overloaded(request: Request, exc: Overloaded):
+    return FastJSONResponse({"error": "Server busy, please retry"}, status_code=503,
+                        headers={"Retry-After": str(exc.retry_after)})
+
+@app.exception_handler(DeadlineExceeded)
+async def handle_deadline_exceeded(request: Request, exc: DeadlineExceeded):
+    return FastJSONResponse({"error": "Request deadline exceeded"}, status_code=503,
+                        headers={"Retry-After": str(worker_pool.get_admission().retry_after())})
+
+def allowed_file(upload: Optional[UploadFile], extensions):
+    filename = upload.filename if upload else None
+    return bool(filename) and '.' in filename and filename.rsplit('.', 1)[1].lower() in extensions
+
+async def upload_args(face: Optional[UploadFile], voice: Optional[UploadFile]):
+    """
+    Pipeline inputs (face_data, voice_data, voice_suffix) from uploaded files.
+    Unsupported formats are ignored, as if not sent.
+    """
+    face_data = await face.read() if allowed_file(face, FACE_EXTENSIONS) else None
+    voice_data = await voice.read() if allowed_file(voice, VOICE_EXTENSIONS) else None
+    voice_suffix = '.' + voice.filename.rsplit('.', 1)[1].lower() if voice_data is not None else '.wav'
+    return face_data, voice_data, voice_suffix
+
+def wants_timings(request: Request):
+    """Per-stage timings are returned when asked for with ?timings=1 or an X-Timings: 1 header."""
+    value = request.query_params.get('timings') or request.headers.get('x-timings') or ''
+    return value.lower() in ('1', 'true', 'yes')
+
+def with_timings(request: Request, payload, result):
+    if wants_timings(request):
+        payload['timings'] = result['timings']
+    return payload
+
+def page_args(request: Request, key_types):
+    """
+    Read limit/cursor/fields query args; key_types are the types of the endpoint's sort key.
+    Raises ValueError on bad input.
+    """
+    limit = parse_limit(request.query_params.get('limit'))
+    cursor = request.query_params.get('cursor')
+    if cursor:
+        decode_cursor(cursor, key_types)
+    return limit, cursor, parse_fields(request.query_params.get('fields'))
+
+def request_path(request: Request):
+    query = request.url.query
+    return f"{request.url.path}?{query}"
+
+def conditional_json(request: Request, etag, build_payload):
+    """
+    Answer 304 if the client already holds this ETag, otherwise build and send the payload.
+    The payload is only built when it is actually needed.
+    """
+    headers = {"ETag": f'"{etag}"'}
+    hit = etag_matches(request.headers.get('if-none-match'), etag)
+    metrics.cache_lookup('http_etag', hit)
+    if hit:
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(build_payload(), headers=headers)
+
+@app.get('/api/metrics')
+def get_metrics():
+    """Prometheus scrape endpoint."""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get('/api/profiles')
+def get_profiles(request: Request):
+    """Recent request profiles (admin: needs the profiling token in X-Profile)."""
+    if not profiling.authorized(request.headers.get(profiling.PROFILE_HEADER)):
+        return error("Profiling token required", 403)
+    return {"profiles": profiling.list_profiles()}
+
+@app.get('/api/profiles/{name}')
+def download_profile(request: Request, name: str):
+    """One stored profile file: <id>.json (summary and stage timeline), <id>.prof or <id>.folded."""
+    if not profiling.authorized(request.headers.get(profiling.PROFILE_HEADER)):
+        return error("Profiling token required", 403)
+    path = profiling.profile_file(name)
+    if path is None:
+        return error("Profile not found", 404)
+    return FileResponse(path, filename=name)
+
+@app.get('/api/health')
+def health_check():
+    """
+    Check if the server and database are ready.
+    """
+    face_status = os.path.exists(FACE_FEAT_PATH)
+    voice_status = os.path.exists(VOICE_FEAT_PATH)
+    return {
+        "status": "online",
+        "database": {
+            "face": "loaded" if face_status else "missing",
+            "voice": "loaded" if voice_status else "missing"
+        },
+        "workers": worker_pool.MAX_WORKERS,
+        "fusion": {key: fusion_config[key] for key in ("version", "face_weight", "voice_weight", "threshold", "normalization")}
+    }
+
+@app.post('/api/verify')
+async def verify_identity(request: Request, face: Optional[UploadFile] = File(None),
+                          voice: Optional[UploadFile] = File(None)):
+    """
+    Main verification endpoint.
+    Expects 'face' and/or 'voice' files in the POST request.
+    """
+    if not face and not voice:
+        return error("No biometric data provided", 400)
+
+    # Both modalities run in parallel on separate pool workers
+    result = await verify_pipeline.run_async(*await upload_args(face, voice), deadline=request.state.deadline)
+
+    return with_timings(request, {
+        "verified": result['verified'],
+        # Identity of the best gallery row, when the feature gallery has an identity file
+        "identity": result['person_id'],
+        "scores": result['scores'],
+        "threshold": result['threshold']
+    }, result)
+
+@app.post('/api/verify/batch')
+async def verify_batch(archive: Optional[UploadFile] = File(None), files: Optional[List[UploadFile]] = File(None),
+                       manifest: Optional[UploadFile] = File(None)):
+    """
+    Verify many probes in one request for audits; results stream back as NDJSON, one line per probe.
+    Send either an 'archive' zip, or the probe files as 'files' plus an optional 'manifest' CSV
+    (see pipeline/batch.py for naming).
+    """
+    if archive:
+        try:
+            probes, read = batch.open_zip(io.BytesIO(await archive.read()))
+        except zipfile.BadZipFile:
+            return error("Invalid zip archive", 400)
+    else:
+        uploads = {f.filename: await f.read() for f in files or [] if f.filename}
+        claims = batch.read_manifest((await manifest.read()).decode('utf-8-sig')) if manifest else {}
+        probes = batch.collect_probes(uploads, claims)
+        read = uploads.__getitem__
+
+    if not probes:
+        return error("No probe files found", 400)
+
+    # Half the workers at most, so live check-ins are never stuck behind an audit
+    results = batch.verify_batch(probes, read, fusion_engine, DECISION_THRESHOLD, executor=worker_pool.get_executor(),
+                                 window=batch.server_window(worker_pool.MAX_WORKERS),
+                                 normalization=fusion_config['normalization'])
+    return StreamingResponse(batch.iter_ndjson(batch.summarize(results)), media_type='application/x-ndjson')
+
+# ============ ADMIN ENDPOINTS ============
+
+@app.post('/api/admin/login')
+async def admin_login(request: Request, face: Optional[UploadFile] = File(None)):
+    """Admin authentication via face recognition."""
+    if not face:
+        return error("No face image provided", 400)
+
+    try:
+        result = await admin_pipeline.run_async(*await upload_args(face, None), deadline=request.state.deadline)
+    except (Overloaded, DeadlineExceeded):
+        raise
+    except Exception as e:
+        print(f"Admin login error: {e}")
+        return error("Authentication failed", 500)
+
+    if result['person_id'] is None:
+        return error("Authentication failed", 401)
+    if not result['verified']:
+        return error("Face does not match admin", 401)
+
+    admin = await run_in_threadpool(db.get_admin)
+    return with_timings(request, {
+        "success": True,
+        "admin": {
+            "id": admin['id'],
+            "name": admin['name']
+        }
+    }, result)
+
+# ============ PERSON MANAGEMENT ENDPOINTS ============
+
+@app.get('/api/persons')
+def get_persons(request: Request, status: Optional[str] = None, department: Optional[str] = None):
+    """Get persons with optional filters, cursor pagination and field projection."""
+    try:
+        limit, cursor, fields = page_args(request, (str,))
+    except ValueError as e:
+        return error(str(e), 400)
+
+    def build():
+        persons = sorted(db.get_all_persons(status=status, department=department), key=lambda p: p['id'])
+        page, next_cursor = paginate(persons, lambda p: (p['id'],), limit, cursor)
+        return {"persons": project(page, fields), "next_cursor": next_cursor, "total": len(persons)}
+
+    return conditional_json(request, make_etag(db.get_version(), request_path(request)), build)
+
+@app.get('/api/persons/{person_id}')
+def get_person(person_id: str):
+    """Get person details."""
+    person = db.get_person(person_id)
+    if not person:
+        return error("Person not found", 404)
+    return person
+
+def enroll_person(loop, person_data, face_data, voice_data, voice_suffix):
+    """Extract enrollment templates and add the person; runs as a background job."""
+    # Extract on the event loop, so jobs and requests share one admission queue
+    probes = asyncio.run_coroutine_threadsafe(
+        verify_pipeline.extract_async(face_data, voice_data, voice_suffix), loop
+    ).result(timeout=jobs.JOB_TIMEOUT)
+    if probes.get('face') is not None:
+        person_data['face_embedding'] = probes['face']
+    if probes.get('voice') is not None:
+        person_data['voice_mfcc'] = probes['voice']
+
+    # Templates are stored before the person record, so the gallery gains the person in one step
+    return db.add_person(person_data)
+
+@app.post('/api/persons', status_code=202)
+async def add_person(
+    request: Request,
+    name: Optional[str] = Form(None),
+    employee_id: Optional[str] = Form(None),
+    date_of_birth: Optional[str] = Form(None),
+    gender: Optional[str] = Form(None),
+    department: Optional[str] = Form(None),
+    email: Optional[str] = Form(None),
+    phone: Optional[str] = Form(None),
+    face: Optional[UploadFile] = File(None),
+    voice: Optional[UploadFile] = File(None)
+):
+    """
+    Register a new person. Returns 202 with an enrollment job to poll at /api/jobs/{id};
+    ?sync=1 waits for the enrollment instead.
+    """
+    person_data = {
+        "name": name,
+        "employee_id": employee_id,
+        "date_of_birth": date_of_birth,
+        "gender": gender,
+        "department": department,
+        "email": email,
+        "phone": phone
+    }
+
+    if request.query_params.get('sync', '').lower() in ('1', 'true', 'yes'):
+        probes = await verify_pipeline.extract_async(*await upload_args(face, voice), deadline=request.state.deadline)
+        if probes.get('face') is not None:
+            person_data['face_embedding'] = probes['face']
+        if probes.get('voice') is not None:
+            person_data['voice_mfcc'] = probes['voice']
+        return FastJSONResponse(await run_in_threadpool(db.add_person, person_data), status_code=201)
+
+    job = await run_in_threadpool(jobs.submit, 'enrollment', enroll_person, asyncio.get_running_loop(),
+                                  person_data, *await upload_args(face, voice))
+    return FastJSONResponse(job, status_code=202, headers={"Location": f"/api/jobs/{job['id']}"})
+
+@app.post('/api/persons/import')
+async def import_persons(archive: Optional[UploadFile] = File(None)):
+    """
+    Bulk-enroll from an 'archive' zip holding manifest.csv plus the face and voice samples
+    (see pipeline/bulk_import.py). Progress streams back as NDJSON, then the result.
+    """
+    if not archive:
+        return error("No archive provided", 400)
+    try:
+        rows, problems, read = bulk_import.open_zip(io.BytesIO(await archive.read()))
+    except zipfile.BadZipFile:
+        return error("Invalid zip archive", 400)
+    except ValueError as e:
+        return error(str(e), 400)
+
+    events = bulk_import.run_import(rows, problems, read, executor=worker_pool.get_executor(),
+                                    window=worker_pool.MAX_WORKERS)
+    return StreamingResponse(batch.iter_ndjson(events), media_type='application/x-ndjson')
+
+@app.get('/api/jobs/{job_id}')
+async def get_job(job_id: str):
+    """Status of a background job: queued, running, succeeded (with result) or failed (with error)."""
+    job = await run_in_threadpool(jobs.get_job, job_id)
+    if not job:
+        return error("Job not found", 404)
+    return job
+
+# ============ ATTENDANCE ENDPOINTS ============
+
+async def identify_and_log(request: Request, action: str, face: Optional[UploadFile], voice: Optional[UploadFile]):
+    """Shared check-in/check-out flow: extract, identify against active persons, fuse, log."""
+    if not face and not voice:
+        return error("No biometric data provided", 400)
+
+    result = await attendance_pipelines[action].run_async(*await upload_args(face, voice), deadline=request.state.deadline)
+
+    if result['verified']:
+        return with_timings(request, {
+            "verified": True,
+            "person": result['persisted']['person'],
+            "attendance": result['persisted']['attendance'],
+            "scores": result['scores']
+        }, result)
+    return FastJSONResponse(with_timings(request, {
+        "verified": False,
+        "message": "No matching person found",
+        "scores": result['scores']
+    }, result), status_code=401)
+
+@app.post('/api/attendance/checkin')
+async def checkin(request: Request, face: Optional[UploadFile] = File(None), voice: Optional[UploadFile] = File(None)):
+    """Check-in with face and/or voice verification."""
+    return await identify_and_log(request, "checkin", face, voice)
+
+@app.post('/api/attendance/checkout')
+async def checkout(request: Request, face: Optional[UploadFile] = File(None), voice: Optional[UploadFile] = File(None)):
+    """Check-out with face and/or voice verification."""
+    return await identify_and_log(request, "checkout", face, voice)
+
+@app.get('/api/attendance/export')
+def export_attendance(start_date: Optional[str] = None, end_date: Optional[str] = None,
+                      department: Optional[str] = None, gzip: Optional[str] = None):
+    """
+    Stream attendance history as CSV, optionally gzip-compressed (?gzip=1).
+    Filters: start_date, end_date, department.
+    """
+    lookup = db.get_person_lookup()
+    person_ids = {pid for pid, p in lookup.items() if p['department'] == department} if department else None
+
+    records = db.iter_attendance(start_date=start_date, end_date=end_date, person_ids=person_ids)
+    body = iter_attendance_csv(records, lookup)
+
+    filename = f'attendance_export_{datetime.now().strftime("%Y%m%d")}.csv'
+    media_type = 'text/csv'
+    if (gzip or '').lower() in ('1', 'true', 'yes'):
+        body = gzip_stream(body)
+        filename += '.gz'
+        media_type = 'application/gzip'
+
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.get('/api/attendance/today')
+def get_today_attendance(request: Request):
+    """Get today's attendance."""
+    today = datetime.now().strftime("%Y-%m-%d")
+
+    def build():
+        records = db.get_attendance_today()
+        lookup = db.get_person_lookup()
+        for record in records:
+            person = lookup.get(record['person_id'])
+            if person:
+                record['person_name'] = person['name']
+                record['department'] = person['department']
+        return {"attendance": records}
+
+    return conditional_json(request, make_etag(db.get_version(), request_path(request), today), build)
+
+@app.get('/api/attendance/history')
+def get_attendance_history(request: Request, person_id: Optional[str] = None,
+                           start_date: Optional[str] = None, end_date: Optional[str] = None):
+    """Get attendance history (newest first) with filters, cursor pagination and field projection."""
+    try:
+        limit, cursor, fields = page_args(request, (str, str, str))
+    except ValueError as e:
+        return error(str(e), 400)
+
+    def build():
+        records = db.get_attendance_history(person_id, start_date, end_date)
+        page, next_cursor = paginate(records, lambda r: (r['date'], r['id'], r['person_id']), limit, cursor, descending=True)
+        return {"attendance": project(page, fields), "next_cursor": next_cursor, "total": len(records)}
+
+    return conditional_json(request, make_etag(db.get_version(), request_path(request)), build)
+
+# ============ ANALYTICS ENDPOINTS ============
+
+@app.get('/api/analytics/overview')
+def get_analytics_overview(request: Request):
+    """Get dashboard overview statistics."""
+    today = datetime.now().strftime("%Y-%m-%d")
+    return conditional_json(request, make_etag(db.get_version(), request_path(request), today), db.get_dashboard_overview)
+
+@app.get('/api/analytics/person/{person_id}')
+def get_person_analytics(person_id: str, start_date: str = '2025-08-01', end_date: str = '2026-02-04'):
+    """Get analytics for a specific person."""
+    if not valid_dates(start_date, end_date):
+        return error("start_date and end_date must be YYYY-MM-DD", 400)
+    return {
+        "stats": db.calculate_attendance_stats(person_id, start_date, end_date),
+        "history": db.get_attendance_history(person_id, start_date, end_date)
+    }
+
+@app.get('/api/analytics/late-trends')
+def get_late_trends(request: Request, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                    period: str = 'week'):
+    """Late arrivals and late rate per department, bucketed by day, week or month."""
+    if period not in PERIODS:
+        return error(f"period must be one of {', '.join(PERIODS)}", 400)
+    if not valid_dates(start_date, end_date):
+        return error("start_date and end_date must be YYYY-MM-DD", 400)
+    return conditional_json(request, make_etag(db.get_version(), request_path(request)),
+                            lambda: get_frame().late_trends(start_date, end_date, period))
+
+@app.get('/api/analytics/weekly-rates')
+def get_weekly_rates(request: Request, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                     department: Optional[str] = None):
+    """Week-over-week on-time and late rates, optionally for one department."""
+    if not valid_dates(start_date, end_date):
+        return error("start_date and end_date must be YYYY-MM-DD", 400)
+    return conditional_json(request, make_etag(db.get_version(), request_path(request)),
+                            lambda: {"weeks": get_frame().weekly_rates(start_date, end_date, department)})
+
+@app.get('/api/analytics/punctuality')
+def get_punctuality(request: Request, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                    department: Optional[str] = None):
+    """Per-person punctuality ranking, optionally for one department."""
+    if not valid_dates(start_date, end_date):
+        return error("start_date and end_date must be YYYY-MM-DD", 400)
+
+    def build():
+        report = get_frame().punctuality(start_date, end_date, department)
+        lookup = db.get_person_lookup()
+        for row in report:
+            row['name'] = lookup.get(row['person_id'], {}).get('name')
+        return {"persons": report}
+
+    return conditional_json(request, make_etag(db.get_version(), request_path(request)), build)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=5001)
@@ -0,0 +1,265 @@
+"""
+Micro-benchmarks of every pipeline stage, at a range of gallery and attendance sizes.
+
+Groups (select with --only):
+    face      detect_and_align_face, extract_face_embeddings (needs deepface)
+    voice     load_and_preprocess_audio, extract_mfcc
+    matcher   BiometricMatcher 1:1, 1:N and batch scoring per gallery size
+    gallery   Gallery.match_face / match_voice (1:N over active persons) per gallery size
+    fusion    FusionEngine fuse_scores, make_decision, normalize_scores
+    database  database_manager reads and writes per attendance size
+
+Inputs are synthetic (random embeddings, a noise image, a tone), so numbers
+measure the code paths, not recognition quality. Gallery sizes whose matrices
+would not fit in memory are skipped and listed as such. Results are saved as
+JSON with the commit they ran on; --compare diffs two result files.
+
+    python -m benchmarks.bench_pipeline --json benchmarks/results/$(git rev-parse --short HEAD).json
+    python -m benchmarks.bench_pipeline --only matcher gallery --gallery-sizes 20 1000 100000
+    python -m benchmarks.bench_pipeline --compare base.json head.json
+"""
+
+import argparse
+import importlib.util
+import os
+import sys
+import tempfile
+import wave
+from typing import Callable, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+# Benchmarks must not publish into the servers' shared-memory gallery
+os.environ.setdefault('IDENTIX_SHARED_GALLERY', '0')
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import harness
+
+GROUPS = ('face', 'voice', 'matcher', 'gallery', 'fusion', 'database')
+GALLERY_SIZES = (20, 100, 1000, 10_000, 100_000)
+ATTENDANCE_SIZES = (10_000, 100_000, 1_000_000)
+FACE_DIM = 2622  # VGG-Face
+VOICE_DIM = 13   # MFCC coefficients
+BATCH_PROBES = 32
+DB_PERSONS = 500
+# Rough in-memory size of one attendance record dict
+RECORD_BYTES = 1200
+
+# A case is (name, fn, repeat); a skipped case is (name, None, reason)
+Case = Tuple[str, Callable, object]
+
+def _random_unit(rng, n: int, dim: int) -> np.ndarray:
+    vectors = rng.normal(size=(n, dim))
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+# ============ CASES ============
+
+def face_cases(args, rng, tmp: str) -> Iterator[Case]:
+    from preprocessing.face_prep import detect_and_align_face
+
+    # Noise has no face, so this times the full cascade scan of a VGA frame
+    image = rng.integers(0, 256, size=(480, 640, 3), dtype=np.uint8)
+    if args.face_image:
+        import cv2
+        image = cv2.imread(args.face_image)
+    yield "face.detect_and_align_face[640x480]", lambda: detect_and_align_face(image), args.repeat
+
+    # Detection and alignment inside the embedder included, as in the pipeline
+    name = "face.extract_face_embeddings[640x480]"
+    if importlib.util.find_spec('deepface') is None:
+        yield name, None, "deepface is not installed"
+        return
+    from feature_extraction.face_features import extract_face_embeddings
+
+    yield name, lambda: extract_face_embeddings(image), args.repeat
+
+def _write_wav(path: str, rng, seconds: float = 4.0, sr: int = 16000) -> None:
+    t = np.arange(int(seconds * sr)) / sr
+    signal = 0.4 * np.sin(2 * np.pi * 220 * t) + 0.05 * rng.normal(size=t.shape)
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sr)
+        f.writeframes((np.clip(signal, -1, 1) * 32767).astype(np.int16).tobytes())
+
+def voice_cases(args, rng, tmp: str) -> Iterator[Case]:
+    from feature_extraction.voice_features import extract_mfcc
+    from preprocessing.voice_prep import load_and_preprocess_audio
+
+    path = os.path.join(tmp, 'probe.wav')
+    _write_wav(path, rng)
+    yield "voice.load_and_preprocess_audio[4s]", lambda: load_and_preprocess_audio(path), args.repeat
+    signal = load_and_preprocess_audio(path)
+    yield "voice.extract_mfcc[3s]", lambda: extract_mfcc(signal), args.repeat
+
+def matcher_cases(args, rng, tmp: str) -> Iterator[Case]:
+    from models.matcher import BiometricMatcher
+
+    matcher = BiometricMatcher()
+    face_probe, voice_probe = _random_unit(rng, 1, args.face_dim)[0], rng.normal(size=VOICE_DIM)
+    yield "matcher.match_face[1:1]", lambda: matcher.match_face(face_probe, face_probe), args.repeat
+    yield "matcher.match_voice[1:1]", lambda: matcher.match_voice(voice_probe, voice_probe), args.repeat
+    face_probes = _random_unit(rng, BATCH_PROBES, args.face_dim)
+    voice_probes = rng.normal(size=(BATCH_PROBES, VOICE_DIM))
+
+    for n in args.gallery_sizes:
+        if not harness.fits_in_memory(n * args.face_dim * 8):
+            for case in ("match_face_gallery", "match_face_batch"):
+                yield f"matcher.{case}[n={n}]", None, "gallery does not fit in memory"
+        else:
+            face = _random_unit(rng, n, args.face_dim)
+            yield f"matcher.match_face_gallery[n={n}]", lambda: matcher.match_face_gallery(face_probe, face), args.repeat
+            yield (f"matcher.match_face_batch[n={n},probes={BATCH_PROBES}]",
+                   lambda: matcher.match_face_batch(face_probes, face), args.repeat)
+            del face
+        voice = rng.normal(size=(n, VOICE_DIM))
+        yield f"matcher.match_voice_gallery[n={n}]", lambda: matcher.match_voice_gallery(voice_probe, voice), args.repeat
+        yield (f"matcher.match_voice_batch[n={n},probes={BATCH_PROBES}]",
+               lambda: matcher.match_voice_batch(voice_probes, voice), args.repeat)
+
+def gallery_cases(args, rng, tmp: str) -> Iterator[Case]:
+    from models.gallery import Gallery
+
+    face_probe, voice_probe = _random_unit(rng, 1, args.face_dim)[0], rng.normal(size=VOICE_DIM)
+    for n in args.gallery_sizes:
+        if not harness.fits_in_memory(n * args.face_dim * 8):
+            yield f"gallery.match_face[n={n}]", None, "gallery does not fit in memory"
+            continue
+        person_ids = np.array([f"P{i:06d}" for i in range(n)])
+        gallery = Gallery({
+            "person_ids": person_ids,
+            "face": _random_unit(rng, n, args.face_dim), "face_mask": np.ones(n, dtype=bool),
+            "voice": rng.normal(size=(n, VOICE_DIM)), "voice_mask": np.ones(n, dtype=bool),
+            "admin_face": np.zeros(0)
+        })
+        # As at check-in: candidates restricted to the active persons (here 90% of them)
+        active = set(person_ids[rng.random(n) < 0.9])
+        # Bound as defaults: the gallery is deleted before the next size is built
+        yield (f"gallery.match_face[n={n}]",
+               lambda g=gallery, a=active: g.match_face(face_probe, a), args.repeat)
+        yield (f"gallery.match_voice[n={n}]",
+               lambda g=gallery, a=active: g.match_voice(voice_probe, a), args.repeat)
+        del gallery
+
+def fusion_cases(args, rng, tmp: str) -> Iterator[Case]:
+    from fusion.fusion_engine import FusionEngine
+
+    engine = FusionEngine()
+    yield "fusion.fuse_scores[scalar]", lambda: engine.fuse_scores(0.8, 0.6), args.repeat
+    yield "fusion.make_decision[scalar]", lambda: engine.make_decision(0.75), args.repeat
+    for n in args.gallery_sizes:
+        face, voice = rng.random(n), rng.random(n)
+        yield f"fusion.fuse_scores[n={n}]", lambda: engine.fuse_scores(face, voice), args.repeat
+        yield f"fusion.normalize_scores[n={n}]", lambda: engine.normalize_scores(face), args.repeat
+
+def synthetic_database(n_records: int, n_persons: int, rng) -> Dict:
+    """A database with n_persons and n_records attendance rows spread over consecutive past days."""
+    from datetime import date, timedelta
+    from utils.database_manager import initialize_database
+
+    db = initialize_database()
+    departments = np.array(["Engineering", "HR", "Sales", "Operations"])
+    db['persons'] = [{"id": f"P{i:06d}", "name": f"Person {i}", "employee_id": f"EMP{i:06d}",
+                      "department": str(departments[i % len(departments)]), "status": "active",
+                      "created_at": "2025-01-01T00:00:00"} for i in range(n_persons)]
+    days = -(-n_records // n_persons)
+    start = date.today() - timedelta(days=days)
+    dates = [(start + timedelta(days=d)).isoformat() for d in range(days)]
+    person = np.arange(n_records) % n_persons
+    day = np.arange(n_records) // n_persons
+    minutes = rng.integers(7 * 60 + 30, 9 * 60 + 30, n_records)
+    db['attendance'] = [{
+        "id": f"ATT{i + 1:05d}", "person_id": f"P{p:06d}", "date": dates[d],
+        "check_in": f"{m // 60:02d}:{m % 60:02d}:00", "check_out": "17:30:00",
+        "status": "late" if m > 9 * 60 else "on_time", "verification_method": "face_voice"
+    } for i, (p, d, m) in enumerate(zip(person.tolist(), day.tolist(), minutes.tolist()))]
+    return db
+
+def database_cases(args, rng, tmp: str) -> Iterator[Case]:
+    from utils import attendance_aggregates, store_lock, template_store
+    from utils import database_manager as dbm
+
+    template_store.TEMPLATES_PATH = os.path.join(tmp, 'templates.npz')
+    store_lock.LOCK_PATH = os.path.join(tmp, '.store.lock')
+    attendance_aggregates.AGGREGATES_PATH = os.path.join(tmp, 'aggregates.json')
+    dbm.DATABASE_PATH = os.path.join(tmp, 'database.json')
+    for n in args.attendance_sizes:
+        if not harness.fits_in_memory(n * RECORD_BYTES, headroom=3):
+            yield f"database.load_database[rows={n}]", None, "attendance does not fit in memory"
+            continue
+        db = synthetic_database(n, args.db_persons, rng)
+        dbm.save_database(db)
+        if os.path.exists(attendance_aggregates.AGGREGATES_PATH):
+            os.remove(attendance_aggregates.AGGREGATES_PATH)
+        # Repeats shrink with size: one load of a million rows already takes seconds
+        repeat = args.repeat if n <= 100_000 else min(args.repeat, 3)
+        person_id = db['persons'][len(db['persons']) // 2]['id']
+        yield f"database.load_database[rows={n}]", dbm.load_database, repeat
+        # Bound as a default: the database is deleted before the next size is built
+        yield f"database.save_database[rows={n}]", lambda d=db: dbm.save_database(d), repeat
+        yield f"database.get_person[rows={n}]", lambda: dbm.get_person(person_id), repeat
+        yield f"database.get_attendance_today[rows={n}]", dbm.get_attendance_today, repeat
+        yield (f"database.get_attendance_history[rows={n},person]",
+               lambda: dbm.get_attendance_history(person_id=person_id), repeat)
+        yield f"database.iter_attendance[rows={n}]", lambda: sum(1 for _ in dbm.iter_attendance()), repeat
+        yield f"database.log_attendance[rows={n}]", lambda: dbm.log_attendance(person_id, 'checkin'), repeat
+        del db
+
+CASES = {"face": face_cases, "voice": voice_cases, "matcher": matcher_cases, "gallery": gallery_cases,
+         "fusion": fusion_cases, "database": database_cases}
+
+# ============ RUN ============
+
+def run(args) -> Dict:
+    rng = np.random.default_rng(args.seed)
+    results = {"environment": harness.environment(),
+               "config": {"groups": args.only, "gallery_sizes": args.gallery_sizes,
+                          "attendance_sizes": args.attendance_sizes, "face_dim": args.face_dim,
+                          "repeat": args.repeat, "seed": args.seed},
+               "cases": {}, "skipped": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        for group in args.only:
+            for name, fn, repeat in CASES[group](args, rng, tmp):
+                if fn is None:
+                    results['skipped'][name] = repeat
+                    print(f"{name:<52}{'skipped: ' + repeat:>30}")
+                    continue
+                case = harness.measure(fn, repeat=repeat)
+                results['cases'][name] = case
+                print(f"{name:<52}{case['median_ms']:>14.4f} ms  (min {case['min_ms']:.4f})")
+    return results
+
+def print_comparison(rows: Dict[str, Dict]) -> None:
+    print(f"{'case':<52}{'base ms':>12}{'head ms':>12}{'ratio':>8}")
+    for name, row in rows.items():
+        ratio = f"{row['ratio']:.2f}" if row['ratio'] is not None else "-"
+        print(f"{name:<52}{row['base_ms']:>12.4f}{row['head_ms']:>12.4f}{ratio:>8}  {row['verdict']}")
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage.")
+    parser.add_argument('--only', nargs='+', choices=GROUPS, default=list(GROUPS))
+    parser.add_argument('--gallery-sizes', nargs='+', type=int, default=list(GALLERY_SIZES))
+    parser.add_argument('--attendance-sizes', nargs='+', type=int, default=list(ATTENDANCE_SIZES))
+    parser.add_argument('--db-persons', type=int, default=DB_PERSONS)
+    parser.add_argument('--face-dim', type=int, default=FACE_DIM)
+    parser.add_argument('--face-image', help="time face detection on this image instead of noise")
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="write the results to this file")
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'HEAD'), help="compare two result files and exit")
+    parser.add_argument('--threshold', type=float, default=0.1, help="relative change reported as slower/faster")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        base, head = (harness.load_results(path) for path in args.compare)
+        print(f"base {base['environment']['commit']}  head {head['environment']['commit']}")
+        print_comparison(harness.compare(base, head, args.threshold))
+        return
+
+    results = run(args)
+    if args.json:
+        harness.write_results(results, args.json)
+        print(f"Results written to {args.json}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark JSON load, save and response encoding on a scaled-up database.
+
+Compares what the store and API did before (stdlib json, indent=2 on disk,
+Flask's sorted stdlib encoding for responses, .tolist() for arrays) with
+utils/serialization (orjson when installed, compact).
+
+    python -m benchmarks.bench_serialization --scale 20
+    python -m benchmarks.bench_serialization --scale 50 --json results.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import serialization
+
+def scaled_database(path: str, scale: int) -> dict:
+    """The database at path with its persons and their attendance repeated `scale` times."""
+    with open(path) as f:
+        db = json.load(f)
+    persons, attendance = [], []
+    for copy in range(scale):
+        suffix = f"_{copy}" if copy else ""
+        persons.extend(dict(p, id=p['id'] + suffix, employee_id=p['employee_id'] + suffix) for p in db['persons'])
+        attendance.extend(dict(r, id=r['id'] + suffix, person_id=r['person_id'] + suffix) for r in db['attendance'])
+    return dict(db, persons=persons, attendance=attendance)
+
+def timed(fn, repeat: int) -> float:
+    """Median wall time of fn() in milliseconds."""
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append((time.perf_counter() - start) * 1000)
+    return statistics.median(runs)
+
+def stdlib_response(obj) -> bytes:
+    # Flask's default provider: compact, sorted keys
+    return json.dumps(obj, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+def run(database_path: str, scale: int, repeat: int) -> dict:
+    db = scaled_database(database_path, scale)
+    history = {"attendance": db['attendance'][:1000], "next_cursor": None}
+    persons = {"persons": db['persons'], "total": len(db['persons'])}
+    frame = np.random.rand(len(db['persons']), 31)
+    frame_payload = lambda encode: {"present": encode(frame > 0.5), "late_rate": encode(frame.round(4))}
+
+    results = {"backend": serialization.BACKEND, "scale": scale,
+               "persons": len(db['persons']), "attendance": len(db['attendance']), "cases": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        old_path, new_path = os.path.join(tmp, 'old.json'), os.path.join(tmp, 'new.json')
+
+        def save_old():
+            with open(old_path, 'w') as f:
+                json.dump(db, f, indent=2)
+
+        def load_old():
+            with open(old_path) as f:
+                json.load(f)
+
+        save_old()
+        serialization.dump_file(db, new_path)
+        results['file_bytes'] = {"before": os.path.getsize(old_path), "after": os.path.getsize(new_path)}
+
+        cases = {
+            "store.save": (save_old, lambda: serialization.dump_file(db, new_path)),
+            "store.load": (load_old, lambda: serialization.load_file(new_path)),
+            "response.attendance_page": (lambda: stdlib_response(history), lambda: serialization.dumps(history)),
+            "response.persons": (lambda: stdlib_response(persons), lambda: serialization.dumps(persons)),
+            "response.numpy_frame": (lambda: stdlib_response(frame_payload(lambda a: a.tolist())),
+                                     lambda: serialization.dumps(frame_payload(lambda a: a))),
+        }
+        for name, (before, after) in cases.items():
+            before_ms, after_ms = timed(before, repeat), timed(after, repeat)
+            results['cases'][name] = {"before_ms": round(before_ms, 3), "after_ms": round(after_ms, 3),
+                                      "speedup": round(before_ms / after_ms, 2) if after_ms else None}
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark JSON serialization of the store and API.")
+    parser.add_argument('--database', default='data/database.json')
+    parser.add_argument('--scale', type=int, default=20, help="repeat persons and attendance this many times")
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = run(args.database, args.scale, args.repeat)
+    print(f"Backend: {results['backend']}  persons: {results['persons']}  attendance: {results['attendance']}")
+    print(f"database.json: {results['file_bytes']['before']:,} -> {results['file_bytes']['after']:,} bytes")
+    print(f"{'case':<28}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for name, case in results['cases'].items():
+        print(f"{name:<28}{case['before_ms']:>12.2f}{case['after_ms']:>12.2f}{case['speedup']:>9.1f}x")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Timing, environment capture and result comparison shared by the benchmarks.
+
+Results are plain JSON: {"environment": {...}, "cases": {name: {...}},
+"skipped": {name: reason}}, so runs from different commits can be diffed
+with compare().
+"""
+
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from utils import serialization
+
+# A timed run calls the function often enough to last at least this long
+MIN_RUN_SECONDS = 0.005
+
+def measure(fn: Callable, repeat: int = 5, warmup: int = 1) -> Dict:
+    """
+    Per-call wall time of fn() over `repeat` runs, in milliseconds.
+    Fast functions are called several times per run so timer resolution does not dominate.
+    """
+    for _ in range(warmup):
+        fn()
+    start = time.perf_counter()
+    fn()
+    single = time.perf_counter() - start
+    number = max(1, int(MIN_RUN_SECONDS / single)) if single > 0 else 1000
+
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        runs.append((time.perf_counter() - start) * 1000 / number)
+    runs.sort()
+    return {
+        "median_ms": round(statistics.median(runs), 6),
+        "min_ms": round(runs[0], 6),
+        "p95_ms": round(runs[min(len(runs) - 1, int(0.95 * len(runs)))], 6),
+        "repeat": repeat,
+        "number": number
+    }
+
+def available_memory() -> Optional[int]:
+    """Bytes of physical memory currently available, where the OS reports it."""
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def fits_in_memory(nbytes: int, headroom: float = 2.5) -> bool:
+    """Whether a working set of nbytes (times headroom for temporaries) fits in available memory."""
+    available = available_memory()
+    return available is None or nbytes * headroom < available
+
+def _git(*args) -> Optional[str]:
+    try:
+        return subprocess.run(('git',) + args, capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def environment() -> Dict:
+    """Commit and machine the results were produced on."""
+    status = _git('status', '--porcelain', '--untracked-files=no')
+    return {
+        "commit": _git('rev-parse', 'HEAD'),
+        "dirty": bool(status) if status is not None else None,
+        "timestamp": datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count()
+    }
+
+def write_results(results: Dict, path: str) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(serialization.dumps(results, indent=True))
+
+def load_results(path: str) -> Dict:
+    return serialization.load_file(path)
+
+def compare(base: Dict, head: Dict, threshold: float = 0.1) -> Dict[str, Dict]:
+    """
+    Median time of every case present in both runs, head relative to base.
+    A case is a regression or an improvement when it moved by more than `threshold`.
+    """
+    rows = {}
+    for name, case in head['cases'].items():
+        if name not in base['cases']:
+            continue
+        before, after = base['cases'][name]['median_ms'], case['median_ms']
+        ratio = after / before if before else None
+        verdict = "same"
+        if ratio is not None and ratio > 1 + threshold:
+            verdict = "slower"
+        elif ratio is not None and ratio < 1 - threshold:
+            verdict = "faster"
+        rows[name] = {"base_ms": before, "head_ms": after, "ratio": ratio, "verdict": verdict}
+    return rows
@@ -0,0 +1,436 @@
+"""
+Load test of the biometric HTTP endpoints with synthetic face and voice uploads.
+
+Two ways to drive the server:
+
+- closed loop (--concurrency N ...): N clients, each sending its next request
+  as soon as the previous one is answered. Throughput at saturation is the
+  maximum RPS, but a slow server slows the clients down with it.
+- open loop (--rates R ...): requests arrive as a Poisson process at R per
+  second whether or not earlier ones have been answered. Latency is measured
+  from the scheduled arrival, so time spent queueing (in the server or here,
+  once --max-in-flight requests are outstanding) is counted, not hidden.
+
+Each step reports, overall and per endpoint, the latency distribution of
+served requests, the throughput, and the share of each outcome: ok (2xx),
+rejected (401: no match, expected for synthetic biometrics), shed (503: the
+server's admission control) and error (anything else, including timeouts).
+A rate is sustainable when its error and shed rates stay within --max-error-rate,
+its p99 within --slo-ms and the achieved throughput within 10% of the offered.
+
+With --start-server the server runs on a copy of data/ in a temporary
+directory, so check-ins do not touch the real attendance log.
+
+    python -m benchmarks.load_test --start-server flask --concurrency 1 4 16
+    python -m benchmarks.load_test --url http://localhost:5001 --rates 2 5 10 20 --duration 30
+    python -m benchmarks.load_test --start-server asgi --rates 5 --endpoints checkin=3 verify=1 --json load.json
+"""
+
+import argparse
+import http.client
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import harness
+from pipeline.admission import DEADLINE_HEADER
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = {
+    "checkin": "/api/attendance/checkin",
+    "checkout": "/api/attendance/checkout",
+    "verify": "/api/verify"
+}
+OUTCOMES = ('ok', 'rejected', 'shed', 'error')
+PERCENTILES = (50, 95, 99)
+# Achieved throughput below this share of the offered rate means the server fell behind
+MIN_THROUGHPUT_SHARE = 0.9
+
+# ============ SYNTHETIC UPLOADS ============
+
+def _face_jpeg(rng, size: Tuple[int, int] = (480, 640)) -> bytes:
+    import cv2
+
+    # Smooth noise compresses and decodes like a photo rather than like static
+    image = cv2.GaussianBlur(rng.integers(0, 256, size=size + (3,), dtype=np.uint8), (9, 9), 0)
+    return cv2.imencode('.jpg', image)[1].tobytes()
+
+def _voice_wav(rng, seconds: float = 3.0, sr: int = 16000) -> bytes:
+    import io
+
+    t = np.arange(int(seconds * sr)) / sr
+    pitch = rng.uniform(100, 300)
+    signal = 0.4 * np.sin(2 * np.pi * pitch * t) + 0.05 * rng.normal(size=t.shape)
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sr)
+        f.writeframes((np.clip(signal, -1, 1) * 32767).astype(np.int16).tobytes())
+    return buffer.getvalue()
+
+def _files_in(directory: Optional[str], extensions) -> List[str]:
+    if not directory:
+        return []
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.rsplit('.', 1)[-1].lower() in extensions)
+
+def multipart(fields: Dict[str, Tuple[str, bytes, str]]) -> Tuple[bytes, str]:
+    """multipart/form-data body and its content type for {field: (filename, data, mime type)}."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, (filename, data, mime) in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: {mime}\r\n\r\n'.encode() + data + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+def build_uploads(count: int, seed: int, face_dir: Optional[str] = None, voice_dir: Optional[str] = None,
+                  modalities=('face', 'voice')) -> List[Tuple[bytes, str]]:
+    """
+    Request bodies with a face and/or voice sample each. Samples come from face_dir/voice_dir
+    when given (cycled), otherwise they are generated.
+    """
+    rng = np.random.default_rng(seed)
+    face_files = _files_in(face_dir, {'jpg', 'jpeg', 'png'})
+    voice_files = _files_in(voice_dir, {'wav', 'mp3'})
+    uploads = []
+    for i in range(count):
+        fields = {}
+        if 'face' in modalities:
+            if face_files:
+                path = face_files[i % len(face_files)]
+                with open(path, 'rb') as f:
+                    fields['face'] = (os.path.basename(path), f.read(), 'image/jpeg')
+            else:
+                fields['face'] = ('face.jpg', _face_jpeg(rng), 'image/jpeg')
+        if 'voice' in modalities:
+            if voice_files:
+                path = voice_files[i % len(voice_files)]
+                with open(path, 'rb') as f:
+                    fields['voice'] = (os.path.basename(path), f.read(), 'audio/wav')
+            else:
+                fields['voice'] = ('voice.wav', _voice_wav(rng), 'audio/wav')
+        uploads.append(multipart(fields))
+    return uploads
+
+# ============ CLIENT ============
+
+class Client:
+    """Sends uploads to one server; a new connection per request, as a kiosk would."""
+    def __init__(self, url: str, timeout: float, deadline_ms: Optional[int] = None):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.timeout = timeout
+        self.deadline_ms = deadline_ms
+
+    def post(self, path: str, body: bytes, content_type: str) -> int:
+        """Status code of the response, or 0 if the request failed or timed out."""
+        headers = {'Content-Type': content_type}
+        if self.deadline_ms:
+            headers[DEADLINE_HEADER] = str(self.deadline_ms)
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.request('POST', path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            return 0
+        finally:
+            connection.close()
+
+    def get(self, path: str) -> int:
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            return 0
+        finally:
+            connection.close()
+
+def outcome(status: int) -> str:
+    if 200 <= status < 300:
+        return 'ok'
+    if status == 401:
+        return 'rejected'
+    if status == 503:
+        return 'shed'
+    return 'error'
+
+class Recorder:
+    """Thread-safe log of (endpoint, latency seconds, status) for one step."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = []
+
+    def add(self, endpoint: str, latency: float, status: int) -> None:
+        with self.lock:
+            self.samples.append((endpoint, latency, status))
+
+def _plan(endpoints: Dict[str, float], uploads, count: int, rng) -> List[Tuple[str, int]]:
+    """The endpoint and upload of each of `count` requests, drawn by the endpoint weights."""
+    names = list(endpoints)
+    weights = np.array([endpoints[name] for name in names], dtype=np.float64)
+    picks = rng.choice(len(names), size=count, p=weights / weights.sum())
+    return [(names[p], int(u)) for p, u in zip(picks, rng.integers(0, len(uploads), count))]
+
+def run_closed(client: Client, endpoints: Dict[str, float], uploads, concurrency: int, duration: float,
+               rng) -> Recorder:
+    """`concurrency` clients sending back to back for `duration` seconds."""
+    recorder = Recorder()
+    stop = time.perf_counter() + duration
+    seeds = rng.integers(0, 2**32, concurrency)
+
+    def worker(seed):
+        worker_rng = np.random.default_rng(seed)
+        while time.perf_counter() < stop:
+            # Plan in small chunks so the loop does not draw one request at a time
+            for endpoint, upload in _plan(endpoints, uploads, 16, worker_rng):
+                if time.perf_counter() >= stop:
+                    return
+                start = time.perf_counter()
+                status = client.post(ENDPOINTS[endpoint], *uploads[upload])
+                recorder.add(endpoint, time.perf_counter() - start, status)
+
+    threads = [threading.Thread(target=worker, args=(seed,), daemon=True) for seed in seeds]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder
+
+def run_open(client: Client, endpoints: Dict[str, float], uploads, rate: float, duration: float,
+             max_in_flight: int, rng) -> Recorder:
+    """Poisson arrivals at `rate` per second for `duration` seconds, timed from each scheduled arrival."""
+    recorder = Recorder()
+    arrivals = np.cumsum(rng.exponential(1 / rate, size=int(rate * duration * 1.5) + 16))
+    arrivals = arrivals[arrivals < duration]
+    plan = _plan(endpoints, uploads, len(arrivals), rng)
+
+    def send(scheduled, endpoint, upload):
+        status = client.post(ENDPOINTS[endpoint], *uploads[upload])
+        recorder.add(endpoint, time.perf_counter() - scheduled, status)
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        origin = time.perf_counter()
+        for offset, (endpoint, upload) in zip(arrivals, plan):
+            delay = origin + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            # If the pool is full the request waits here, and that wait counts towards its latency
+            pool.submit(send, origin + offset, endpoint, upload)
+    return recorder
+
+# ============ REPORT ============
+
+def summarize(samples: List[Tuple[str, float, int]], elapsed: float) -> Dict:
+    """Outcome counts and rates, throughput and latency percentiles of served (2xx and 401) requests."""
+    statuses = np.array([s[2] for s in samples], dtype=int)
+    latencies = np.array([s[1] for s in samples], dtype=np.float64) * 1000
+    outcomes = np.array([outcome(s) for s in statuses.tolist()])
+    total = len(samples)
+    summary = {
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 3) if elapsed else 0.0,
+        "status_codes": {str(code): int(n) for code, n in zip(*np.unique(statuses, return_counts=True))},
+    }
+    for name in OUTCOMES:
+        count = int((outcomes == name).sum())
+        summary[name] = count
+        summary[f"{name}_rate"] = round(count / total, 4) if total else 0.0
+    # Shed requests are answered in microseconds and would flatter the percentiles; they count in shed_rate
+    served = latencies[(outcomes == 'ok') | (outcomes == 'rejected')]
+    if len(served):
+        for q, value in zip(PERCENTILES, np.percentile(served, PERCENTILES)):
+            summary[f"p{q}_ms"] = round(float(value), 2)
+        summary["mean_ms"] = round(float(served.mean()), 2)
+        summary["max_ms"] = round(float(served.max()), 2)
+    return summary
+
+def step_report(recorder: Recorder, elapsed: float, offered: Optional[float]) -> Dict:
+    report = {"overall": summarize(recorder.samples, elapsed), "endpoints": {}}
+    for endpoint in sorted({s[0] for s in recorder.samples}):
+        report["endpoints"][endpoint] = summarize([s for s in recorder.samples if s[0] == endpoint], elapsed)
+    if offered is not None:
+        report["offered_rps"] = offered
+    return report
+
+def sustainable(report: Dict, slo_ms: float, max_error_rate: float) -> bool:
+    overall = report["overall"]
+    if overall["requests"] == 0:
+        return False
+    if overall["error_rate"] + overall["shed_rate"] > max_error_rate:
+        return False
+    if overall.get("p99_ms", float('inf')) > slo_ms:
+        return False
+    offered = report.get("offered_rps")
+    return offered is None or overall["throughput_rps"] >= MIN_THROUGHPUT_SHARE * offered
+
+def print_step(label: str, report: Dict) -> None:
+    rows = [("all", report["overall"])] + list(report["endpoints"].items())
+    print(f"\n{label}")
+    print(f"{'endpoint':<10}{'reqs':>7}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'ok':>8}{'401':>8}{'503':>8}{'err':>8}")
+    for name, s in rows:
+        print(f"{name:<10}{s['requests']:>7}{s['throughput_rps']:>9.2f}{s.get('p50_ms', float('nan')):>10.1f}"
+              f"{s.get('p95_ms', float('nan')):>10.1f}{s.get('p99_ms', float('nan')):>10.1f}"
+              f"{s['ok_rate']:>8.1%}{s['rejected_rate']:>8.1%}{s['shed_rate']:>8.1%}{s['error_rate']:>8.1%}")
+
+# ============ LOCAL SERVER ============
+
+def _sandbox(directory: str) -> None:
+    """Copy the data the server reads into directory, so its writes stay there."""
+    source = os.path.join(ROOT, 'data')
+    target = os.path.join(directory, 'data')
+    os.makedirs(target)
+    for name in ('database.json', 'templates.npz', 'templates_norm.npz'):
+        if os.path.exists(os.path.join(source, name)):
+            shutil.copy2(os.path.join(source, name), target)
+    if os.path.isdir(os.path.join(source, 'features')):
+        shutil.copytree(os.path.join(source, 'features'), os.path.join(target, 'features'))
+
+@contextmanager
+def local_server(kind: str, port: int, startup_timeout: float):
+    """Start server.py (flask) or asgi_server.py (asgi) on a sandboxed copy of data/ and yield its URL."""
+    with tempfile.TemporaryDirectory() as directory:
+        _sandbox(directory)
+        if kind == 'flask':
+            command = [sys.executable, '-c', f"import sys; sys.path.insert(0, {ROOT!r}); import server; "
+                                             f"server.app.run(host='127.0.0.1', port={port}, threaded=True)"]
+        else:
+            command = [sys.executable, '-m', 'uvicorn', 'asgi_server:app', '--app-dir', ROOT,
+                       '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning']
+        # Own shared-memory gallery name so a running server's gallery is left alone
+        env = dict(os.environ, IDENTIX_GALLERY_SHM=f'identix_load_{os.getpid()}')
+        log_path = os.path.join(directory, 'server.log')
+        with open(log_path, 'wb') as log:
+            process = subprocess.Popen(command, cwd=directory, env=env, stdout=log, stderr=subprocess.STDOUT)
+        url = f'http://127.0.0.1:{port}'
+        try:
+            client = Client(url, timeout=2)
+            started = time.perf_counter()
+            while client.get('/api/health') != 200:
+                if process.poll() is not None or time.perf_counter() - started > startup_timeout:
+                    with open(log_path, 'rb') as log:
+                        tail = log.read()[-2000:].decode(errors='replace')
+                    raise RuntimeError(f"Server did not come up:\n{tail}")
+                time.sleep(0.5)
+            print(f"Started {kind} server on {url} in {time.perf_counter() - started:.1f}s (data in {directory})")
+            yield url
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+# ============ CLI ============
+
+def parse_endpoints(values: List[str]) -> Dict[str, float]:
+    """['checkin=3', 'verify'] -> {'checkin': 3.0, 'verify': 1.0}"""
+    endpoints = {}
+    for value in values:
+        name, _, weight = value.partition('=')
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {name!r}; expected one of {', '.join(ENDPOINTS)}")
+        endpoints[name] = float(weight) if weight else 1.0
+    return endpoints
+
+def run(args, url: str) -> Dict:
+    endpoints = parse_endpoints(args.endpoints)
+    uploads = build_uploads(args.samples, args.seed, args.face_dir, args.voice_dir, args.modalities)
+    client = Client(url, timeout=args.timeout, deadline_ms=args.deadline_ms)
+    rng = np.random.default_rng(args.seed)
+    results = {"environment": harness.environment(),
+               "config": {"url": url, "endpoints": endpoints, "modalities": args.modalities,
+                          "duration_s": args.duration, "samples": args.samples, "slo_ms": args.slo_ms,
+                          "max_error_rate": args.max_error_rate, "seed": args.seed},
+               "steps": []}
+
+    if args.warmup:
+        run_closed(client, endpoints, uploads, 1, args.warmup, rng)
+
+    steps = [('closed', c) for c in args.concurrency or []] + [('open', r) for r in args.rates or []]
+    for mode, level in steps:
+        started = time.perf_counter()
+        if mode == 'closed':
+            recorder = run_closed(client, endpoints, uploads, level, args.duration, rng)
+            label, offered = f"closed loop, concurrency {level}", None
+        else:
+            recorder = run_open(client, endpoints, uploads, level, args.duration, args.max_in_flight, rng)
+            label, offered = f"open loop, {level:g} req/s", level
+        report = step_report(recorder, time.perf_counter() - started, offered)
+        report.update(mode=mode, level=level, sustainable=sustainable(report, args.slo_ms, args.max_error_rate))
+        results["steps"].append(report)
+        print_step(label + ("" if report["sustainable"] else "  [not sustainable]"), report)
+
+    good = [s["overall"]["throughput_rps"] for s in results["steps"] if s["sustainable"]]
+    results["max_sustainable_rps"] = max(good) if good else None
+    criteria = f"p99 <= {args.slo_ms:g} ms, errors + shed <= {args.max_error_rate:.1%}"
+    if good:
+        print(f"\nMax sustainable throughput: {max(good):.2f} req/s ({criteria})")
+    else:
+        print(f"\nNo step was sustainable ({criteria})")
+    return results
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Load test the check-in and verification endpoints.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help="server to load, e.g. http://localhost:5001")
+    target.add_argument('--start-server', choices=('flask', 'asgi'), help="start a sandboxed local server")
+    parser.add_argument('--port', type=int, default=5099, help="port of the started server")
+    parser.add_argument('--startup-timeout', type=float, default=180)
+    parser.add_argument('--endpoints', nargs='+', default=['checkin', 'verify'],
+                        help="endpoints with optional weights, e.g. checkin=3 verify=1")
+    parser.add_argument('--modalities', nargs='+', choices=('face', 'voice'), default=['face', 'voice'])
+    parser.add_argument('--concurrency', nargs='+', type=int, help="closed-loop steps: concurrent clients")
+    parser.add_argument('--rates', nargs='+', type=float, help="open-loop steps: arrivals per second")
+    parser.add_argument('--duration', type=float, default=20, help="seconds per step")
+    parser.add_argument('--warmup', type=float, default=5, help="seconds of single-client traffic first")
+    parser.add_argument('--max-in-flight', type=int, default=256, help="open-loop cap on outstanding requests")
+    parser.add_argument('--samples', type=int, default=16, help="distinct synthetic uploads")
+    parser.add_argument('--face-dir', help="replay face images from this directory")
+    parser.add_argument('--voice-dir', help="replay voice recordings from this directory")
+    parser.add_argument('--timeout', type=float, default=60, help="client timeout per request, seconds")
+    parser.add_argument('--deadline-ms', type=int, help="send this budget in the X-Deadline-Ms header")
+    parser.add_argument('--slo-ms', type=float, default=2000, help="p99 latency a sustainable step must meet")
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="write the results to this file")
+    args = parser.parse_args(argv)
+    if not args.concurrency and not args.rates:
+        parser.error("give --concurrency and/or --rates")
+    try:
+        parse_endpoints(args.endpoints)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.start_server:
+        with local_server(args.start_server, args.port, args.startup_timeout) as url:
+            results = run(args, url)
+    else:
+        results = run(args, args.url)
+    if args.json:
+        harness.write_results(results, args.json)
+        print(f"Results written to {args.json}")
+
+if __name__ == '__main__':
+    main()
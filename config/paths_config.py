@@ -14,6 +14,8 @@ PRECOMPUTED_VOICE_FEATURES = "data/features/voice_mfccs.npy"
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 MODELS_DIR = os.path.join(BASE_DIR, "models")
 EVAL_DIR = os.path.join(BASE_DIR, "evaluation", "reports")
+# Versioned fusion weights and threshold written by fusion/calibration.py
+FUSION_CONFIG_DIR = os.path.join(BASE_DIR, "config", "fusion")
 
 # Ensure directories exist
 os.makedirs(MODELS_DIR, exist_ok=True)
@@ -1,36 +1,152 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 import matplotlib.pyplot as plt
+from scipy.stats import norm
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, roc_curve, auc
 
+# FARs at which operations fixes the threshold
+OPERATING_FARS = (1e-3, 1e-4)
+# Bootstrap resamples per task; fixed so the result does not depend on the worker count
+BOOTSTRAP_CHUNK = 25
+
 def calculate_biometric_metrics(y_true, y_scores, threshold=0.7):
     """
     Calculates standard biometric performance metrics.
     """
-    y_pred = [1 if s >= threshold else 0 for s in y_scores]
+    y_true = np.asarray(y_true)
+    y_scores = np.asarray(y_scores, dtype=np.float64)
+    y_pred = (y_scores >= threshold).astype(int)
     
     metrics = {
         "accuracy": accuracy_score(y_true, y_pred),
-        "precision": precision_score(y_true, y_pred),
-        "recall": recall_score(y_true, y_pred),
-        "f1": f1_score(y_true, y_pred)
+        "precision": precision_score(y_true, y_pred, zero_division=0),
+        "recall": recall_score(y_true, y_pred, zero_division=0),
+        "f1": f1_score(y_true, y_pred, zero_division=0)
     }
     
     # ROC Curve
     fpr, tpr, thresholds = roc_curve(y_true, y_scores)
     roc_auc = auc(fpr, tpr)
     
-    # EER calculation
-    fnr = 1 - tpr
-    eer_index = np.nanargmin(np.absolute(fnr - fpr))
-    eer = (fpr[eer_index] + fnr[eer_index]) / 2
+    # EER and operating points from the full FAR/FRR sweep
+    genuine, impostor = y_scores[y_true == 1], y_scores[y_true == 0]
+    thresholds, far, frr = error_rates(genuine, impostor)
     
     metrics["auc"] = roc_auc
-    metrics["eer"] = eer
+    metrics["eer"] = equal_error_rate(far, frr)
+    metrics["far"] = np.mean(impostor >= threshold)
+    metrics["frr"] = np.mean(genuine < threshold)
     metrics["fpr"] = fpr
     metrics["tpr"] = tpr
     
     return metrics
 
+# ============ THRESHOLD SWEEP ============
+
+def _sweep(genuine_scores, impostor_scores):
+    """Sorted scores of each class, the candidate thresholds and where each threshold falls in each class."""
+    genuine = np.sort(np.asarray(genuine_scores, dtype=np.float64).ravel())
+    impostor = np.sort(np.asarray(impostor_scores, dtype=np.float64).ravel())
+    # Every distinct score, plus one threshold that rejects everything
+    thresholds = np.append(np.unique(np.concatenate([genuine, impostor])), np.inf)
+    return thresholds, np.searchsorted(genuine, thresholds), np.searchsorted(impostor, thresholds)
+
+def _rates(below_genuine, below_impostor, n_genuine, n_impostor):
+    # A score is accepted when score >= threshold
+    return 1 - below_impostor / n_impostor, below_genuine / n_genuine
+
+def error_rates(genuine_scores, impostor_scores):
+    """
+    FAR and FRR at every distinct score taken as the threshold, in O(n log n).
+    Returns (thresholds, far, frr), thresholds ascending (far falls, frr rises).
+    """
+    thresholds, genuine_rank, impostor_rank = _sweep(genuine_scores, impostor_scores)
+    far, frr = _rates(genuine_rank, impostor_rank, np.size(genuine_scores), np.size(impostor_scores))
+    return thresholds, far, frr
+
+def error_rates_from_histograms(edges, genuine_histogram, impostor_histogram):
+    """
+    FAR and FRR with each bin edge taken as the threshold, from score histograms over the same
+    bins (e.g. evaluation.score_matrix.ScoreAccumulator). Returns (thresholds, far, frr).
+    """
+    genuine_below = np.concatenate([[0], np.cumsum(genuine_histogram)])
+    impostor_below = np.concatenate([[0], np.cumsum(impostor_histogram)])
+    far, frr = _rates(genuine_below, impostor_below, genuine_below[-1], impostor_below[-1])
+    return np.asarray(edges, dtype=np.float64), far, frr
+
+def equal_error_rate(far, frr):
+    """Rate where FAR and FRR cross, interpolated between the two thresholds around the crossing."""
+    far, frr = np.asarray(far), np.asarray(frr)
+    i = int(np.argmax(far <= frr))
+    if i == 0:
+        return float((far[0] + frr[0]) / 2)
+    above, below = far[i - 1] - frr[i - 1], far[i] - frr[i]
+    w = above / (above - below)
+    return float(far[i - 1] + w * (far[i] - far[i - 1]))
+
+def operating_point(thresholds, far, frr, target_far):
+    """The lowest threshold whose FAR is at most target_far, with its FAR and FRR."""
+    i = int(np.argmax(np.asarray(far) <= target_far))
+    return {"threshold": float(thresholds[i]), "far": float(far[i]), "frr": float(frr[i])}
+
+def operating_metrics(thresholds, far, frr, fars=OPERATING_FARS):
+    """EER and FRR at each fixed FAR, as a flat dict."""
+    metrics = {"eer": equal_error_rate(far, frr)}
+    for target in fars:
+        metrics[f"frr_at_far_{target:g}"] = operating_point(thresholds, far, frr, target)['frr']
+    return metrics
+
+def det_curve(far, frr):
+    """DET coordinates: FAR and FRR on normal deviate (probit) scales."""
+    eps = 1e-6
+    return norm.ppf(np.clip(far, eps, 1 - eps)), norm.ppf(np.clip(frr, eps, 1 - eps))
+
+# ============ BOOTSTRAP ============
+
+def _bootstrap_chunk(seed_sequence, resamples, thresholds, genuine_rank, impostor_rank, n_genuine, n_impostor, fars):
+    rng = np.random.default_rng(seed_sequence)
+    results = []
+    for _ in range(resamples):
+        # A resample of a sorted class is a count per sorted score, so the rates need no re-sort: O(n)
+        genuine_counts = np.bincount(rng.integers(0, n_genuine, n_genuine), minlength=n_genuine)
+        impostor_counts = np.bincount(rng.integers(0, n_impostor, n_impostor), minlength=n_impostor)
+        genuine_below = np.concatenate([[0], np.cumsum(genuine_counts)])
+        impostor_below = np.concatenate([[0], np.cumsum(impostor_counts)])
+        far, frr = _rates(genuine_below[genuine_rank], impostor_below[impostor_rank], n_genuine, n_impostor)
+        results.append(operating_metrics(thresholds, far, frr, fars))
+    return results
+
+def bootstrap_ci(genuine_scores, impostor_scores, fars=OPERATING_FARS, resamples=1000, confidence=0.95,
+                 seed=0, workers=None):
+    """
+    Percentile bootstrap confidence intervals of the EER and of FRR at each fixed FAR.
+    Genuine and impostor scores are resampled independently; resamples run on a thread
+    pool. Returns {metric: {"estimate", "low", "high"}}.
+    """
+    thresholds, genuine_rank, impostor_rank = _sweep(genuine_scores, impostor_scores)
+    n_genuine, n_impostor = np.size(genuine_scores), np.size(impostor_scores)
+    far, frr = _rates(genuine_rank, impostor_rank, n_genuine, n_impostor)
+    estimate = operating_metrics(thresholds, far, frr, fars)
+
+    sizes = [min(BOOTSTRAP_CHUNK, resamples - start) for start in range(0, resamples, BOOTSTRAP_CHUNK)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        chunks = executor.map(lambda task: _bootstrap_chunk(task[0], task[1], thresholds, genuine_rank, impostor_rank,
+                                                            n_genuine, n_impostor, fars), zip(seeds, sizes))
+        samples = [result for chunk in chunks for result in chunk]
+
+    alpha = (1 - confidence) / 2
+    intervals = {}
+    for key, value in estimate.items():
+        values = np.array([sample[key] for sample in samples])
+        low, high = np.quantile(values, [alpha, 1 - alpha]) if len(values) else (value, value)
+        intervals[key] = {"estimate": value, "low": float(low), "high": float(high)}
+    return intervals
+
+# ============ PLOTS ============
+
 def plot_roc_curve(fpr, tpr, roc_auc, title="ROC Curve"):
     """
     Generates a matplotlib ROC curve.
@@ -46,3 +162,24 @@ def plot_roc_curve(fpr, tpr, roc_auc, title="ROC Curve"):
     ax.legend(loc="lower right")
     ax.grid(alpha=0.3)
     return fig
+
+def plot_det_curve(far, frr, title="DET Curve"):
+    """
+    Generates a matplotlib DET curve (FAR against FRR on probit scales).
+    """
+    x, y = det_curve(far, frr)
+    ticks = np.array([1e-4, 1e-3, 1e-2, 0.05, 0.2, 0.5])
+    labels = ['0.01%', '0.1%', '1%', '5%', '20%', '50%']
+    fig, ax = plt.subplots(figsize=(8, 6))
+    ax.plot(x, y, color='darkorange', lw=2, label='DET curve')
+    ax.plot([-4, 4], [-4, 4], color='navy', lw=1, linestyle='--', label='EER line')
+    ax.set_xticks(norm.ppf(ticks), labels)
+    ax.set_yticks(norm.ppf(ticks), labels)
+    ax.set_xlim(norm.ppf([5e-5, 0.6]))
+    ax.set_ylim(norm.ppf([5e-5, 0.6]))
+    ax.set_xlabel('False Acceptance Rate (FAR)')
+    ax.set_ylabel('False Rejection Rate (FRR)')
+    ax.set_title(title)
+    ax.legend(loc="upper right")
+    ax.grid(alpha=0.3)
+    return fig
@@ -0,0 +1,391 @@
+"""
+Offline evaluation of the verification pipeline on the configured datasets.
+
+Walks FACE_DATASET_PATH and VOICE_DATASET_PATH (config/paths_config.py),
+extracts features with the same stages the server uses, in parallel on the
+extraction pool, and scores every pair of samples: pairs of one identity are
+genuine, the rest impostor. Pairs are scored in tiles of the score matrix and
+streamed into histograms and reservoir samples (evaluation/score_matrix.py),
+so memory does not grow with the square of the sample count. The face and voice datasets hold different
+people, so fused scores come from chimeric subjects (the k-th face identity
+paired with the k-th voice identity), the usual practice for multimodal
+evaluation without a true multimodal corpus.
+
+A sample's identity is the <name> of a <name>_<n>.<ext> file name, otherwise
+the folder it is in. Files with the same name in different folders but of one
+identity are treated as copies of one sample.
+
+Extracted features are cached per file (path, size, mtime) under
+EVAL_DIR/feature_cache, so re-runs only extract new samples. Results go to
+EVAL_DIR: report.json (metrics, FRR at fixed FARs with bootstrap confidence
+intervals, ROC and DET points per modality, read by the dashboards) and
+scores.npz (genuine/impostor scores, a uniform sample of at most
+score_matrix.RESERVOIR pairs per class).
+
+CLI:
+    python -m evaluation.runner
+    python -m evaluation.runner --max-identities 100 --per-identity 20
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import paths_config
+from evaluation.score_matrix import TILE, ScoreAccumulator, matrix_scorer, score_distributions
+from pipeline.batch import FACE_EXTENSIONS, VOICE_EXTENSIONS, extract_batch
+from pipeline.verification import DEFAULT_STAGES, FACE_MODEL
+from utils import serialization
+
+REPORT_FILE = 'report.json'
+SCORES_FILE = 'scores.npz'
+CACHE_DIR = 'feature_cache'
+ROC_POINTS = 200
+# Noise and "unknown speaker" folders of the speaker recognition dataset
+DEFAULT_EXCLUDE = ('other',)
+
+_NUMBERED = re.compile(r'^(.+)_\d+$')
+
+# ============ DATASETS ============
+
+def list_samples(root: str, extensions, exclude=DEFAULT_EXCLUDE) -> Dict[str, List[str]]:
+    """identity -> sample paths under root, sorted; folders starting with '_' or '.' are skipped."""
+    samples, seen = {}, set()
+    for directory, subdirs, files in os.walk(root):
+        subdirs[:] = sorted(d for d in subdirs if not d.startswith(('_', '.')) and d not in exclude)
+        for name in sorted(files):
+            stem, _, extension = name.rpartition('.')
+            if extension.lower() not in extensions:
+                continue
+            numbered = _NUMBERED.match(stem)
+            identity = numbered.group(1) if numbered else os.path.basename(directory)
+            if (identity, name) in seen:
+                continue
+            seen.add((identity, name))
+            samples.setdefault(identity, []).append(os.path.join(directory, name))
+    return samples
+
+def select_samples(samples: Dict[str, List[str]], max_identities: int, per_identity: int,
+                   rng: random.Random) -> Dict[str, List[str]]:
+    """A seeded subset: identities with at least two samples, at most per_identity each."""
+    identities = sorted(i for i, paths in samples.items() if len(paths) >= 2)
+    rng.shuffle(identities)
+    return {i: sorted(rng.sample(samples[i], min(per_identity, len(samples[i]))))
+            for i in sorted(identities[:max_identities])}
+
+# ============ FEATURES ============
+
+class FeatureCache:
+    """Extracted features of one modality keyed by file path, size and mtime, kept in an .npz file."""
+    def __init__(self, path: str, model: str):
+        self.path = path
+        self.model = model
+        self.vectors = {}
+        if os.path.exists(path):
+            with np.load(path, allow_pickle=False) as archive:
+                if str(archive['model']) == model:
+                    for key, vector, ok in zip(archive['keys'], archive['vectors'], archive['mask']):
+                        self.vectors[str(key)] = vector if ok else None
+
+    @staticmethod
+    def key(sample: str) -> str:
+        st = os.stat(sample)
+        return f"{os.path.abspath(sample)}|{st.st_size}|{st.st_mtime_ns}"
+
+    def __contains__(self, sample: str) -> bool:
+        return self.key(sample) in self.vectors
+
+    def get(self, sample: str) -> Optional[np.ndarray]:
+        return self.vectors.get(self.key(sample))
+
+    def put(self, sample: str, vector: Optional[np.ndarray]) -> None:
+        """Store a sample's features; None records a failed extraction so it is not retried."""
+        self.vectors[self.key(sample)] = vector
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        keys = list(self.vectors)
+        dim = next((len(v) for v in self.vectors.values() if v is not None), 0)
+        matrix = np.zeros((len(keys), dim))
+        mask = np.zeros(len(keys), dtype=bool)
+        for i, key in enumerate(keys):
+            if self.vectors[key] is not None:
+                matrix[i] = self.vectors[key]
+                mask[i] = True
+        tmp_path = self.path + '.tmp.npz'
+        np.savez(tmp_path, model=np.array(self.model), keys=np.array(keys, dtype=str), vectors=matrix, mask=mask)
+        os.replace(tmp_path, self.path)
+
+def extract_features(paths: List[str], modality: str, cache: FeatureCache, executor=None,
+                     chunk_size: int = 16, window: int = 2,
+                     stages: Optional[Dict[str, Callable]] = None) -> Dict[str, Optional[np.ndarray]]:
+    """Features of every path (None where extraction failed), extracting only what the cache lacks."""
+    stages = dict(DEFAULT_STAGES, **(stages or {}))
+    todo = [p for p in paths if p not in cache]
+    chunks = deque(todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size))
+
+    def items(chunk):
+        result = []
+        for path in chunk:
+            with open(path, 'rb') as f:
+                data = f.read()
+            if modality == 'face':
+                result.append((data, None, '.wav'))
+            else:
+                result.append((None, data, '.' + path.rsplit('.', 1)[1].lower()))
+        return result
+
+    pending = deque()
+    done = len(paths) - len(todo)
+    while chunks or pending:
+        while chunks and len(pending) < max(window, 1):
+            chunk = chunks.popleft()
+            if executor is None:
+                pending.append((chunk, extract_batch(stages, items(chunk))))
+            else:
+                pending.append((chunk, executor.submit(extract_batch, stages, items(chunk))))
+        chunk, outcome = pending.popleft()
+        try:
+            extracted = outcome if executor is None else outcome.result()
+        except Exception as e:
+            # The pool itself failed (not the samples): leave them uncached for the next run
+            print(f"\n{modality} chunk failed: {e}", file=sys.stderr)
+            extracted = None
+        if extracted is not None:
+            for path, (face, voice, _, _) in zip(chunk, extracted):
+                cache.put(path, face if modality == 'face' else voice)
+            cache.save()
+        done += len(chunk)
+        print(f"\r{modality}: extracted {done}/{len(paths)}", end='', file=sys.stderr, flush=True)
+    if todo:
+        print(file=sys.stderr)
+    return {path: cache.get(path) if path in cache else None for path in paths}
+
+# ============ SCORES ============
+
+def _stack(selected: Dict[str, List[str]], features: Dict[str, Optional[np.ndarray]]):
+    """Feature matrix and identity labels of the samples that extracted."""
+    rows, labels = [], []
+    for identity, paths in selected.items():
+        for path in paths:
+            if features.get(path) is not None:
+                rows.append(features[path])
+                labels.append(identity)
+    return (np.vstack(rows) if rows else np.zeros((0, 0))), np.array(labels)
+
+def chimeric_pairs(face_selected, face_features, voice_selected, voice_features, rng: random.Random):
+    """
+    Pair the k-th face identity with the k-th voice identity into a virtual subject.
+    Returns (face vectors, voice vectors, subject labels) of samples with both modalities.
+    """
+    face_ids, voice_ids = list(face_selected), list(voice_selected)
+    rng.shuffle(voice_ids)
+    faces, voices, labels = [], [], []
+    for subject, (face_id, voice_id) in enumerate(zip(face_ids, voice_ids)):
+        face_ok = [face_features[p] for p in face_selected[face_id] if face_features.get(p) is not None]
+        voice_ok = [voice_features[p] for p in voice_selected[voice_id] if voice_features.get(p) is not None]
+        for face, voice in zip(face_ok, voice_ok):
+            faces.append(face)
+            voices.append(voice)
+            labels.append(subject)
+    if not labels:
+        return None
+    return np.vstack(faces), np.vstack(voices), np.array(labels)
+
+# ============ REPORT ============
+
+def _sample_arrays(distributions: Dict[str, ScoreAccumulator], channel: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Reservoir-sampled scores of one channel and whether each is genuine."""
+    genuine, impostor = distributions['genuine'].channel(channel), distributions['impostor'].channel(channel)
+    return (np.concatenate([genuine['sample'], impostor['sample']]),
+            np.concatenate([np.ones(len(genuine['sample']), dtype=bool), np.zeros(len(impostor['sample']), dtype=bool)]))
+
+def _error_rates(genuine: Dict, impostor: Dict):
+    """FAR/FRR sweep over the exact scores when both classes fit in the reservoir, else over the histograms."""
+    from evaluation.metrics import error_rates, error_rates_from_histograms
+
+    if len(genuine['sample']) == genuine['count'] and len(impostor['sample']) == impostor['count']:
+        return error_rates(genuine['sample'], impostor['sample'])
+    return error_rates_from_histograms(genuine['edges'], genuine['histogram'], impostor['histogram'])
+
+def summarize_scores(distributions: Dict[str, ScoreAccumulator], channel: str, threshold: float,
+                     bootstrap: int = 1000, seed: int = 0) -> Dict:
+    """
+    Metrics, operating points and downsampled ROC and DET curves for one channel of the
+    genuine/impostor distributions. AUC, EER, the ROC and the bootstrap confidence
+    intervals come from the reservoir samples; the confusion counts at the threshold are
+    the sample acceptance rates scaled to the exact pair counts (exact whenever a class
+    fits in the reservoir). Operating points and the DET curve use every pair.
+    """
+    from evaluation.metrics import OPERATING_FARS, bootstrap_ci, calculate_biometric_metrics, operating_point
+
+    genuine, impostor = distributions['genuine'].channel(channel), distributions['impostor'].channel(channel)
+    scores, labels = _sample_arrays(distributions, channel)
+    metrics = calculate_biometric_metrics(labels.astype(int), scores, threshold=threshold)
+    fpr, tpr = metrics.pop('fpr'), metrics.pop('tpr')
+    keep = np.unique(np.linspace(0, len(fpr) - 1, min(ROC_POINTS, len(fpr))).astype(int))
+
+    true_accepts = genuine['count'] * np.mean(genuine['sample'] >= threshold)
+    false_accepts = impostor['count'] * np.mean(impostor['sample'] >= threshold)
+    total = genuine['count'] + impostor['count']
+    precision = true_accepts / (true_accepts + false_accepts) if true_accepts + false_accepts else 0.0
+    recall = true_accepts / genuine['count']
+    metrics.update(
+        accuracy=(true_accepts + impostor['count'] - false_accepts) / total,
+        precision=precision,
+        recall=recall,
+        f1=2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        far=false_accepts / impostor['count'],
+        frr=1 - recall
+    )
+    thresholds, far, frr = _error_rates(genuine, impostor)
+    # DET points spaced evenly in log FAR, where the operating points are
+    targets = np.logspace(np.log10(max(far[far > 0].min(initial=1.0), 1e-6)), 0, ROC_POINTS)
+    det = np.unique(np.searchsorted(-far, -targets))
+    summary = {key: float(value) for key, value in metrics.items()}
+    summary.update(
+        threshold=threshold,
+        genuine=genuine['count'],
+        impostor=impostor['count'],
+        genuine_mean=genuine['mean'], genuine_std=genuine['std'],
+        impostor_mean=impostor['mean'], impostor_std=impostor['std'],
+        operating_points={f"{target:g}": operating_point(thresholds, far, frr, target) for target in OPERATING_FARS},
+        roc={"fpr": fpr[keep].round(6).tolist(), "tpr": tpr[keep].round(6).tolist()},
+        det={"far": far[det].tolist(), "frr": frr[det].tolist()}
+    )
+    if bootstrap:
+        summary['confidence_intervals'] = bootstrap_ci(genuine['sample'], impostor['sample'],
+                                                       resamples=bootstrap, seed=seed)
+    return summary
+
+def load_report(eval_dir: str = paths_config.EVAL_DIR) -> Optional[Dict]:
+    """The latest evaluation report, or None if the runner has not been run yet."""
+    path = os.path.join(eval_dir, REPORT_FILE)
+    if not os.path.exists(path):
+        return None
+    return serialization.load_file(path)
+
+def run_evaluation(face_root: str, voice_root: str, eval_dir: str = paths_config.EVAL_DIR,
+                   max_identities: int = 50, per_identity: int = 10, threshold: float = 0.7,
+                   face_weight: float = 0.6, voice_weight: float = 0.4, seed: int = 0,
+                   exclude=DEFAULT_EXCLUDE, executor=None, window: int = 2,
+                   tile: int = TILE, workers: int = None, bootstrap: int = 1000) -> Dict:
+    """Evaluate whichever datasets are configured, write report.json and scores.npz, return the report."""
+    from fusion.fusion_engine import FusionEngine
+
+    fusion_engine = FusionEngine(face_weight=face_weight, voice_weight=voice_weight)
+    matcher = fusion_engine.matcher
+    score_fns = {"face": matcher.match_face_batch, "voice": matcher.match_voice_batch}
+    roots = {"face": face_root, "voice": voice_root}
+    extensions = {"face": FACE_EXTENSIONS, "voice": VOICE_EXTENSIONS}
+    models = {"face": FACE_MODEL, "voice": "mfcc"}
+
+    report = {
+        "generated_at": datetime.now().isoformat(),
+        "config": {"max_identities": max_identities, "per_identity": per_identity, "threshold": threshold,
+                   "face_weight": face_weight, "voice_weight": voice_weight, "seed": seed,
+                   "bootstrap": bootstrap},
+        "datasets": {},
+        "modalities": {}
+    }
+    arrays, selected, features = {}, {}, {}
+    for modality, root in roots.items():
+        if not root or not os.path.isdir(root):
+            continue
+        rng = random.Random(seed)
+        selected[modality] = select_samples(list_samples(root, extensions[modality], exclude),
+                                            max_identities, per_identity, rng)
+        paths = [p for group in selected[modality].values() for p in group]
+        cache = FeatureCache(os.path.join(eval_dir, CACHE_DIR, f'{modality}.npz'), models[modality])
+        features[modality] = extract_features(paths, modality, cache, executor=executor, window=window)
+
+        vectors, labels = _stack(selected[modality], features[modality])
+        report['datasets'][modality] = {"root": root, "identities": len(selected[modality]),
+                                        "samples": len(paths), "failed": len(paths) - len(labels)}
+        if len(labels) < 2:
+            continue
+        distributions = score_distributions(len(labels), labels, matrix_scorer(vectors, score_fns[modality], modality),
+                                            (modality,), tile=tile, workers=workers, seed=seed)
+        if distributions['genuine'].count and distributions['impostor'].count:
+            report['modalities'][modality] = summarize_scores(distributions, modality, threshold, bootstrap, seed)
+            arrays[f'{modality}_scores'], arrays[f'{modality}_labels'] = _sample_arrays(distributions, modality)
+
+    if 'face' in selected and 'voice' in selected:
+        pairs = chimeric_pairs(selected['face'], features['face'], selected['voice'], features['voice'],
+                               random.Random(seed))
+        if pairs is not None:
+            faces, voices, subjects = pairs
+
+            def fused_tile(rows, columns):
+                face_scores = score_fns['face'](faces[rows], faces[columns])
+                voice_scores = score_fns['voice'](voices[rows], voices[columns])
+                return {"face": face_scores, "voice": voice_scores,
+                        "fused": fusion_engine.fuse_scores(face_scores, voice_scores)}
+
+            distributions = score_distributions(len(subjects), subjects, fused_tile, ("face", "voice", "fused"),
+                                                tile=tile, workers=workers, seed=seed)
+            if distributions['genuine'].count and distributions['impostor'].count:
+                report['modalities']['fused'] = summarize_scores(distributions, 'fused', threshold, bootstrap, seed)
+                # The reservoir samples whole pairs, so the face and voice columns line up
+                arrays['fused_face'], arrays['fused_labels'] = _sample_arrays(distributions, 'face')
+                arrays['fused_voice'], _ = _sample_arrays(distributions, 'voice')
+
+    os.makedirs(eval_dir, exist_ok=True)
+    np.savez(os.path.join(eval_dir, SCORES_FILE), **arrays)
+    with open(os.path.join(eval_dir, REPORT_FILE), 'wb') as f:
+        f.write(serialization.dumps(report, indent=True))
+    return report
+
+# ============ CLI ============
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate the pipeline on the configured face and voice datasets.")
+    parser.add_argument('--face-dataset', default=paths_config.FACE_DATASET_PATH)
+    parser.add_argument('--voice-dataset', default=paths_config.VOICE_DATASET_PATH)
+    parser.add_argument('--output', default=paths_config.EVAL_DIR, help="report directory (default: EVAL_DIR)")
+    parser.add_argument('--max-identities', type=int, default=50)
+    parser.add_argument('--per-identity', type=int, default=10)
+    parser.add_argument('--threshold', type=float, help="decision threshold (default: the deployed fusion config's)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--exclude', nargs='*', default=list(DEFAULT_EXCLUDE), help="folder names to skip")
+    parser.add_argument('--tile', type=int, default=TILE, help="rows and columns per score-matrix tile")
+    parser.add_argument('--workers', type=int, help="threads scoring tiles (default: CPU count)")
+    parser.add_argument('--bootstrap', type=int, default=1000, help="resamples for confidence intervals (0: none)")
+    args = parser.parse_args(argv)
+
+    if not any(path and os.path.isdir(path) for path in (args.face_dataset, args.voice_dataset)):
+        parser.error("no dataset found; set FACE_DATASET_PATH / VOICE_DATASET_PATH in config/paths_config.py "
+                     "(see data/download_datasets.py) or pass --face-dataset / --voice-dataset")
+
+    from feature_extraction import worker_pool
+    from fusion.fusion_config import load_fusion_config
+
+    # Fused scores as currently deployed
+    fusion_config = load_fusion_config()
+    threshold = fusion_config['threshold'] if args.threshold is None else args.threshold
+    report = run_evaluation(args.face_dataset, args.voice_dataset, args.output,
+                            max_identities=args.max_identities, per_identity=args.per_identity,
+                            threshold=threshold, face_weight=fusion_config['face_weight'],
+                            voice_weight=fusion_config['voice_weight'], seed=args.seed, exclude=tuple(args.exclude),
+                            executor=worker_pool.get_executor(), window=2 * worker_pool.MAX_WORKERS,
+                            tile=args.tile, workers=args.workers, bootstrap=args.bootstrap)
+    worker_pool.shutdown_executor()
+
+    for modality, summary in report['modalities'].items():
+        print(f"{modality:>6}: EER {summary['eer']:.4f}  AUC {summary['auc']:.4f}  "
+              f"accuracy {summary['accuracy']:.4f}  ({summary['genuine']} genuine / {summary['impostor']} impostor)")
+        for target, point in summary['operating_points'].items():
+            print(f"        FRR {point['frr']:.4f} at FAR {target} (threshold {point['threshold']:.4f})")
+    print(f"Report written to {os.path.join(args.output, REPORT_FILE)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+All-pairs genuine/impostor score distributions without materializing all pairs.
+
+The N x N score matrix is computed in fixed-size tiles of the upper triangle
+(each unordered pair once, no self-pairs), so memory stays at one tile per
+worker whatever N is. Tiles run on a thread pool: the scoring is a matrix
+product, which releases the GIL. Each finished tile is split by label into
+genuine and impostor scores and folded into a ScoreAccumulator per class,
+which keeps exact counts and moments, a fixed-bin histogram and a uniform
+reservoir sample of the scores.
+
+A tile scorer returns one or more named channels (e.g. face, voice and fused
+scores of the same pairs); histograms are kept per channel and the reservoir
+samples whole rows, so the channels of a sampled pair stay together.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, Sequence, Tuple
+
+import numpy as np
+
+TILE = 1024
+BINS = 2000
+# Cosine similarities lie in [-1, 1], distance similarities in (0, 1]
+SCORE_RANGE = (-1.0, 1.0)
+RESERVOIR = 100_000
+
+class ScoreAccumulator:
+    """Streaming summary of one class (genuine or impostor) of scores."""
+    def __init__(self, channels: Sequence[str], bins: int = BINS, score_range: Tuple[float, float] = SCORE_RANGE,
+                 reservoir: int = RESERVOIR, seed: int = 0):
+        self.channels = tuple(channels)
+        width = len(self.channels)
+        self.edges = np.linspace(score_range[0], score_range[1], bins + 1)
+        self.histogram = np.zeros((width, bins), dtype=np.int64)
+        self.count = 0
+        self.sum = np.zeros(width)
+        self.sum_squares = np.zeros(width)
+        self.min = np.full(width, np.inf)
+        self.max = np.full(width, -np.inf)
+        self.capacity = reservoir
+        self.sample = np.empty((0, width))
+        self._rng = np.random.default_rng(seed)
+
+    def add(self, values: np.ndarray) -> None:
+        """Fold in a batch of scores, one row per pair and one column per channel."""
+        if len(values) == 0:
+            return
+        bins = len(self.edges) - 1
+        for c in range(len(self.channels)):
+            # Scores outside the range land in the edge bins
+            index = np.clip(np.searchsorted(self.edges, values[:, c], side='right') - 1, 0, bins - 1)
+            self.histogram[c] += np.bincount(index, minlength=bins)
+        self.sum += values.sum(axis=0)
+        self.sum_squares += (values ** 2).sum(axis=0)
+        self.min = np.minimum(self.min, values.min(axis=0))
+        self.max = np.maximum(self.max, values.max(axis=0))
+        self._reservoir_add(values)
+        self.count += len(values)
+
+    def _reservoir_add(self, values: np.ndarray) -> None:
+        # Algorithm R, vectorized: the t-th score overall replaces a random slot with probability capacity / t
+        free = max(self.capacity - len(self.sample), 0)
+        if free:
+            self.sample = np.vstack([self.sample, values[:free]])
+            values = values[free:]
+        if len(values) == 0:
+            return
+        seen = self.count + free + np.arange(1, len(values) + 1)
+        accepted = self._rng.random(len(values)) < self.capacity / seen
+        slots = self._rng.integers(0, self.capacity, accepted.sum())
+        # With repeated slots the later score wins, as in the sequential algorithm
+        self.sample[slots] = values[accepted]
+
+    def mean(self) -> np.ndarray:
+        return self.sum / max(self.count, 1)
+
+    def std(self) -> np.ndarray:
+        return np.sqrt(np.maximum(self.sum_squares / max(self.count, 1) - self.mean() ** 2, 0))
+
+    def channel(self, name: str) -> Dict:
+        """Counts, moments, histogram and reservoir sample of one channel."""
+        c = self.channels.index(name)
+        return {
+            "count": self.count,
+            "mean": float(self.mean()[c]),
+            "std": float(self.std()[c]),
+            "min": float(self.min[c]) if self.count else None,
+            "max": float(self.max[c]) if self.count else None,
+            "edges": self.edges,
+            "histogram": self.histogram[c],
+            "sample": self.sample[:, c]
+        }
+
+def iter_tiles(n: int, tile: int = TILE) -> Iterator[Tuple[slice, slice]]:
+    """Row and column slices of the tiles covering the upper triangle of an n x n matrix."""
+    for start in range(0, n, tile):
+        for column in range(start, n, tile):
+            yield slice(start, min(start + tile, n)), slice(column, min(column + tile, n))
+
+def _split_tile(tile_scores: Callable, labels: np.ndarray, channels: Sequence[str], rows: slice, columns: slice):
+    """Genuine and impostor score rows of one tile, each unordered pair once."""
+    scores = tile_scores(rows, columns)
+    values = np.stack([scores[name] for name in channels], axis=-1)
+    same = labels[rows][:, None] == labels[columns][None, :]
+    keep = np.ones(same.shape, dtype=bool)
+    if rows.start == columns.start:
+        # Diagonal tile: only pairs above the diagonal
+        keep = np.triu(keep, k=1)
+    return values[keep & same], values[keep & ~same]
+
+def score_distributions(n: int, labels: np.ndarray, tile_scores: Callable[[slice, slice], Dict[str, np.ndarray]],
+                        channels: Sequence[str], tile: int = TILE, workers: int = None, bins: int = BINS,
+                        score_range: Tuple[float, float] = SCORE_RANGE, reservoir: int = RESERVOIR,
+                        seed: int = 0) -> Dict[str, ScoreAccumulator]:
+    """
+    Genuine and impostor distributions of all unordered pairs of n samples.
+    tile_scores(rows, columns) returns {channel: (rows x columns) scores}. Returns
+    {'genuine': ScoreAccumulator, 'impostor': ScoreAccumulator}. Tiles are folded in
+    a fixed order, so results are reproducible for a given seed.
+    """
+    labels = np.asarray(labels)
+    workers = workers or os.cpu_count() or 1
+    accumulators = {
+        "genuine": ScoreAccumulator(channels, bins, score_range, reservoir, seed),
+        "impostor": ScoreAccumulator(channels, bins, score_range, reservoir, seed + 1)
+    }
+    tiles = iter_tiles(n, tile)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # A bounded number of tiles in flight caps memory
+        pending = deque()
+        for rows, columns in tiles:
+            pending.append(executor.submit(_split_tile, tile_scores, labels, channels, rows, columns))
+            if len(pending) >= 2 * workers:
+                _fold(pending.popleft().result(), accumulators)
+        while pending:
+            _fold(pending.popleft().result(), accumulators)
+    return accumulators
+
+def _fold(split, accumulators):
+    genuine, impostor = split
+    accumulators['genuine'].add(genuine)
+    accumulators['impostor'].add(impostor)
+
+def matrix_scorer(vectors: np.ndarray, score_fn: Callable, name: str) -> Callable:
+    """Tile scorer for one modality: score_fn(probes, gallery) over row and column slices of vectors."""
+    return lambda rows, columns: {name: score_fn(vectors[rows], vectors[columns])}
@@ -21,3 +21,14 @@ def extract_face_embeddings(image_path_or_array, model_name='VGG-Face'):
     except Exception as e:
         print(f"Error extracting face embeddings: {e}")
         return None
+
+def compute_cosine_similarity(emb1, emb2):
+    """
+    Computes cosine similarity between two embeddings.
+    """
+    if emb1 is None or emb2 is None:
+        return 0.0
+    norm = np.linalg.norm(emb1) * np.linalg.norm(emb2)
+    if norm == 0:
+        return 0.0
+    return float(np.dot(emb1, emb2) / norm)
@@ -0,0 +1,57 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from feature_extraction.voice_features import extract_mfcc
+from pipeline.admission import AdmissionController
+from pipeline.verification import FACE_MODEL
+
+# Number of extraction processes; each holds its own copy of the face model
+MAX_WORKERS = int(os.environ.get('IDENTIX_WORKERS', os.cpu_count() or 1))
+# Requests allowed to wait for an extraction slot before new ones are refused
+QUEUE_SIZE = int(os.environ.get('IDENTIX_QUEUE_SIZE', 2 * MAX_WORKERS))
+
+_executor = None
+_admission = None
+
+def init_worker():
+    """
+    Runs once in every pool process: load the models up front so the first
+    request on each worker does not pay for it. The pipeline stages
+    (pipeline/verification.py) then run in these workers.
+    """
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+    try:
+        from deepface import DeepFace
+        DeepFace.build_model(FACE_MODEL)
+    except Exception as e:
+        print(f"Worker {os.getpid()}: face model preload failed: {e}", flush=True)
+    # Warm up librosa's lazily compiled MFCC path
+    extract_mfcc(np.zeros(16000, dtype=np.float32))
+
+def get_executor() -> ProcessPoolExecutor:
+    """Get the shared extraction pool, starting it on first use."""
+    global _executor
+    if _executor is None:
+        # spawn: TensorFlow and forked threads do not mix
+        _executor = ProcessPoolExecutor(
+            max_workers=MAX_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker
+        )
+    return _executor
+
+def get_admission() -> AdmissionController:
+    """Admission control sized to the pool: one running request per worker, QUEUE_SIZE waiting."""
+    global _admission
+    if _admission is None:
+        _admission = AdmissionController(MAX_WORKERS, QUEUE_SIZE)
+    return _admission
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -4,9 +4,12 @@ import axios from 'axios'
 import toast from 'react-hot-toast'
 import Navbar from '../components/Navbar'
 
+const JOB_POLL_INTERVAL_MS = 1000
+
 function AddPerson() {
   const navigate = useNavigate()
   const [loading, setLoading] = useState(false)
+  const [processing, setProcessing] = useState(false)
   const [formData, setFormData] = useState({
     name: '',
     employee_id: '',
@@ -40,14 +43,36 @@ function AddPerson() {
     if (voiceFile) data.append('voice', voiceFile)
 
     try {
-      await axios.post('http://localhost:5001/api/persons', data)
-      toast.success('Person registered successfully!')
-      navigate('/persons')
+      // Enrollment runs as a background job; poll it until the person is in the gallery
+      const response = await axios.post('http://localhost:5001/api/persons', data)
+      setProcessing(true)
+      const job = await waitForJob(response.data.id)
+
+      if (job.status === 'succeeded') {
+        toast.success(`${job.result.name} registered as ${job.result.id}`)
+        navigate('/persons')
+      } else {
+        toast.error(`Failed to register person: ${job.error}`)
+      }
     } catch (error) {
       console.error(error)
-      toast.error('Failed to register person')
+      if (error.response?.status === 503) {
+        const retryAfter = error.response.headers['retry-after'] || 1
+        toast.error(`System busy, please try again in ${retryAfter}s`)
+      } else {
+        toast.error('Failed to register person')
+      }
     } finally {
       setLoading(false)
+      setProcessing(false)
+    }
+  }
+
+  const waitForJob = async (jobId) => {
+    while (true) {
+      const { data: job } = await axios.get(`http://localhost:5001/api/jobs/${jobId}`)
+      if (job.status === 'succeeded' || job.status === 'failed') return job
+      await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS))
     }
   }
 
@@ -187,7 +212,7 @@ function AddPerson() {
               disabled={loading}
               className="btn-primary flex-1"
             >
-              {loading ? 'Registering...' : 'Register Person'}
+              {processing ? 'Processing biometrics...' : loading ? 'Registering...' : 'Register Person'}
             </button>
             <button
               type="button"
@@ -20,9 +20,18 @@ function PersonsList() {
 
   const fetchPersons = async () => {
     try {
-      const response = await axios.get('http://localhost:5001/api/persons')
-      setPersons(response.data.persons)
-      setFilteredPersons(response.data.persons)
+      // Follow cursors until the last page
+      let all = []
+      let cursor = null
+      do {
+        const response = await axios.get('http://localhost:5001/api/persons', {
+          params: { limit: 1000, cursor: cursor || undefined }
+        })
+        all = all.concat(response.data.persons)
+        cursor = response.data.next_cursor
+      } while (cursor)
+      setPersons(all)
+      setFilteredPersons(all)
     } catch (error) {
       console.error('Error fetching persons:', error)
     } finally {
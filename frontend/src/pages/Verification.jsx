@@ -40,7 +40,12 @@ function Verification() {
       }
     } catch (error) {
       console.error(error)
-      toast.error('Verification failed')
+      if (error.response?.status === 503) {
+        const retryAfter = error.response.headers['retry-after'] || 1
+        toast.error(`System busy, please try again in ${retryAfter}s`)
+      } else {
+        toast.error('Verification failed')
+      }
     } finally {
       setLoading(false)
     }
@@ -0,0 +1,182 @@
+"""
+Calibrate the fusion weights and decision threshold on evaluation scores.
+
+Reads the scores.npz written by the evaluation runner (fused_face, fused_voice
+and fused_labels: the face and voice scores of the same genuine and impostor
+pairs) and searches for the weighted-sum fusion that separates them best:
+
+- grid: every face weight in steps of --step (voice weight = 1 - face weight),
+- logistic: the weight ratio of a logistic regression on (face, voice) scores.
+
+Each candidate is scored at every threshold at once (one sort and one
+searchsorted for a batch of weights), taking the threshold that meets the
+objective: the EER crossing by default, or the lowest FRR with FAR at most
+--target-far. The best candidate is written as the next fusion config version
+(fusion/fusion_config.py), which the servers load at startup.
+
+CLI:
+    python -m fusion.calibration
+    python -m fusion.calibration --target-far 1e-3 --dry-run
+"""
+
+import argparse
+import os
+import sys
+from typing import Dict, Optional
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import paths_config
+from fusion.fusion_config import FUSION_CONFIG_DIR, load_fusion_config, save_fusion_config
+
+# Candidate weights evaluated together; bounds memory at WEIGHT_CHUNK x pairs
+WEIGHT_CHUNK = 8
+
+def load_scores(path: str):
+    """(face, voice, genuine) score arrays of the fused pairs in an evaluation scores.npz."""
+    with np.load(path) as scores:
+        if 'fused_labels' not in scores:
+            raise ValueError(f"{path} has no fused scores; evaluate with both face and voice datasets")
+        return scores['fused_face'], scores['fused_voice'], scores['fused_labels'].astype(bool)
+
+def _best_thresholds(genuine: np.ndarray, impostor: np.ndarray, target_far: Optional[float]) -> Dict[str, np.ndarray]:
+    """
+    Best threshold of each row (one candidate per row) of fused genuine and impostor scores,
+    with its FAR, FRR and the objective's error.
+    """
+    k, n_genuine, n_impostor = len(genuine), genuine.shape[1], impostor.shape[1]
+    genuine, impostor = np.sort(genuine, axis=1), np.sort(impostor, axis=1)
+    low = min(genuine.min(), impostor.min())
+    span = max(genuine.max(), impostor.max()) - low + 1
+    # Shift row r into [r * span, (r + 1) * span) so one flat searchsorted ranks every row at once
+    offset = np.arange(k)[:, None] * span - low
+    reject_all = np.full((k, 1), low + span - 0.5)
+    thresholds = np.concatenate([genuine, impostor, reject_all], axis=1)
+    shifted = (thresholds + offset).ravel()
+    below_genuine = (np.searchsorted((genuine + offset).ravel(), shifted).reshape(k, -1)
+                     - np.arange(k)[:, None] * n_genuine)
+    below_impostor = (np.searchsorted((impostor + offset).ravel(), shifted).reshape(k, -1)
+                      - np.arange(k)[:, None] * n_impostor)
+    far, frr = 1 - below_impostor / n_impostor, below_genuine / n_genuine
+
+    if target_far is None:
+        best = np.argmin(np.abs(far - frr), axis=1)
+    else:
+        best = np.argmin(np.where(far <= target_far, frr, np.inf), axis=1)
+    rows = np.arange(k)
+    far, frr, threshold = far[rows, best], frr[rows, best], thresholds[rows, best]
+    # Every threshold down to the next lower score gives the same rates; take the middle of that gap
+    below_g, below_i = below_genuine[rows, best], below_impostor[rows, best]
+    previous = np.maximum(np.where(below_g > 0, genuine[rows, np.maximum(below_g - 1, 0)], -np.inf),
+                          np.where(below_i > 0, impostor[rows, np.maximum(below_i - 1, 0)], -np.inf))
+    threshold = np.where(np.isfinite(previous), (previous + threshold) / 2, threshold)
+    return {"threshold": threshold, "far": far, "frr": frr,
+            "error": (far + frr) / 2 if target_far is None else frr}
+
+def evaluate_weights(face: np.ndarray, voice: np.ndarray, genuine: np.ndarray, face_weights,
+                     target_far: Optional[float] = None) -> Dict[str, np.ndarray]:
+    """Best threshold, FAR, FRR and error for each candidate face weight (voice weight = 1 - face weight)."""
+    face_weights = np.asarray(face_weights, dtype=np.float64)
+    chunks = []
+    for start in range(0, len(face_weights), WEIGHT_CHUNK):
+        w = face_weights[start:start + WEIGHT_CHUNK, None]
+        fused = w * face[None, :] + (1 - w) * voice[None, :]
+        chunks.append(_best_thresholds(fused[:, genuine], fused[:, ~genuine], target_far))
+    return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+
+def logistic_face_weight(face: np.ndarray, voice: np.ndarray, genuine: np.ndarray) -> Optional[float]:
+    """Face share of the logistic regression coefficients, or None if they do not give a usable weighting."""
+    from sklearn.linear_model import LogisticRegression
+
+    model = LogisticRegression(class_weight='balanced').fit(np.column_stack([face, voice]), genuine)
+    face_coef, voice_coef = model.coef_[0]
+    if face_coef + voice_coef <= 0:
+        return None
+    return float(face_coef / (face_coef + voice_coef))
+
+def _candidate(method: str, face_weight: float, result: Dict[str, np.ndarray], i: int = 0) -> Dict:
+    return {"method": method, "face_weight": round(float(face_weight), 6),
+            "voice_weight": round(1 - float(face_weight), 6), "threshold": float(result['threshold'][i]), "far": float(result['far'][i]),
+            "frr": float(result['frr'][i]), "error": float(result['error'][i])}
+
+def calibrate(face: np.ndarray, voice: np.ndarray, genuine: np.ndarray, target_far: Optional[float] = None,
+              step: float = 0.01, baseline: Optional[Dict] = None) -> Dict:
+    """
+    Search fusion weights and threshold. Returns the fusion settings of the best candidate
+    plus every method's best candidate and, if a baseline config is given, how it scores.
+    Among equally good grid weights the one closest to the baseline's wins.
+    """
+    genuine = np.asarray(genuine, dtype=bool)
+    if genuine.all() or not genuine.any():
+        raise ValueError("Calibration needs both genuine and impostor pairs")
+    candidates = []
+
+    grid = np.round(np.arange(0, 1 + step / 2, step), 6)
+    result = evaluate_weights(face, voice, genuine, grid, target_far)
+    current = baseline['face_weight'] if baseline else 0.5
+    best = int(np.lexsort((np.abs(grid - current), result['error']))[0])
+    candidates.append(_candidate('grid', grid[best], result, best))
+
+    face_weight = logistic_face_weight(face, voice, genuine)
+    if face_weight is not None:
+        candidates.append(_candidate('logistic', face_weight, evaluate_weights(face, voice, genuine, [face_weight],
+                                                                               target_far)))
+
+    chosen = min(candidates, key=lambda c: c['error'])
+    settings = {
+        "face_weight": chosen['face_weight'],
+        "voice_weight": chosen['voice_weight'],
+        "threshold": chosen['threshold'],
+        # Evaluation scores are raw similarities, so the result is tuned for raw gallery scores
+        "normalization": "none",
+        "method": chosen['method'],
+        "objective": {"name": "eer"} if target_far is None else {"name": "frr_at_far", "target_far": target_far},
+        "metrics": {"far": chosen['far'], "frr": chosen['frr'], "error": chosen['error']},
+        "pairs": {"genuine": int(genuine.sum()), "impostor": int((~genuine).sum())},
+        "candidates": candidates
+    }
+    if baseline:
+        # The current weights, with their threshold re-chosen for the objective and as deployed
+        result = evaluate_weights(face, voice, genuine, [baseline['face_weight']], target_far)
+        fused = baseline['face_weight'] * face + baseline['voice_weight'] * voice
+        accepted = fused >= baseline['threshold']
+        settings['baseline'] = dict(_candidate('baseline', baseline['face_weight'], result),
+                                    version=baseline['version'], deployed_threshold=baseline['threshold'],
+                                    deployed_far=float(accepted[~genuine].mean()),
+                                    deployed_frr=float(1 - accepted[genuine].mean()))
+    return settings
+
+# ============ CLI ============
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate fusion weights and threshold on evaluation scores.")
+    parser.add_argument('--scores', default=os.path.join(paths_config.EVAL_DIR, 'scores.npz'),
+                        help="scores.npz from python -m evaluation.runner")
+    parser.add_argument('--target-far', type=float, help="minimize FRR at this FAR instead of the EER")
+    parser.add_argument('--step', type=float, default=0.01, help="face weight grid step")
+    parser.add_argument('--config-dir', default=FUSION_CONFIG_DIR)
+    parser.add_argument('--dry-run', action='store_true', help="print the result without writing a config")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.scores):
+        parser.error(f"{args.scores} not found; run python -m evaluation.runner first")
+    face, voice, genuine = load_scores(args.scores)
+    settings = calibrate(face, voice, genuine, args.target_far, args.step,
+                         baseline=load_fusion_config(config_dir=args.config_dir))
+    settings['source'] = os.path.abspath(args.scores)
+
+    for candidate in settings['candidates'] + [settings['baseline']]:
+        print(f"{candidate['method']:>9}: face {candidate['face_weight']:.3f}  voice {candidate['voice_weight']:.3f}  "
+              f"threshold {candidate['threshold']:.4f}  FAR {candidate['far']:.4f}  FRR {candidate['frr']:.4f}")
+    baseline = settings['baseline']
+    print(f"  current: v{baseline['version']} at threshold {baseline['deployed_threshold']:.4f}: "
+          f"FAR {baseline['deployed_far']:.4f}  FRR {baseline['deployed_frr']:.4f}")
+    if args.dry_run:
+        return
+    path = save_fusion_config(settings, args.config_dir)
+    print(f"Wrote {path} ({settings['method']}); restart the servers to load it")
+
+if __name__ == '__main__':
+    main()
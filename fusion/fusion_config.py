@@ -0,0 +1,61 @@
+"""
+Versioned fusion settings: weights of the weighted-sum fusion and the decision threshold.
+
+Each calibration run (fusion/calibration.py) writes a new fusion_vNNNN.json
+under FUSION_CONFIG_DIR and never rewrites an old one. The servers load the
+highest version at startup, so retuning is a new file plus a restart, and
+rolling back is deleting (or pinning, with IDENTIX_FUSION_CONFIG) a file.
+Without any file the historical defaults apply.
+"""
+
+import os
+import re
+from datetime import datetime
+from typing import Dict, Optional
+
+from config import paths_config
+from models.score_norm import NORMALIZATIONS
+from utils import serialization
+
+FUSION_CONFIG_DIR = paths_config.FUSION_CONFIG_DIR
+# normalization: gallery score normalization (models/score_norm.py) the weights and threshold were tuned for
+DEFAULT_FUSION = {"version": 0, "face_weight": 0.6, "voice_weight": 0.4, "threshold": 0.7, "normalization": "none"}
+
+_VERSIONED = re.compile(r'^fusion_v(\d+)\.json$')
+
+def _versions(config_dir: str) -> Dict[int, str]:
+    if not os.path.isdir(config_dir):
+        return {}
+    return {int(m.group(1)): os.path.join(config_dir, name)
+            for name in os.listdir(config_dir) if (m := _VERSIONED.match(name))}
+
+def load_fusion_config(path: Optional[str] = None, config_dir: str = FUSION_CONFIG_DIR) -> Dict:
+    """
+    The fusion config at path, else at $IDENTIX_FUSION_CONFIG, else the highest version in
+    config_dir, else DEFAULT_FUSION.
+    """
+    path = path or os.environ.get('IDENTIX_FUSION_CONFIG')
+    if not path:
+        versions = _versions(config_dir)
+        if not versions:
+            return dict(DEFAULT_FUSION)
+        path = versions[max(versions)]
+    config = serialization.load_file(path)
+    missing = {'face_weight', 'voice_weight', 'threshold'} - set(config)
+    if missing:
+        raise ValueError(f"Fusion config {path} is missing {', '.join(sorted(missing))}")
+    config = dict(DEFAULT_FUSION, **config)
+    if config['normalization'] not in NORMALIZATIONS:
+        raise ValueError(f"Fusion config {path} has unknown normalization {config['normalization']!r}")
+    return config
+
+def save_fusion_config(settings: Dict, config_dir: str = FUSION_CONFIG_DIR) -> str:
+    """Write settings as the next version in config_dir and return the new file's path."""
+    os.makedirs(config_dir, exist_ok=True)
+    version = max(_versions(config_dir), default=0) + 1
+    config = dict(settings, version=version, created_at=datetime.now().isoformat())
+    path = os.path.join(config_dir, f'fusion_v{version:04d}.json')
+    # 'x': two concurrent calibrations never overwrite each other's version
+    with open(path, 'xb') as f:
+        f.write(serialization.dumps(config, indent=True))
+    return path
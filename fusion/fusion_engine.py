@@ -1,21 +1,24 @@
 import numpy as np
+from models.matcher import BiometricMatcher
 
 class FusionEngine:
     def __init__(self, face_weight=0.6, voice_weight=0.4):
         self.face_weight = face_weight
         self.voice_weight = voice_weight
+        self.matcher = BiometricMatcher()
 
     def normalize_scores(self, scores):
         """
         Simple Min-Max normalization (not always needed if using similarities).
+        For cohort normalization of gallery scores see models/score_norm.py.
         """
-        if len(scores) == 0:
+        scores = np.asarray(scores, dtype=np.float64)
+        if scores.size == 0:
             return scores
-        min_val = min(scores)
-        max_val = max(scores)
+        min_val, max_val = scores.min(), scores.max()
         if max_val == min_val:
-            return [1.0 for _ in scores]
-        return [(s - min_val) / (max_val - min_val) for s in scores]
+            return np.ones_like(scores)
+        return (scores - min_val) / (max_val - min_val)
 
     def fuse_scores(self, face_score, voice_score):
         """
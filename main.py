@@ -1,5 +1,4 @@
 import streamlit as st
-import numpy as np
 import os
 import sys
 from PIL import Image
@@ -7,12 +6,11 @@ from PIL import Image
 # Add project root to path
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 
-from preprocessing.face_prep import detect_and_align_face
-from preprocessing.voice_prep import load_and_preprocess_audio
-from feature_extraction.face_features import extract_face_embeddings
-from feature_extraction.voice_features import extract_mfcc
+from pipeline.verification import FeatureFileMatch, VerificationPipeline, WeightedFusion
+from fusion.fusion_config import load_fusion_config
 from fusion.fusion_engine import FusionEngine
-from evaluation.metrics import calculate_biometric_metrics, plot_roc_curve
+from evaluation.metrics import plot_roc_curve
+from evaluation.runner import load_report
 
 # --- Page Setup ---
 st.set_page_config(
@@ -138,7 +136,8 @@ with st.sidebar:
     st.info("Build v1.0.0-Academic")
 
 # --- Initialize Engines ---
-fusion_engine = FusionEngine(face_weight=0.6, voice_weight=0.4)
+fusion_config = load_fusion_config()
+fusion_engine = FusionEngine(face_weight=fusion_config['face_weight'], voice_weight=fusion_config['voice_weight'])
 
 # --- Main Logic ---
 
@@ -176,49 +175,21 @@ if nav == "Identity Verification":
                 FACE_FEAT_PATH = os.path.join(feat_dir, "face_embeddings.npy")
                 VOICE_FEAT_PATH = os.path.join(feat_dir, "voice_mfccs.npy")
                 
-                # --- Face Matching ---
-                face_score = 0.0
-                if uploaded_face:
-                    with open("temp_face.jpg", "wb") as f:
-                        f.write(uploaded_face.getbuffer())
-                    
-                    probe_emb = extract_face_embeddings("temp_face.jpg")
-                    if probe_emb is not None and face_exists:
-                        try:
-                            gallery_faces = np.load(FACE_FEAT_PATH)
-                            scores = [fusion_engine.matcher.match_face(probe_emb, g_emb) for g_emb in gallery_faces]
-                            face_score = max(scores) if scores else 0.0
-                        except Exception as e:
-                            st.error(f"Gallery Error: {e}")
-                    elif not face_exists:
-                        # Demo Fallback
-                        face_score = np.random.uniform(0.6, 0.95)
-                
-                # --- Voice Matching ---
-                voice_score = 0.0
-                if uploaded_voice:
-                    with open("temp_voice.wav", "wb") as f:
-                        f.write(uploaded_voice.getbuffer())
-                    
-                    probe_mfcc = extract_mfcc("temp_voice.wav")
-                    if probe_mfcc is not None and voice_exists:
-                        try:
-                            gallery_voices = np.load(VOICE_FEAT_PATH)
-                            scores = [fusion_engine.matcher.match_voice(probe_mfcc, g_mfcc) for g_mfcc in gallery_voices]
-                            voice_score = max(scores) if scores else 0.0
-                        except:
-                            voice_score = 0.0
-                    elif not voice_exists:
-                        # Demo Fallback
-                        voice_score = np.random.uniform(0.5, 0.9)
-                
-                # Clean up
-                if os.path.exists("temp_face.jpg"): os.remove("temp_face.jpg")
-                if os.path.exists("temp_voice.wav"): os.remove("temp_voice.wav")
-                
-                # --- Decision ---
-                fused_score = fusion_engine.fuse_scores(face_score, voice_score)
-                is_verified = fusion_engine.make_decision(fused_score)
+                # --- Matching & Decision ---
+                pipeline = VerificationPipeline(
+                    match=FeatureFileMatch(FACE_FEAT_PATH, VOICE_FEAT_PATH, matcher=fusion_engine.matcher),
+                    fuse=WeightedFusion(fusion_engine, fusion_config['threshold'])
+                )
+                voice_suffix = os.path.splitext(uploaded_voice.name)[1].lower() if uploaded_voice else '.wav'
+                result = pipeline.run(
+                    uploaded_face.getvalue() if uploaded_face else None,
+                    uploaded_voice.getvalue() if uploaded_voice else None,
+                    voice_suffix
+                )
+                face_score = result['scores']['face']
+                voice_score = result['scores']['voice']
+                fused_score = result['scores']['fused']
+                is_verified = result['verified']
                 
                 # --- Results Display ---
                 res_col1, res_col2 = st.columns([1, 2])
@@ -251,38 +222,47 @@ elif nav == "System Evaluation":
     st.markdown("## 📊 Performance Analytics")
     st.markdown("Academic evaluation metrics derived from the validation dataset.")
     
-    # Generate Synthetic Evaluation Data
-    n_samples = 100
-    y_true = np.array([1]*50 + [0]*50)
-    face_scores = np.clip(np.concatenate([np.random.normal(0.8, 0.1, 50), np.random.normal(0.3, 0.1, 50)]), 0, 1)
-    voice_scores = np.clip(np.concatenate([np.random.normal(0.7, 0.15, 50), np.random.normal(0.4, 0.15, 50)]), 0, 1)
-    fused_scores = [fusion_engine.fuse_scores(f, v) for f, v in zip(face_scores, voice_scores)]
-    
-    m_fused = calculate_biometric_metrics(y_true, fused_scores)
+    # Written by the offline evaluation runner (python -m evaluation.runner)
+    report = load_report()
     
-    col1, col2 = st.columns([2, 1])
-    
-    with col1:
-        st.markdown("### ROC Analysis")
-        fig = plot_roc_curve(m_fused['fpr'], m_fused['tpr'], m_fused['auc'], title="Multi-Modal ROC Curve")
-        # Customize Matplotlib to match theme
-        fig.patch.set_facecolor('#0f172a')
-        ax = fig.gca()
-        ax.set_facecolor('#1e293b')
-        ax.tick_params(colors='white')
-        ax.xaxis.label.set_color('white')
-        ax.yaxis.label.set_color('white')
-        ax.title.set_color('white')
-        for spine in ax.spines.values(): spine.set_color('white')
+    if not report or not report['modalities']:
+        st.info("No evaluation report yet. Configure the datasets in `config/paths_config.py` and run "
+                "`python -m evaluation.runner` to evaluate the pipeline on them.")
+    else:
+        modality = 'fused' if 'fused' in report['modalities'] else next(iter(report['modalities']))
+        m_fused = report['modalities'][modality]
         
-        st.pyplot(fig)
+        col1, col2 = st.columns([2, 1])
         
-    with col2:
-        st.markdown("### Key Metrics")
-        st.metric("System Accuracy", f"{m_fused['accuracy']:.2%}")
-        st.metric("Equal Error Rate (EER)", f"{m_fused['eer']:.4f}")
-        st.metric("AUC Score", f"{m_fused['auc']:.4f}")
-        st.caption("Based on validation set of N=100 samples.")
+        with col1:
+            st.markdown("### ROC Analysis")
+            title = "Multi-Modal ROC Curve" if modality == 'fused' else f"{modality.capitalize()} ROC Curve"
+            fig = plot_roc_curve(m_fused['roc']['fpr'], m_fused['roc']['tpr'], m_fused['auc'], title=title)
+            # Customize Matplotlib to match theme
+            fig.patch.set_facecolor('#0f172a')
+            ax = fig.gca()
+            ax.set_facecolor('#1e293b')
+            ax.tick_params(colors='white')
+            ax.xaxis.label.set_color('white')
+            ax.yaxis.label.set_color('white')
+            ax.title.set_color('white')
+            for spine in ax.spines.values(): spine.set_color('white')
+            
+            st.pyplot(fig)
+            
+        with col2:
+            st.markdown("### Key Metrics")
+            st.metric("System Accuracy", f"{m_fused['accuracy']:.2%}")
+            ci = m_fused.get('confidence_intervals', {})
+            eer_ci = ci.get('eer')
+            st.metric("Equal Error Rate (EER)", f"{m_fused['eer']:.4f}",
+                      help=f"95% CI {eer_ci['low']:.4f} - {eer_ci['high']:.4f}" if eer_ci else None)
+            st.metric("AUC Score", f"{m_fused['auc']:.4f}")
+            point = m_fused.get('operating_points', {}).get('0.001')
+            if point:
+                st.metric("FRR @ FAR 0.1%", f"{point['frr']:.2%}", help=f"Threshold {point['threshold']:.4f}")
+            st.caption(f"{m_fused['genuine']:,} genuine and {m_fused['impostor']:,} impostor comparisons, "
+                       f"evaluated {report['generated_at'][:16].replace('T', ' ')}.")
 
 elif nav == "Diagnostics":
     st.markdown("## 🛠️ System Diagnostics")
@@ -0,0 +1,161 @@
+import os
+import numpy as np
+from models.matcher import BiometricMatcher
+from utils import metrics, shared_templates, template_store
+
+class Gallery:
+    """
+    In-memory gallery of enrolled biometric templates.
+    This is the only read path for templates: person metadata never carries them.
+    The arrays are either private copies or read-only views into shared memory.
+    """
+    def __init__(self, templates, matcher=None, segment=None, source_stamp=None):
+        self.matcher = matcher or BiometricMatcher()
+        self.segment = segment  # Shared memory backing the arrays, if attached
+        self.source_stamp = source_stamp
+        self.person_ids = templates['person_ids']
+        self.face = templates['face']
+        self.face_mask = templates['face_mask']
+        self.voice = templates['voice']
+        self.voice_mask = templates['voice_mask']
+        self.admin_face = templates['admin_face']
+        self._normalizer = None
+        self._normalizer_stamp = None
+
+    @classmethod
+    def load(cls, matcher=None):
+        # Stamp first: a write racing the load then just triggers another reload
+        source_stamp = template_store.store_stamp()
+        return cls(template_store.load_templates(), matcher=matcher, source_stamp=source_stamp)
+
+    @classmethod
+    def attach(cls, version, matcher=None):
+        """Zero-copy gallery over a version published in shared memory."""
+        templates, source_stamp, segment = shared_templates.attach(version)
+        return cls(templates, matcher=matcher, segment=segment, source_stamp=source_stamp)
+
+    def __len__(self):
+        return len(self.person_ids)
+
+    def _candidates(self, mask, person_ids=None):
+        """Row indices holding a template, optionally restricted to a set of person IDs."""
+        if person_ids is not None:
+            mask = mask & np.isin(self.person_ids, list(person_ids))
+        return np.flatnonzero(mask)
+
+    @property
+    def normalizer(self):
+        """Cohort score normalization aligned to this gallery's rows (models/score_norm.py), reloaded when recomputed."""
+        from models.score_norm import ScoreNormalizer, load_cohort_stats, norm_path
+
+        path = norm_path()
+        stamp = os.stat(path).st_mtime_ns if os.path.exists(path) else 0
+        if self._normalizer is None or stamp != self._normalizer_stamp:
+            self._normalizer = ScoreNormalizer(self.person_ids, load_cohort_stats(), matcher=self.matcher)
+            self._normalizer_stamp = stamp
+        return self._normalizer
+
+    def _best(self, rows, scores):
+        if len(rows) == 0:
+            return None, 0.0
+        best = int(np.argmax(scores))
+        return str(self.person_ids[rows[best]]), float(scores[best])
+
+    def match_face(self, probe_embedding, person_ids=None, normalization='none'):
+        """
+        Best face match as (person_id, score); (None, 0.0) if nothing is enrolled.
+        normalization is one of models.score_norm.NORMALIZATIONS.
+        """
+        rows = self._candidates(self.face_mask, person_ids)
+        scores = self.matcher.match_face_gallery(probe_embedding, self.face[rows])
+        if normalization != 'none' and len(rows):
+            scores = self.normalizer.normalize('face', scores, rows, probe_embedding, normalization)
+        return self._best(rows, scores)
+
+    def match_voice(self, probe_mfcc, person_ids=None, normalization='none'):
+        """
+        Best voice match as (person_id, score); (None, 0.0) if nothing is enrolled.
+        normalization is one of models.score_norm.NORMALIZATIONS.
+        """
+        rows = self._candidates(self.voice_mask, person_ids)
+        scores = self.matcher.match_voice_gallery(probe_mfcc, self.voice[rows])
+        if normalization != 'none' and len(rows):
+            scores = self.normalizer.normalize('voice', scores, rows, probe_mfcc, normalization)
+        return self._best(rows, scores)
+
+    def match_admin(self, probe_embedding):
+        """
+        Face similarity against the admin template, or None if no admin is enrolled.
+        """
+        if self.admin_face.size == 0:
+            return None
+        return self.matcher.match_face(probe_embedding, self.admin_face)
+
+# Process-wide gallery, refreshed whenever the template store changes. It is
+# attached from shared memory when enabled, so all server processes share one copy.
+_gallery = None
+_gallery_version = None
+_shared_failed = False
+# Segments of replaced galleries that in-flight requests may still be reading
+_retired_segments = []
+
+def _attach_current(stamp):
+    """Attach the published gallery, publishing the store first if it is missing or stale."""
+    for _ in range(3):
+        version = shared_templates.current_version()
+        try:
+            if version:
+                gallery = Gallery.attach(version)
+                if gallery.source_stamp == stamp:
+                    return gallery, version
+            # Nothing published yet, or the store was rewritten without publishing
+            version = shared_templates.publish(template_store.load_templates(), stamp)
+            return Gallery.attach(version), version
+        except FileNotFoundError:
+            continue  # Replaced by a newer version meanwhile
+    raise RuntimeError("shared gallery kept changing while attaching")
+
+def _release_retired():
+    for segment in list(_retired_segments):
+        try:
+            segment.close()
+            _retired_segments.remove(segment)
+        except BufferError:
+            pass  # Still referenced by a request; try again on the next switch
+
+def get_gallery():
+    """Get the current gallery, switching over if the template store was rewritten."""
+    global _gallery, _gallery_version, _shared_failed
+    stamp = template_store.store_stamp()
+    shared = shared_templates.ENABLED and not _shared_failed
+
+    if shared:
+        try:
+            version = shared_templates.current_version()
+            fresh = _gallery is not None and version == _gallery_version and _gallery.source_stamp == stamp
+            metrics.cache_lookup('gallery', fresh)
+            if not fresh:
+                previous = _gallery
+                _gallery, _gallery_version = _attach_current(stamp)
+                _count_templates(_gallery)
+                if previous is not None and previous.segment is not None:
+                    _retired_segments.append(previous.segment)
+                del previous
+                _release_retired()
+            return _gallery
+        except Exception as e:
+            print(f"Shared gallery unavailable, loading templates per process: {e}")
+            _shared_failed = True
+            _gallery = None
+
+    fresh = _gallery is not None and _gallery.source_stamp == stamp
+    metrics.cache_lookup('gallery', fresh)
+    if not fresh:
+        _gallery = Gallery.load()
+        _count_templates(_gallery)
+    return _gallery
+
+def _count_templates(gallery):
+    """Report a newly built or swapped-in gallery's size."""
+    metrics.GALLERY_TEMPLATES.set(int(gallery.face_mask.sum()), modality='face')
+    metrics.GALLERY_TEMPLATES.set(int(gallery.voice_mask.sum()), modality='voice')
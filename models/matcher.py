@@ -23,6 +23,53 @@ class BiometricMatcher:
         similarity = 1.0 / (1.0 + distance)
         return similarity
 
+    def match_face_gallery(self, probe_embedding, gallery_embeddings):
+        """
+        Cosine similarity of one probe against every row of a gallery matrix.
+        """
+        gallery_embeddings = np.asarray(gallery_embeddings, dtype=np.float64)
+        if gallery_embeddings.size == 0:
+            return np.zeros(len(gallery_embeddings))
+        probe = np.asarray(probe_embedding, dtype=np.float64)
+        norms = np.linalg.norm(gallery_embeddings, axis=1) * np.linalg.norm(probe)
+        dots = gallery_embeddings @ probe
+        return np.divide(dots, norms, out=np.zeros_like(dots), where=norms > 0)
+
+    def match_voice_gallery(self, probe_mfcc, gallery_mfccs):
+        """
+        Distance-based similarity of one probe against every row of a gallery matrix.
+        """
+        gallery_mfccs = np.asarray(gallery_mfccs, dtype=np.float64)
+        if gallery_mfccs.size == 0:
+            return np.zeros(len(gallery_mfccs))
+        distances = np.linalg.norm(gallery_mfccs - np.asarray(probe_mfcc, dtype=np.float64), axis=1)
+        return 1.0 / (1.0 + distances)
+
+    def match_face_batch(self, probe_embeddings, gallery_embeddings):
+        """
+        Cosine similarity of every probe row against every gallery row: (probes x gallery).
+        """
+        probes = np.asarray(probe_embeddings, dtype=np.float64)
+        gallery_embeddings = np.asarray(gallery_embeddings, dtype=np.float64)
+        if probes.size == 0 or gallery_embeddings.size == 0:
+            return np.zeros((len(probes), len(gallery_embeddings)))
+        norms = np.outer(np.linalg.norm(probes, axis=1), np.linalg.norm(gallery_embeddings, axis=1))
+        dots = probes @ gallery_embeddings.T
+        return np.divide(dots, norms, out=np.zeros_like(dots), where=norms > 0)
+
+    def match_voice_batch(self, probe_mfccs, gallery_mfccs):
+        """
+        Distance-based similarity of every probe row against every gallery row: (probes x gallery).
+        """
+        probes = np.asarray(probe_mfccs, dtype=np.float64)
+        gallery_mfccs = np.asarray(gallery_mfccs, dtype=np.float64)
+        if probes.size == 0 or gallery_mfccs.size == 0:
+            return np.zeros((len(probes), len(gallery_mfccs)))
+        # |a - b|^2 = |a|^2 + |b|^2 - 2ab, one matrix product for the whole batch
+        squared = (np.sum(probes ** 2, axis=1)[:, None] + np.sum(gallery_mfccs ** 2, axis=1)[None, :]
+                   - 2 * probes @ gallery_mfccs.T)
+        return 1.0 / (1.0 + np.sqrt(np.maximum(squared, 0)))
+
     def verify_identity(self, face_score, voice_score, fusion_threshold=0.5):
         """
         Simple decision-level check for individual modalities (optional).
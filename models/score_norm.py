@@ -0,0 +1,177 @@
+"""
+Cohort score normalization for gallery matching.
+
+Face scores are cosine similarities and voice scores 1/(1 + distance), so raw
+scores of the two modalities live on different scales, and some identities
+attract higher impostor scores than others. The statistics that put scores on
+a common scale are computed offline from the enrolled templates and stored
+next to the template store (templates_norm.npz):
+
+- per identity and modality: mean and std of the template's scores against a
+  cohort of other enrolled templates (all impostor scores),
+- per modality: mean and std over all those scores (used for persons enrolled
+  after the statistics were computed),
+- per modality: the cohort templates themselves, for T-norm.
+
+At request time normalization is a lookup of the candidates' rows plus a
+vectorized scale; T-norm adds one matrix product of the probe against the
+cohort. Methods:
+
+- none:  raw scores
+- znorm: (s - mean_id) / std_id
+- tanh:  0.5 * (tanh(TANH_SPREAD * znorm) + 1), in (0, 1)
+- tnorm: (s - mean_c) / std_c over the probe's scores against the cohort,
+         without its best cohort score (possibly its own identity)
+
+CLI (after enrolling, re-run whenever the gallery has grown noticeably):
+    python -m models.score_norm
+"""
+
+import argparse
+import os
+import sys
+from typing import Dict, Optional
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import template_store
+
+NORMALIZATIONS = ('none', 'znorm', 'tanh', 'tnorm')
+COHORT_SIZE = 200
+# The textbook 0.01 assumes genuine-score estimates; impostor cohort z-scores spread wider
+TANH_SPREAD = 0.1
+MIN_STD = 1e-6
+MODALITIES = ('face', 'voice')
+
+def norm_path() -> str:
+    """Path of the statistics file, next to the template store."""
+    return os.path.splitext(template_store.TEMPLATES_PATH)[0] + '_norm.npz'
+
+def _score_fn(matcher, modality: str):
+    return matcher.match_face_batch if modality == 'face' else matcher.match_voice_batch
+
+# ============ OFFLINE STATISTICS ============
+
+def compute_cohort_stats(templates: Dict[str, np.ndarray], matcher=None, cohort_size: int = COHORT_SIZE,
+                         seed: int = 0) -> Dict[str, np.ndarray]:
+    """Per-identity and per-modality cohort statistics, and the cohorts, of a template store."""
+    from models.matcher import BiometricMatcher
+
+    matcher = matcher or BiometricMatcher()
+    rng = np.random.default_rng(seed)
+    stats = {"source_stamp": np.array(template_store.store_stamp())}
+    for modality in MODALITIES:
+        rows = np.flatnonzero(templates[f'{modality}_mask'])
+        ids = templates['person_ids'][rows]
+        vectors = templates[modality][rows]
+        cohort = np.sort(rng.choice(len(rows), min(cohort_size, len(rows)), replace=False))
+
+        mean = np.full(len(rows), np.nan)
+        std = np.full(len(rows), np.nan)
+        modality_stats = np.array([np.nan, np.nan])
+        if len(rows) > 1:
+            scores = _score_fn(matcher, modality)(vectors, vectors[cohort])
+            # A template against itself is not an impostor score
+            scores[ids[:, None] == ids[cohort][None, :]] = np.nan
+            mean, std = np.nanmean(scores, axis=1), np.nanstd(scores, axis=1)
+            modality_stats = np.array([np.nanmean(scores), np.nanstd(scores)])
+
+        stats[f'{modality}_ids'] = ids
+        stats[f'{modality}_mean'] = mean
+        stats[f'{modality}_std'] = std
+        stats[f'{modality}_stats'] = modality_stats
+        stats[f'{modality}_cohort'] = vectors[cohort] if len(rows) > 1 else np.zeros((0, vectors.shape[1]))
+    return stats
+
+def save_cohort_stats(stats: Dict[str, np.ndarray]) -> None:
+    """Write the statistics next to the template store."""
+    path = norm_path()
+    # Write next to the target and swap in, so readers never see a partial file
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, **stats)
+    os.replace(tmp_path, path)
+
+def load_cohort_stats() -> Optional[Dict[str, np.ndarray]]:
+    """The stored statistics, or None if they have not been computed."""
+    if not os.path.exists(norm_path()):
+        return None
+    with np.load(norm_path(), allow_pickle=False) as archive:
+        return {key: archive[key] for key in archive.files}
+
+# ============ REQUEST TIME ============
+
+class ScoreNormalizer:
+    """Normalizes gallery scores with cohort statistics aligned to the gallery's rows."""
+    def __init__(self, person_ids: np.ndarray, stats: Optional[Dict[str, np.ndarray]], matcher=None):
+        from models.matcher import BiometricMatcher
+
+        self.matcher = matcher or BiometricMatcher()
+        self.available = stats is not None
+        self.mean, self.std, self.cohort = {}, {}, {}
+        if not self.available:
+            return
+        for modality in MODALITIES:
+            # Persons without their own statistics fall back to the modality's
+            fallback_mean, fallback_std = stats[f'{modality}_stats']
+            row_of = {person_id: i for i, person_id in enumerate(stats[f'{modality}_ids'])}
+            index = np.array([row_of.get(person_id, -1) for person_id in person_ids], dtype=int)
+            known = index >= 0
+            mean = np.full(len(person_ids), fallback_mean)
+            std = np.full(len(person_ids), fallback_std)
+            mean[known] = stats[f'{modality}_mean'][index[known]]
+            std[known] = stats[f'{modality}_std'][index[known]]
+            mean[np.isnan(mean)] = fallback_mean
+            std[np.isnan(std)] = fallback_std
+            self.mean[modality] = mean
+            self.std[modality] = np.maximum(std, MIN_STD)
+            self.cohort[modality] = stats[f'{modality}_cohort']
+
+    def normalize(self, modality: str, scores: np.ndarray, rows: np.ndarray, probe, method: str) -> np.ndarray:
+        """
+        Normalize scores of probe(s) against gallery rows: scores is (len(rows),) for one probe
+        or (probes, len(rows)) for a batch. Returns raw scores for 'none' or without statistics.
+        """
+        if method not in NORMALIZATIONS:
+            raise ValueError(f"Unknown normalization {method!r}; expected one of {', '.join(NORMALIZATIONS)}")
+        scores = np.asarray(scores, dtype=np.float64)
+        if method == 'none' or not self.available or np.isnan(self.mean[modality]).all():
+            return scores
+
+        if method == 'tnorm':
+            cohort = self.cohort[modality]
+            if len(cohort) < 3:
+                return scores
+            probes = np.atleast_2d(probe)
+            # The cohort comes from the gallery and may hold the probe's own identity: drop its top score
+            cohort_scores = np.sort(_score_fn(self.matcher, modality)(probes, cohort), axis=1)[:, :-1]
+            center = cohort_scores.mean(axis=1, keepdims=True)
+            spread = np.maximum(cohort_scores.std(axis=1, keepdims=True), MIN_STD)
+            if scores.ndim == 1:
+                center, spread = center[0], spread[0]
+            return (scores - center) / spread
+
+        z = (scores - self.mean[modality][rows]) / self.std[modality][rows]
+        if method == 'tanh':
+            return 0.5 * (np.tanh(TANH_SPREAD * z) + 1)
+        return z
+
+# ============ CLI ============
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute cohort score-normalization statistics for the gallery.")
+    parser.add_argument('--cohort-size', type=int, default=COHORT_SIZE)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    stats = compute_cohort_stats(template_store.load_templates(), cohort_size=args.cohort_size, seed=args.seed)
+    save_cohort_stats(stats)
+    for modality in MODALITIES:
+        mean, std = stats[f'{modality}_stats']
+        print(f"{modality:>5}: {len(stats[f'{modality}_ids'])} templates, cohort {len(stats[f'{modality}_cohort'])}, "
+              f"impostor mean {mean:.4f} std {std:.4f}")
+    print(f"Wrote {norm_path()}")
+
+if __name__ == '__main__':
+    main()
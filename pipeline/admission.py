@@ -0,0 +1,142 @@
+"""
+Admission control in front of biometric extraction.
+
+At most `concurrency` requests extract at once and at most `max_queue` more
+wait for a slot; anything beyond that is refused straight away (Overloaded ->
+503 with Retry-After) instead of piling up behind slow model calls. Every
+request carries a Deadline, and work whose deadline has passed is dropped
+before it reaches the model (DeadlineExceeded), whether it is still waiting
+for a slot, queued in the process pool or between two stages.
+"""
+
+import asyncio
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional
+
+from utils import metrics
+
+DEFAULT_DEADLINE_MS = int(os.environ.get('IDENTIX_DEADLINE_MS', 15000))
+MAX_DEADLINE_MS = 60000
+DEADLINE_HEADER = 'X-Deadline-Ms'
+
+class Overloaded(Exception):
+    """The extraction queue is full."""
+    def __init__(self, retry_after: int):
+        super().__init__(f"Extraction queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed before its work was done."""
+
+class Deadline:
+    """Absolute wall-clock deadline; wall clock so it means the same inside pool workers."""
+    def __init__(self, budget_ms: float):
+        self.at = time.time() + budget_ms / 1000
+
+    @classmethod
+    def from_header(cls, value: Optional[str]):
+        """Deadline from a client's relative budget in milliseconds, or the default budget."""
+        try:
+            budget = float(value) if value else DEFAULT_DEADLINE_MS
+        except ValueError:
+            budget = DEFAULT_DEADLINE_MS
+        return cls(min(max(budget, 0), MAX_DEADLINE_MS))
+
+    def remaining(self) -> float:
+        """Seconds left (negative once expired)."""
+        return self.at - time.time()
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self, what: str = 'request'):
+        if self.expired():
+            raise DeadlineExceeded(f"Deadline passed before {what}")
+
+class AdmissionController:
+    """
+    Bounded work queue: `concurrency` running plus `max_queue` waiting.
+    Use admit() from threaded servers and admit_async() from an event loop.
+    """
+    def __init__(self, concurrency: int, max_queue: int):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(concurrency)
+        self._async_slots = None
+        self._waiting = 0
+        self._running = 0
+        # Smoothed seconds a request holds a slot, for Retry-After
+        self._service_time = 1.0
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue has likely drained."""
+        backlog = (self._waiting + self._running) / self.concurrency
+        return max(1, math.ceil(backlog * self._service_time))
+
+    def _enter(self):
+        with self._lock:
+            if self._waiting + self._running >= self.concurrency + self.max_queue:
+                metrics.SHED_REQUESTS.inc(reason='queue_full')
+                raise Overloaded(self.retry_after())
+            self._waiting += 1
+            metrics.ADMISSION_REQUESTS.set(self._waiting, state='waiting')
+
+    def _start(self):
+        with self._lock:
+            self._waiting -= 1
+            self._running += 1
+            metrics.ADMISSION_REQUESTS.set(self._waiting, state='waiting')
+            metrics.ADMISSION_REQUESTS.set(self._running, state='running')
+
+    def _give_up(self):
+        with self._lock:
+            self._waiting -= 1
+            metrics.ADMISSION_REQUESTS.set(self._waiting, state='waiting')
+
+    def _finish(self, started: float):
+        with self._lock:
+            self._running -= 1
+            self._service_time = 0.8 * self._service_time + 0.2 * (time.perf_counter() - started)
+            metrics.ADMISSION_REQUESTS.set(self._running, state='running')
+
+    @contextmanager
+    def admit(self, deadline: Deadline):
+        """Hold an extraction slot for the duration of the block."""
+        self._enter()
+        if not self._slots.acquire(timeout=max(deadline.remaining(), 0)):
+            self._give_up()
+            raise DeadlineExceeded("Deadline passed while queued")
+        self._start()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._finish(started)
+            self._slots.release()
+
+    @asynccontextmanager
+    async def admit_async(self, deadline: Deadline):
+        """admit() for coroutines: waiting for a slot does not block the event loop."""
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.concurrency)
+        self._enter()
+        try:
+            await asyncio.wait_for(self._async_slots.acquire(), max(deadline.remaining(), 0))
+        except BaseException as e:
+            # Timed out, or the client went away while queued
+            self._give_up()
+            if isinstance(e, asyncio.TimeoutError):
+                raise DeadlineExceeded("Deadline passed while queued") from None
+            raise
+        self._start()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._finish(started)
+            self._async_slots.release()
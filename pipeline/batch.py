@@ -0,0 +1,338 @@
+"""
+Batch verification for offline audits and re-verification campaigns.
+
+A batch is a set of probe files grouped by name: <probe_id>.jpg/.jpeg/.png is
+the face and <probe_id>.wav/.mp3 the voice of one probe. An optional
+manifest.csv (columns probe_id, claimed_id) turns a probe into a 1:1 check
+against the claimed person; probes without a claim are identified 1:N against
+all active persons, like check-in.
+
+Probes are extracted in chunks, one pool task per chunk, and each chunk is
+matched against the gallery with a single matrix product per modality.
+Results come back in input order, one dict per probe, as soon as their chunk
+is done.
+
+CLI:
+    python -m pipeline.batch probes.zip -o results.ndjson
+    python -m pipeline.batch probes_dir/ --manifest claims.csv
+    python -m pipeline.batch probes.zip --url http://localhost:5001
+"""
+
+import argparse
+import csv
+import io
+import os
+import sys
+import uuid
+import zipfile
+from collections import deque
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from pipeline.verification import DEFAULT_STAGES, StageTimer, run_face_branch, run_voice_branch
+from utils import serialization
+
+FACE_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+VOICE_EXTENSIONS = {'wav', 'mp3'}
+MANIFEST_NAME = 'manifest.csv'
+BATCH_SIZE = 16
+
+# ============ INPUT ============
+
+def read_manifest(text: str) -> Dict[str, str]:
+    """probe_id -> claimed_id from manifest CSV text (rows without a claim are skipped)."""
+    claims = {}
+    for row in csv.DictReader(io.StringIO(text)):
+        probe_id = (row.get('probe_id') or '').strip()
+        claimed_id = (row.get('claimed_id') or '').strip()
+        if probe_id and claimed_id:
+            claims[probe_id] = claimed_id
+    return claims
+
+def collect_probes(names: Iterable[str], claims: Optional[Dict[str, str]] = None) -> List[Dict]:
+    """
+    Group file names into probes, sorted by probe ID.
+    Each probe is {'probe_id', 'claimed_id', 'face', 'voice'} where face/voice are file names or None.
+    """
+    claims = claims or {}
+    probes = {}
+    for name in names:
+        base = os.path.basename(name)
+        if base.startswith('.') or '.' not in base or base == MANIFEST_NAME:
+            continue
+        stem, extension = base.rsplit('.', 1)
+        extension = extension.lower()
+        if extension in FACE_EXTENSIONS:
+            modality = 'face'
+        elif extension in VOICE_EXTENSIONS:
+            modality = 'voice'
+        else:
+            continue
+        probe = probes.setdefault(stem, {"probe_id": stem, "claimed_id": claims.get(stem), "face": None, "voice": None})
+        probe[modality] = name
+    return [probes[probe_id] for probe_id in sorted(probes)]
+
+def open_zip(source) -> Tuple[List[Dict], Callable[[str], bytes]]:
+    """Probes and a member reader for a zip archive (path or file object)."""
+    archive = zipfile.ZipFile(source)
+    names = [info.filename for info in archive.infolist() if not info.is_dir()]
+    manifest = next((n for n in names if os.path.basename(n) == MANIFEST_NAME), None)
+    claims = read_manifest(archive.read(manifest).decode('utf-8-sig')) if manifest else {}
+    return collect_probes(names, claims), archive.read
+
+def open_directory(path: str) -> Tuple[List[Dict], Callable[[str], bytes]]:
+    """Probes and a file reader for a directory of probe files."""
+    names = sorted(os.path.join(path, name) for name in os.listdir(path))
+    manifest = os.path.join(path, MANIFEST_NAME)
+    claims = {}
+    if os.path.exists(manifest):
+        with open(manifest, encoding='utf-8-sig') as f:
+            claims = read_manifest(f.read())
+
+    def read(name):
+        with open(name, 'rb') as f:
+            return f.read()
+    return collect_probes(names, claims), read
+
+# ============ EXTRACTION ============
+
+def extract_batch(stages: Dict[str, Callable], items: List[Tuple]) -> List[Tuple]:
+    """
+    Extract one chunk of probes; runs in a pool worker.
+    items are (face_bytes, voice_bytes, voice_suffix); returns (face, voice, timings, error) per item.
+    """
+    results = []
+    for face_data, voice_data, voice_suffix in items:
+        face = voice = error = None
+        timings = {}
+        try:
+            if face_data is not None:
+                face, stage_timings = run_face_branch(stages, face_data, 'process')
+                timings.update(stage_timings)
+            if voice_data is not None:
+                voice, stage_timings = run_voice_branch(stages, voice_data, voice_suffix, 'process')
+                timings.update(stage_timings)
+        except Exception as e:
+            error = str(e)
+        results.append((face, voice, timings, error))
+    return results
+
+# ============ MATCHING ============
+
+def _scores(matrix_fn, probes: List, gallery_matrix: np.ndarray, columns: np.ndarray):
+    """Probe x eligible-gallery similarity, or None when there is nothing to compare."""
+    rows = [i for i, probe in enumerate(probes) if probe is not None]
+    if not rows or len(columns) == 0:
+        return rows, None
+    matrix = np.vstack([probes[i] for i in rows])
+    if matrix.shape[1] != gallery_matrix.shape[1]:
+        return rows, None
+    return rows, matrix_fn(matrix, gallery_matrix[columns])
+
+def score_batch(probes: List[Dict], extracted: List[Tuple], gallery, active_ids, fusion_engine,
+                threshold: float, normalization: str = 'none') -> List[Dict]:
+    """Match one extracted chunk against the gallery and decide every probe."""
+    matcher = fusion_engine.matcher
+    active = np.isin(gallery.person_ids, list(active_ids))
+    face_columns = np.flatnonzero(gallery.face_mask & active)
+    voice_columns = np.flatnonzero(gallery.voice_mask & active)
+
+    face_rows, face_scores = _scores(matcher.match_face_batch, [e[0] for e in extracted], gallery.face, face_columns)
+    voice_rows, voice_scores = _scores(matcher.match_voice_batch, [e[1] for e in extracted], gallery.voice, voice_columns)
+    if normalization != 'none':
+        # Same cohort normalization as check-in, over the whole (probes x gallery) matrices
+        if face_scores is not None:
+            face_scores = gallery.normalizer.normalize('face', face_scores, face_columns,
+                                                       np.vstack([extracted[i][0] for i in face_rows]), normalization)
+        if voice_scores is not None:
+            voice_scores = gallery.normalizer.normalize('voice', voice_scores, voice_columns,
+                                                        np.vstack([extracted[i][1] for i in voice_rows]), normalization)
+    face_index = {i: n for n, i in enumerate(face_rows)}
+    voice_index = {i: n for n, i in enumerate(voice_rows)}
+    face_column_of = {str(gallery.person_ids[c]): n for n, c in enumerate(face_columns)}
+    voice_column_of = {str(gallery.person_ids[c]): n for n, c in enumerate(voice_columns)}
+
+    results = []
+    for i, (probe, (_, _, _, error)) in enumerate(zip(probes, extracted)):
+        claimed_id = probe['claimed_id']
+        person_id = None
+        face_score = voice_score = 0.0
+
+        if claimed_id:
+            # 1:1 against the claimed person
+            if claimed_id in active_ids:
+                person_id = claimed_id
+            elif not error:
+                error = "claimed_id is not an active enrolled person"
+            if person_id and face_scores is not None and i in face_index and claimed_id in face_column_of:
+                face_score = float(face_scores[face_index[i], face_column_of[claimed_id]])
+            if person_id and voice_scores is not None and i in voice_index and claimed_id in voice_column_of:
+                voice_score = float(voice_scores[voice_index[i], voice_column_of[claimed_id]])
+        else:
+            # 1:N like check-in: the face decides who
+            if face_scores is not None and i in face_index:
+                best = int(np.argmax(face_scores[face_index[i]]))
+                person_id = str(gallery.person_ids[face_columns[best]])
+                face_score = float(face_scores[face_index[i], best])
+            if voice_scores is not None and i in voice_index:
+                voice_score = float(voice_scores[voice_index[i]].max())
+
+        fused = fusion_engine.fuse_scores(face_score, voice_score)
+        result = {
+            "probe_id": probe['probe_id'],
+            "claimed_id": claimed_id,
+            "person_id": person_id,
+            "verified": bool(person_id) and bool(fusion_engine.make_decision(fused, threshold=threshold)),
+            "scores": {"face": face_score, "voice": voice_score, "fused": float(fused)},
+            "threshold": threshold
+        }
+        if error:
+            result['error'] = error
+        results.append(result)
+    return results
+
+# ============ BATCH RUN ============
+
+def server_window(workers: int) -> int:
+    """Chunks a batch inside a server keeps in flight: at most half the pool, so live requests keep the rest."""
+    return max(1, workers // 2)
+
+def verify_batch(probes: List[Dict], read: Callable[[str], bytes], fusion_engine, threshold: float = 0.7,
+                 executor=None, batch_size: int = BATCH_SIZE, window: int = 2,
+                 stages: Optional[Dict[str, Callable]] = None, normalization: str = 'none') -> Iterator[Dict]:
+    """
+    Yield one result per probe, in input order.
+    At most `window` chunks are in the pool at once, so a large audit neither
+    loads every file into memory nor monopolizes the workers.
+    """
+    from models.gallery import get_gallery
+    from utils import database_manager as db
+
+    stages = dict(DEFAULT_STAGES, **(stages or {}))
+    gallery = get_gallery()
+    active_ids = {p['id'] for p in db.get_all_persons(status='active')}
+    timer = StageTimer()
+
+    def items(chunk):
+        result = []
+        for probe in chunk:
+            voice_suffix = '.' + probe['voice'].rsplit('.', 1)[1].lower() if probe['voice'] else '.wav'
+            result.append((
+                read(probe['face']) if probe['face'] else None,
+                read(probe['voice']) if probe['voice'] else None,
+                voice_suffix
+            ))
+        return result
+
+    chunks = [probes[i:i + batch_size] for i in range(0, len(probes), batch_size)]
+    pending = deque()
+    next_chunk = 0
+    while next_chunk < len(chunks) or pending:
+        while next_chunk < len(chunks) and len(pending) < max(window, 1):
+            chunk = chunks[next_chunk]
+            if executor is None:
+                pending.append((chunk, extract_batch(stages, items(chunk))))
+            else:
+                pending.append((chunk, executor.submit(extract_batch, stages, items(chunk))))
+            next_chunk += 1
+
+        chunk, outcome = pending.popleft()
+        try:
+            extracted = outcome if executor is None else outcome.result()
+        except Exception as e:
+            extracted = [(None, None, {}, str(e))] * len(chunk)
+        for _, _, timings, _ in extracted:
+            timer.update(timings)
+        yield from score_batch(chunk, extracted, gallery, active_ids, fusion_engine, threshold, normalization)
+
+def summarize(results: Iterable[Dict]) -> Iterator[Dict]:
+    """Pass results through, then yield a final {'summary': ...} record."""
+    total = verified = errors = 0
+    for result in results:
+        total += 1
+        verified += result['verified']
+        errors += 'error' in result
+        yield result
+    yield {"summary": {"probes": total, "verified": verified, "rejected": total - verified, "errors": errors}}
+
+def iter_ndjson(records: Iterable[Dict]) -> Iterator[bytes]:
+    for record in records:
+        yield serialization.dumps(record) + b'\n'
+
+# ============ CLI ============
+
+def _post_zip(url: str, zip_bytes: bytes) -> Iterator[bytes]:
+    """Send the batch to a running server and stream its NDJSON lines back."""
+    import urllib.request
+
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="archive"; filename="probes.zip"\r\n'
+        f'Content-Type: application/zip\r\n\r\n'
+    ).encode() + zip_bytes + f'\r\n--{boundary}--\r\n'.encode()
+    request = urllib.request.Request(
+        url.rstrip('/') + '/api/verify/batch', data=body, method='POST',
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    )
+    with urllib.request.urlopen(request) as response:
+        yield from response
+
+def _zip_directory(path: str, manifest: Optional[str]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name in sorted(os.listdir(path)):
+            if os.path.isfile(os.path.join(path, name)):
+                archive.write(os.path.join(path, name), name)
+        if manifest:
+            archive.write(manifest, MANIFEST_NAME)
+    return buffer.getvalue()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verify a batch of probes and write NDJSON results.")
+    parser.add_argument('source', help="zip archive or directory of probe files")
+    parser.add_argument('--manifest', help="CSV with probe_id,claimed_id (default: manifest.csv in the source)")
+    parser.add_argument('-o', '--output', help="write results here instead of stdout")
+    parser.add_argument('--url', help="send the batch to a running server instead of verifying locally")
+    parser.add_argument('--threshold', type=float, help="decision threshold (default: the fusion config's)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        if args.url:
+            if os.path.isdir(args.source):
+                zip_bytes = _zip_directory(args.source, args.manifest)
+            else:
+                with open(args.source, 'rb') as f:
+                    zip_bytes = f.read()
+            for line in _post_zip(args.url, zip_bytes):
+                output.write(line.decode())
+            return
+
+        from feature_extraction import worker_pool
+        from fusion.fusion_config import load_fusion_config
+        from fusion.fusion_engine import FusionEngine
+
+        probes, read = open_directory(args.source) if os.path.isdir(args.source) else open_zip(args.source)
+        if args.manifest:
+            with open(args.manifest, encoding='utf-8-sig') as f:
+                claims = read_manifest(f.read())
+            for probe in probes:
+                probe['claimed_id'] = claims.get(probe['probe_id'], probe['claimed_id'])
+
+        fusion_config = load_fusion_config()
+        fusion_engine = FusionEngine(face_weight=fusion_config['face_weight'], voice_weight=fusion_config['voice_weight'])
+        threshold = fusion_config['threshold'] if args.threshold is None else args.threshold
+        results = verify_batch(probes, read, fusion_engine, threshold, executor=worker_pool.get_executor(),
+                               batch_size=args.batch_size, window=2 * worker_pool.MAX_WORKERS,
+                               normalization=fusion_config['normalization'])
+        for line in iter_ndjson(summarize(results)):
+            output.write(line.decode())
+        worker_pool.shutdown_executor()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+"""
+Bulk enrollment from a CSV manifest plus folders of face images and voice recordings.
+
+Manifest columns: name (required), employee_id, department, date_of_birth,
+gender, email, phone, and optionally face / voice with the file name of each
+person's sample. Without a face or voice column a person's files are found by
+employee ID: <employee_id>.jpg/.jpeg/.png and <employee_id>.wav/.mp3.
+
+Rows are extracted in chunks on the process pool. Every finished chunk is
+written to a checkpoint, so an interrupted import resumes where it stopped
+instead of starting over. Nothing is enrolled until every row has been
+extracted; then all persons and their templates are committed together
+(database_manager.add_persons) with freshly allocated IDs. Rows whose
+employee_id is already enrolled are skipped, so re-running an import is safe;
+rows without one are recognised by a hash of their contents (import_key),
+which is stored on the person they enrolled.
+
+CLI:
+    python -m pipeline.bulk_import people.csv --images faces/ --audio voices/
+    python -m pipeline.bulk_import people.zip
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import zipfile
+from collections import deque
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from pipeline.batch import FACE_EXTENSIONS, MANIFEST_NAME, VOICE_EXTENSIONS, extract_batch
+from pipeline.verification import DEFAULT_STAGES
+from utils import store_lock
+
+CHECKPOINT_DIR = 'data/import_checkpoints'
+CHUNK_SIZE = 16
+PERSON_FIELDS = ('name', 'employee_id', 'department', 'date_of_birth', 'gender', 'email', 'phone')
+
+# ============ INPUT ============
+
+def _index_files(names: List[str], extensions) -> Dict[str, str]:
+    """Base name and stem -> file name, for files with one of the extensions."""
+    index = {}
+    for name in names:
+        base = os.path.basename(name)
+        if base.startswith('.') or '.' not in base:
+            continue
+        stem, extension = base.rsplit('.', 1)
+        if extension.lower() in extensions:
+            index.setdefault(base, name)
+            index.setdefault(stem, name)
+    return index
+
+def import_key(person: Dict, face: Optional[str], voice: Optional[str]) -> str:
+    """Stable key of a manifest row without an employee_id: a hash of its fields and sample file names."""
+    content = [person, os.path.basename(face) if face else None, os.path.basename(voice) if voice else None]
+    return hashlib.sha1(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+def plan_rows(text: str, face_names: List[str], voice_names: List[str]) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Parse the manifest and find each row's files.
+    Returns (rows, problems): rows are {'row', 'person', 'face', 'voice', 'key'}, where key
+    is the employee_id or, without one, the row's import_key;
+    problems are {'row', 'employee_id', 'error'} for rows that cannot be imported.
+    """
+    faces = _index_files(face_names, FACE_EXTENSIONS)
+    voices = _index_files(voice_names, VOICE_EXTENSIONS)
+    rows, problems, seen = [], [], set()
+
+    # Row numbers count the header as row 1, like a spreadsheet
+    for number, record in enumerate(csv.DictReader(io.StringIO(text)), start=2):
+        person = {field: (record.get(field) or '').strip() or None for field in PERSON_FIELDS}
+        employee_id = person['employee_id']
+
+        def problem(message):
+            problems.append({"row": number, "employee_id": employee_id, "error": message})
+
+        if not person['name']:
+            problem("name is required")
+            continue
+        if employee_id and employee_id in seen:
+            problem("duplicate employee_id in manifest")
+            continue
+        seen.add(employee_id)
+
+        files, missing = {}, []
+        for modality, index in (('face', faces), ('voice', voices)):
+            listed = (record.get(modality) or '').strip()
+            if listed:
+                files[modality] = index.get(os.path.basename(listed))
+                if files[modality] is None:
+                    missing.append(f"{modality} file not found: {listed}")
+            else:
+                files[modality] = index.get(employee_id) if employee_id else None
+        if missing:
+            problem('; '.join(missing))
+        elif not files['face'] and not files['voice']:
+            problem("no face or voice file")
+        else:
+            key = employee_id or import_key(person, files['face'], files['voice'])
+            if not employee_id and key in seen:
+                problem("duplicate row in manifest")
+                continue
+            seen.add(key)
+            rows.append({"row": number, "person": person, "face": files['face'], "voice": files['voice'],
+                         "key": key})
+    return rows, problems
+
+def open_directories(manifest_path: str, images_dir: Optional[str], audio_dir: Optional[str]):
+    """Rows, problems and a file reader for a manifest with image and audio folders."""
+    with open(manifest_path, encoding='utf-8-sig') as f:
+        text = f.read()
+    listing = lambda path: [os.path.join(path, name) for name in sorted(os.listdir(path))] if path else []
+
+    def read(name):
+        with open(name, 'rb') as f:
+            return f.read()
+    return (*plan_rows(text, listing(images_dir), listing(audio_dir)), read)
+
+def open_zip(source):
+    """Rows, problems and a member reader for a zip holding manifest.csv and the sample files."""
+    archive = zipfile.ZipFile(source)
+    names = [info.filename for info in archive.infolist() if not info.is_dir()]
+    manifest = next((n for n in names if os.path.basename(n) == MANIFEST_NAME), None)
+    if manifest is None:
+        raise ValueError(f"Archive has no {MANIFEST_NAME}")
+    text = archive.read(manifest).decode('utf-8-sig')
+    return (*plan_rows(text, names, names), archive.read)
+
+# ============ CHECKPOINTS ============
+
+def checkpoint_path(rows: List[Dict], chunk_size: int) -> str:
+    """Checkpoint directory for exactly this set of rows, so a changed manifest never reuses stale work."""
+    plan = [(row['row'], row['person'], row['face'], row['voice']) for row in rows]
+    digest = hashlib.sha1(json.dumps([plan, chunk_size], sort_keys=True).encode()).hexdigest()[:16]
+    return os.path.join(CHECKPOINT_DIR, digest)
+
+def _save_chunk(path: str, index: int, extracted: List[Tuple]) -> None:
+    arrays = {"errors": np.array([error or '' for _, _, _, error in extracted])}
+    for key, position in (('face', 0), ('voice', 1)):
+        vectors = [item[position] for item in extracted]
+        dim = next((len(v) for v in vectors if v is not None), 0)
+        matrix = np.zeros((len(vectors), dim))
+        for i, vector in enumerate(vectors):
+            if vector is not None:
+                matrix[i] = vector
+        arrays[key] = matrix
+        arrays[f'{key}_mask'] = np.array([v is not None for v in vectors], dtype=bool)
+    # Write next to the target and swap in, so a crash never leaves a partial chunk
+    tmp_path = os.path.join(path, f'chunk_{index:06d}.tmp.npz')
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, os.path.join(path, f'chunk_{index:06d}.npz'))
+
+def _load_chunk(path: str, index: int) -> Optional[List[Tuple]]:
+    chunk_file = os.path.join(path, f'chunk_{index:06d}.npz')
+    if not os.path.exists(chunk_file):
+        return None
+    with np.load(chunk_file, allow_pickle=False) as archive:
+        a = {key: archive[key] for key in archive.files}
+    return [
+        (a['face'][i] if a['face_mask'][i] else None, a['voice'][i] if a['voice_mask'][i] else None,
+         {}, str(a['errors'][i]) or None)
+        for i in range(len(a['errors']))
+    ]
+
+# ============ IMPORT ============
+
+def run_import(rows: List[Dict], problems: List[Dict], read: Callable[[str], bytes], executor=None,
+               chunk_size: int = CHUNK_SIZE, window: int = 2,
+               stages: Optional[Dict[str, Callable]] = None) -> Iterator[Dict]:
+    """
+    Extract, checkpoint and commit an import.
+    Yields {'progress': {...}} after every chunk and finally {'result': {...}} with
+    the enrolled persons, the skipped rows (already enrolled) and the failed rows.
+    """
+    from utils import database_manager as db
+
+    stages = dict(DEFAULT_STAGES, **(stages or {}))
+    skipped = []
+
+    def drop_enrolled(rows):
+        enrolled = _enrolled_keys(db.get_all_persons())
+        skipped.extend({"row": r['row'], "employee_id": r['person']['employee_id']}
+                       for r in rows if r['key'] in enrolled)
+        return [r for r in rows if r['key'] not in enrolled]
+
+    rows = drop_enrolled(rows)
+
+    path = checkpoint_path(rows, chunk_size)
+    os.makedirs(path, exist_ok=True)
+    chunks = [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
+    extracted = [_load_chunk(path, index) for index in range(len(chunks))]
+    resumed = sum(len(chunks[i]) for i, chunk in enumerate(extracted) if chunk is not None)
+
+    def items(chunk):
+        return [(
+            read(row['face']) if row['face'] else None,
+            read(row['voice']) if row['voice'] else None,
+            '.' + row['voice'].rsplit('.', 1)[1].lower() if row['voice'] else '.wav'
+        ) for row in chunk]
+
+    todo = deque(index for index, chunk in enumerate(extracted) if chunk is None)
+    pending = deque()
+    done = resumed
+    yield {"progress": {"extracted": done, "total": len(rows), "resumed": resumed}}
+    while todo or pending:
+        while todo and len(pending) < max(window, 1):
+            index = todo.popleft()
+            if executor is None:
+                pending.append((index, extract_batch(stages, items(chunks[index]))))
+            else:
+                pending.append((index, executor.submit(extract_batch, stages, items(chunks[index]))))
+
+        index, outcome = pending.popleft()
+        try:
+            result = outcome if executor is None else outcome.result()
+        except Exception as e:
+            result = [(None, None, {}, str(e))] * len(chunks[index])
+        _save_chunk(path, index, result)
+        extracted[index] = result
+        done += len(chunks[index])
+        yield {"progress": {"extracted": done, "total": len(rows), "resumed": resumed}}
+
+    failed = list(problems)
+    accepted = []
+    for chunk, results in zip(chunks, extracted):
+        for row, (face, voice, _, error) in zip(chunk, results):
+            if error or (face is None and voice is None):
+                failed.append({"row": row['row'], "employee_id": row['person']['employee_id'],
+                               "error": error or "no face or voice could be extracted"})
+                continue
+            person_data = dict(row['person'])
+            if not person_data['employee_id']:
+                person_data['import_key'] = row['key']
+            if face is not None:
+                person_data['face_embedding'] = face
+            if voice is not None:
+                person_data['voice_mfcc'] = voice
+            accepted.append((row, person_data))
+
+    # Check again under the store lock: another import may have enrolled some rows meanwhile
+    with store_lock.locked():
+        accepted_rows = {id(row) for row in drop_enrolled([row for row, _ in accepted])}
+        accepted = [person_data for row, person_data in accepted if id(row) in accepted_rows]
+        persons = db.add_persons(accepted) if accepted else []
+    # Committed: the checkpoint has served its purpose, and failed rows get a fresh try next run
+    shutil.rmtree(path, ignore_errors=True)
+    yield {"result": {
+        "enrolled": [{"id": p['id'], "employee_id": p['employee_id'], "name": p['name']} for p in persons],
+        "skipped": sorted(skipped, key=lambda s: s['row']),
+        "failed": sorted(failed, key=lambda f: f['row'])
+    }}
+
+def _enrolled_keys(persons: List[Dict]) -> set:
+    """Employee IDs and import keys of already enrolled persons."""
+    keys = {p['employee_id'] for p in persons if p.get('employee_id')}
+    keys.update(p['import_key'] for p in persons if p.get('import_key'))
+    return keys
+
+# ============ CLI ============
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Enroll many persons from a CSV manifest and sample folders.")
+    parser.add_argument('source', help="manifest CSV, or a zip holding manifest.csv and the samples")
+    parser.add_argument('--images', help="folder of face images (with a CSV manifest)")
+    parser.add_argument('--audio', help="folder of voice recordings (with a CSV manifest)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('-o', '--output', help="write the result JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    if zipfile.is_zipfile(args.source):
+        rows, problems, read = open_zip(args.source)
+    else:
+        rows, problems, read = open_directories(args.source, args.images, args.audio)
+
+    from feature_extraction import worker_pool
+
+    result = None
+    for event in run_import(rows, problems, read, executor=worker_pool.get_executor(),
+                            chunk_size=args.chunk_size, window=2 * worker_pool.MAX_WORKERS):
+        if 'progress' in event:
+            progress = event['progress']
+            print(f"\rExtracted {progress['extracted']}/{progress['total']}", end='', file=sys.stderr, flush=True)
+        else:
+            result = event['result']
+    worker_pool.shutdown_executor()
+    print(f"\nEnrolled {len(result['enrolled'])}, skipped {len(result['skipped'])}, "
+          f"failed {len(result['failed'])}", file=sys.stderr)
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    json.dump(result, output, indent=2)
+    output.write('\n')
+    if output is not sys.stdout:
+        output.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Background jobs for work too slow to hold an HTTP request open, such as enrollment.
+
+The endpoint submits the job and answers 202 with its ID straight away; a small
+thread pool runs the job (feeding the extraction process pool) and clients
+poll GET /api/jobs/<id>. Job state is kept as one JSON file per job under
+JOBS_DIR, so any server process can answer a poll for a job another process
+accepted. Finished jobs are removed after JOB_TTL seconds. A job left queued or
+running for longer than JOB_TIMEOUT (its server process stopped) is marked
+failed, so clients polling it still get a final state.
+
+Jobs extract in parallel; their writes to the data store are serialized by
+utils/store_lock, so concurrent enrollments never share an ID or lose a person.
+
+A job that admission control turns away (pipeline/admission.py) is not failed:
+it waits Retry-After seconds and tries again, until JOB_TIMEOUT has passed.
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from pipeline.admission import DeadlineExceeded, Overloaded
+from utils import serialization
+
+JOBS_DIR = 'data/jobs'
+JOB_WORKERS = int(os.environ.get('IDENTIX_JOB_WORKERS', os.cpu_count() or 1))
+JOB_TIMEOUT = 600
+JOB_TTL = 24 * 3600
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+
+_runner = None
+_runner_lock = threading.Lock()
+# IDs of the jobs this process has accepted and not finished yet
+_active = set()
+
+def _job_path(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, f'{job_id}.json')
+
+def _save(job: Dict) -> None:
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    # Write next to the target and swap in, so a poll never reads a partial file
+    tmp_path = _job_path(job['id']) + '.tmp'
+    serialization.dump_file(job, tmp_path)
+    os.replace(tmp_path, _job_path(job['id']))
+
+def _expire_interrupted(job: Dict, age: float) -> Dict:
+    """Mark a job failed if it has sat queued or running for longer than JOB_TIMEOUT."""
+    if job['status'] in (QUEUED, RUNNING) and age > JOB_TIMEOUT and job['id'] not in _active:
+        job.update(status=FAILED, error="Job was interrupted before it finished",
+                   finished_at=datetime.now().isoformat())
+        _save(job)
+    return job
+
+def get_job(job_id: str) -> Optional[Dict]:
+    """Current state of a job, or None if there is no such job."""
+    if not job_id.isalnum():
+        return None
+    path = _job_path(job_id)
+    try:
+        age = time.time() - os.path.getmtime(path)
+        return _expire_interrupted(serialization.load_file(path), age)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _get_runner() -> ThreadPoolExecutor:
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='identix-job')
+        return _runner
+
+def _prune() -> None:
+    """Forget finished jobs older than JOB_TTL and fail interrupted ones."""
+    if not os.path.isdir(JOBS_DIR):
+        return
+    now = time.time()
+    for name in os.listdir(JOBS_DIR):
+        path = os.path.join(JOBS_DIR, name)
+        try:
+            age = now - os.path.getmtime(path)
+            if not name.endswith('.json'):
+                # Temp file of a write that never completed
+                if age > JOB_TTL:
+                    os.remove(path)
+                continue
+            job = serialization.load_file(path)
+            if job['status'] in (SUCCEEDED, FAILED):
+                if age > JOB_TTL:
+                    os.remove(path)
+            else:
+                # Kept for another JOB_TTL, so its poller sees the failure
+                _expire_interrupted(job, age)
+        except (OSError, ValueError):
+            pass
+
+def _run(job: Dict, fn: Callable, args: tuple) -> None:
+    job.update(status=RUNNING, started_at=datetime.now().isoformat())
+    _save(job)
+    give_up = time.monotonic() + JOB_TIMEOUT
+    while True:
+        try:
+            job.update(status=SUCCEEDED, result=fn(*args))
+            break
+        except (Overloaded, DeadlineExceeded) as e:
+            # Live requests come first: back off and try again rather than fail
+            wait = getattr(e, 'retry_after', 1)
+            if time.monotonic() + wait > give_up:
+                job.update(status=FAILED, error="Timed out waiting for the extraction workers")
+                break
+            time.sleep(wait)
+        except Exception as e:
+            print(f"Job {job['id']} ({job['kind']}) failed: {e}")
+            job.update(status=FAILED, error=str(e))
+            break
+    job['finished_at'] = datetime.now().isoformat()
+    _save(job)
+    _active.discard(job['id'])
+
+def submit(kind: str, fn: Callable, *args) -> Dict:
+    """Queue fn(*args) as a background job and return the new job. fn's return value must be JSON-serializable."""
+    _prune()
+    job = {
+        "id": uuid.uuid4().hex,
+        "kind": kind,
+        "status": QUEUED,
+        "created_at": datetime.now().isoformat(),
+        "started_at": None,
+        "finished_at": None,
+        "result": None,
+        "error": None
+    }
+    _active.add(job['id'])
+    _save(job)
+    _get_runner().submit(_run, dict(job), fn, args)
+    return job
@@ -0,0 +1,291 @@
+"""
+Precompute the feature galleries of the face and voice datasets locally.
+
+Replaces docs/IDentix_Colab_Preprocessing.ipynb. Walks FACE_DATASET_PATH and
+VOICE_DATASET_PATH (config/paths_config.py; identities as in the evaluation
+runner: <name>_<n>.<ext> or the folder name), extracts every sample with the
+server's own stages on the extraction process pool, and writes per modality:
+
+- <features>.npy          vectors, one row per extracted sample
+                          (PRECOMPUTED_FACE_FEATURES / PRECOMPUTED_VOICE_FEATURES)
+- <features>_ids.npy      identity label of each row, so a gallery best score
+                          names a person (pipeline/verification.FeatureFileMatch)
+- <features>_manifest.npz every sample seen: path, content hash, size, mtime,
+                          identity and its row (-1 where extraction failed)
+
+Samples are keyed by the SHA-256 of their content. Extracted vectors are
+checkpointed in shards (one per finished chunk) under SHARD_DIR, so an
+interrupted run resumes where it stopped, and a later run only extracts
+content it has not seen: new files, changed files, not renamed or copied
+ones. Files whose size and mtime match the previous manifest are not even
+re-hashed. Samples that failed to extract are recorded and not retried unless
+--retry-failed.
+
+CLI:
+    python -m pipeline.precompute
+    python -m pipeline.precompute --face-dir datasets/faces --only face --compact
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import paths_config
+from pipeline.batch import FACE_EXTENSIONS, VOICE_EXTENSIONS, extract_batch
+from pipeline.verification import DEFAULT_STAGES, FACE_MODEL, feature_ids_path
+
+SHARD_DIR = os.path.join(os.path.dirname(paths_config.PRECOMPUTED_FACE_FEATURES), 'shards')
+CHUNK_SIZE = 16
+MODELS = {"face": FACE_MODEL, "voice": "mfcc"}
+EXTENSIONS = {"face": FACE_EXTENSIONS, "voice": VOICE_EXTENSIONS}
+HASH_BLOCK = 1 << 20
+
+def manifest_path(features_path: str) -> str:
+    return os.path.splitext(features_path)[0] + '_manifest.npz'
+
+# ============ CONTENT HASHES ============
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_manifest(features_path: str) -> Dict[str, Tuple[int, int, str]]:
+    """path -> (size, mtime_ns, hash) of the previous run, empty if there was none."""
+    path = manifest_path(features_path)
+    if not os.path.exists(path):
+        return {}
+    with np.load(path, allow_pickle=False) as m:
+        return {str(p): (int(s), int(t), str(h)) for p, s, t, h in zip(m['paths'], m['sizes'], m['mtimes'], m['hashes'])}
+
+def hash_samples(paths: List[str], previous: Dict[str, Tuple[int, int, str]], rehash: bool = False) -> List[Tuple]:
+    """(size, mtime_ns, hash) of each path; unchanged files (same size and mtime) keep their previous hash."""
+    stamped = []
+    for i, path in enumerate(paths):
+        st = os.stat(path)
+        known = previous.get(os.path.abspath(path))
+        if not rehash and known and known[:2] == (st.st_size, st.st_mtime_ns):
+            stamped.append(known)
+        else:
+            stamped.append((st.st_size, st.st_mtime_ns, file_digest(path)))
+        if i % 500 == 0 or i == len(paths) - 1:
+            print(f"\rhashed {i + 1}/{len(paths)}", end='', file=sys.stderr, flush=True)
+    if paths:
+        print(file=sys.stderr)
+    return stamped
+
+# ============ SHARDS ============
+
+class ShardStore:
+    """Extracted vectors by content hash, appended one shard file per checkpoint."""
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.vectors = {}
+        self.next_index = 0
+        if not os.path.isdir(directory):
+            return
+        for name in sorted(os.listdir(directory)):
+            if not (name.startswith('shard_') and name.endswith('.npz')) or name.endswith('.tmp.npz'):
+                continue
+            with np.load(os.path.join(directory, name), allow_pickle=False) as shard:
+                for key, vector, ok in zip(shard['hashes'], shard['vectors'], shard['mask']):
+                    self.vectors[str(key)] = vector if ok else None
+            self.next_index = max(self.next_index, int(name[len('shard_'):-len('.npz')]) + 1)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.vectors
+
+    def failed(self) -> List[str]:
+        return [key for key, vector in self.vectors.items() if vector is None]
+
+    def _write(self, index: int, entries: Dict[str, Optional[np.ndarray]]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        keys = list(entries)
+        dim = next((len(v) for v in entries.values() if v is not None), 0)
+        matrix = np.zeros((len(keys), dim))
+        mask = np.zeros(len(keys), dtype=bool)
+        for i, key in enumerate(keys):
+            if entries[key] is not None:
+                matrix[i] = entries[key]
+                mask[i] = True
+        # Write next to the target and swap in, so a crash never leaves a partial shard
+        tmp_path = os.path.join(self.directory, f'shard_{index:06d}.tmp.npz')
+        np.savez(tmp_path, hashes=np.array(keys, dtype=str), vectors=matrix, mask=mask)
+        os.replace(tmp_path, os.path.join(self.directory, f'shard_{index:06d}.npz'))
+
+    def append(self, entries: Dict[str, Optional[np.ndarray]]) -> None:
+        """Checkpoint a finished chunk (None: extraction failed)."""
+        self._write(self.next_index, entries)
+        self.next_index += 1
+        self.vectors.update(entries)
+
+    def compact(self, keep) -> None:
+        """Rewrite the store as one shard holding only the hashes in keep."""
+        old = [name for name in os.listdir(self.directory) if name.startswith('shard_')] if os.path.isdir(self.directory) else []
+        self.vectors = {key: vector for key, vector in self.vectors.items() if key in keep}
+        self._write(self.next_index, self.vectors)
+        for name in old:
+            os.remove(os.path.join(self.directory, name))
+        self.next_index += 1
+
+# ============ EXTRACTION ============
+
+def extract_missing(samples: List[Tuple[str, str]], modality: str, store: ShardStore, executor=None,
+                    chunk_size: int = CHUNK_SIZE, window: int = 2,
+                    stages: Optional[Dict[str, Callable]] = None) -> int:
+    """
+    Extract the (path, hash) samples whose content the store lacks, once per distinct hash,
+    checkpointing every chunk. Returns the number extracted.
+    """
+    stages = dict(DEFAULT_STAGES, **(stages or {}))
+    todo = {}
+    for path, key in samples:
+        if key not in store:
+            todo.setdefault(key, path)
+    todo = list(todo.items())
+    chunks = deque(todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size))
+
+    def items(chunk):
+        result = []
+        for _, path in chunk:
+            with open(path, 'rb') as f:
+                data = f.read()
+            if modality == 'face':
+                result.append((data, None, '.wav'))
+            else:
+                result.append((None, data, '.' + path.rsplit('.', 1)[1].lower()))
+        return result
+
+    pending = deque()
+    done = 0
+    while chunks or pending:
+        while chunks and len(pending) < max(window, 1):
+            chunk = chunks.popleft()
+            if executor is None:
+                pending.append((chunk, extract_batch(stages, items(chunk))))
+            else:
+                pending.append((chunk, executor.submit(extract_batch, stages, items(chunk))))
+        chunk, outcome = pending.popleft()
+        try:
+            extracted = outcome if executor is None else outcome.result()
+        except Exception as e:
+            # The pool itself failed (not the samples): leave them for the next run
+            print(f"\n{modality} chunk failed: {e}", file=sys.stderr)
+            extracted = None
+        if extracted is not None:
+            store.append({key: (face if modality == 'face' else voice)
+                          for (key, _), (face, voice, _, _) in zip(chunk, extracted)})
+        done += len(chunk)
+        print(f"\r{modality}: extracted {done}/{len(todo)}", end='', file=sys.stderr, flush=True)
+    if todo:
+        print(file=sys.stderr)
+    return len(todo)
+
+# ============ OUTPUT ============
+
+def _save_npy(path: str, array: np.ndarray) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+def write_gallery(features_path: str, samples: List[Tuple[str, str, str]], stamps: List[Tuple],
+                  store: ShardStore) -> Dict:
+    """Write the vectors, their identity labels and the manifest of (identity, path, hash) samples."""
+    rows, labels, row_of = [], [], []
+    for identity, _, key in samples:
+        vector = store.vectors.get(key)
+        row_of.append(len(rows) if vector is not None else -1)
+        if vector is not None:
+            rows.append(vector)
+            labels.append(identity)
+    matrix = np.array(rows) if rows else np.zeros((0, 0))
+
+    # Labels land before the vectors: a reader sees old vectors with new labels only briefly, and
+    # FeatureFileMatch ignores labels whose count does not match the vectors
+    _save_npy(feature_ids_path(features_path), np.array(labels, dtype=str))
+    _save_npy(features_path, matrix)
+    tmp_path = manifest_path(features_path) + '.tmp.npz'
+    np.savez(tmp_path,
+             paths=np.array([os.path.abspath(path) for _, path, _ in samples], dtype=str),
+             hashes=np.array([key for _, _, key in samples], dtype=str),
+             sizes=np.array([s[0] for s in stamps], dtype=np.int64),
+             mtimes=np.array([s[1] for s in stamps], dtype=np.int64),
+             identities=np.array([identity for identity, _, _ in samples], dtype=str),
+             rows=np.array(row_of, dtype=np.int64),
+             created_at=np.array(datetime.now().isoformat()))
+    os.replace(tmp_path, manifest_path(features_path))
+    return {"samples": len(samples), "rows": len(rows), "failed": len(samples) - len(rows),
+            "identities": len(set(labels)), "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0}
+
+def precompute(modality: str, root: str, features_path: str, shard_dir: str = SHARD_DIR, executor=None,
+               chunk_size: int = CHUNK_SIZE, window: int = 2, retry_failed: bool = False, rehash: bool = False,
+               compact: bool = False, stages: Optional[Dict[str, Callable]] = None) -> Dict:
+    """Bring one modality's gallery files up to date with the dataset under root."""
+    from evaluation.runner import DEFAULT_EXCLUDE, list_samples
+
+    samples = [(identity, path) for identity, paths in sorted(list_samples(root, EXTENSIONS[modality],
+                                                                           DEFAULT_EXCLUDE).items())
+               for path in paths]
+    stamps = hash_samples([path for _, path in samples], load_manifest(features_path), rehash)
+    keyed = [(identity, path, stamp[2]) for (identity, path), stamp in zip(samples, stamps)]
+
+    store = ShardStore(os.path.join(shard_dir, modality, MODELS[modality]))
+    if retry_failed:
+        for key in store.failed():
+            del store.vectors[key]
+    extracted = extract_missing([(path, key) for _, path, key in keyed], modality, store, executor,
+                                chunk_size, window, stages)
+    summary = write_gallery(features_path, keyed, stamps, store)
+    if compact:
+        store.compact({key for _, _, key in keyed})
+    return dict(summary, modality=modality, extracted=extracted, path=features_path)
+
+# ============ CLI ============
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract and checkpoint the face and voice feature galleries.")
+    parser.add_argument('--face-dir', default=paths_config.FACE_DATASET_PATH)
+    parser.add_argument('--voice-dir', default=paths_config.VOICE_DATASET_PATH)
+    parser.add_argument('--face-out', default=paths_config.PRECOMPUTED_FACE_FEATURES)
+    parser.add_argument('--voice-out', default=paths_config.PRECOMPUTED_VOICE_FEATURES)
+    parser.add_argument('--only', choices=('face', 'voice'))
+    parser.add_argument('--shard-dir', default=SHARD_DIR)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--retry-failed', action='store_true', help="extract samples that failed before again")
+    parser.add_argument('--rehash', action='store_true', help="hash every file, even if size and mtime match")
+    parser.add_argument('--compact', action='store_true', help="drop checkpointed vectors no sample uses any more")
+    args = parser.parse_args(argv)
+
+    jobs = [(m, root, out) for m, root, out in (('face', args.face_dir, args.face_out),
+                                                 ('voice', args.voice_dir, args.voice_out))
+            if args.only in (None, m)]
+    missing = [f"--{m}-dir" for m, root, _ in jobs if not root or not os.path.isdir(root)]
+    if missing:
+        parser.error(f"no dataset folder for {', '.join(missing)} (set it or config/paths_config.py)")
+
+    from feature_extraction import worker_pool
+
+    executor = worker_pool.get_executor()
+    try:
+        for modality, root, out in jobs:
+            summary = precompute(modality, root, out, args.shard_dir, executor, args.chunk_size,
+                                 2 * worker_pool.MAX_WORKERS, args.retry_failed, args.rehash, args.compact)
+            print(f"{modality}: {summary['rows']} vectors of {summary['identities']} identities "
+                  f"({summary['extracted']} newly extracted, {summary['failed']} failed) -> {out}")
+    finally:
+        worker_pool.shutdown_executor()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,475 @@
+"""
+Staged biometric verification pipeline.
+
+Every verification path (Flask and async servers, both Streamlit apps) runs
+through VerificationPipeline:
+
+    face:  decode -> detect -> embed  \\
+                                       match -> fuse -> persist
+    voice: decode ---------- -> embed /
+
+The face and voice branches are independent and run concurrently when an
+executor is supplied. Every stage is a plain callable that can be swapped, and
+every stage records its wall time and CPU time.
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from feature_extraction.face_features import extract_face_embeddings
+from feature_extraction.voice_features import extract_mfcc
+from pipeline.admission import Deadline, DeadlineExceeded
+from preprocessing.voice_prep import load_and_preprocess_audio
+from utils import metrics, profiling
+
+FACE_MODEL = 'VGG-Face'
+
+# ============ STAGE TIMING ============
+
+class StageTimer:
+    """
+    Records wall and CPU time per stage, in milliseconds.
+    CPU time is per-process inside pool workers (so the model's own threads count)
+    and per-thread otherwise (so concurrent requests don't count each other).
+    With record=True every stage is also observed in the stage latency histogram.
+    """
+    def __init__(self, cpu_clock: str = 'thread', record: bool = True):
+        self.cpu_clock = time.process_time if cpu_clock == 'process' else time.thread_time
+        self.record = record
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        wall_start = time.perf_counter()
+        cpu_start = self.cpu_clock()
+        try:
+            yield
+        finally:
+            self.update({name: {
+                "wall_ms": round((time.perf_counter() - wall_start) * 1000, 3),
+                "cpu_ms": round((self.cpu_clock() - cpu_start) * 1000, 3)
+            }})
+
+    def update(self, stages: Dict[str, Dict]):
+        self.stages.update(stages)
+        if self.record:
+            for name, timing in stages.items():
+                metrics.STAGE_SECONDS.observe(timing['wall_ms'] / 1000, stage=name)
+
+    def as_dict(self) -> Dict[str, Dict]:
+        return dict(self.stages)
+
+# ============ EXTRACTION STAGES ============
+# Module-level functions so they can be shipped to pool workers.
+
+def decode_image(data: bytes):
+    """Decode uploaded image bytes into a BGR array (None if undecodable)."""
+    import cv2
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+def detect_face(img):
+    """
+    Pass-through hook for a separate detector. The embedder runs DeepFace's own detection
+    and alignment, as the enrolled templates were made, so by default this does nothing
+    and detection time is part of face.embed.
+    """
+    return img
+
+def embed_face(img):
+    """Face embedding of a decoded image (None if the image could not be decoded)."""
+    if img is None:
+        return None
+    return extract_face_embeddings(img, model_name=FACE_MODEL)
+
+def decode_audio(data: bytes, suffix: str = '.wav'):
+    """
+    Decode uploaded audio into a trimmed, fixed-length signal.
+    The decoder needs a real file for compressed formats, so the clip is spooled to disk.
+    """
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        return load_and_preprocess_audio(path)
+    finally:
+        os.remove(path)
+
+def embed_voice(signal):
+    """MFCC feature vector of a decoded signal."""
+    return extract_mfcc(signal)
+
+DEFAULT_STAGES = {
+    "face.decode": decode_image,
+    "face.detect": detect_face,
+    "face.embed": embed_face,
+    "voice.decode": decode_audio,
+    "voice.embed": embed_voice
+}
+
+def _check(deadline: Optional[Deadline], stage: str):
+    if deadline is not None:
+        deadline.check(stage)
+
+def run_face_branch(stages: Dict[str, Callable], data: bytes, cpu_clock: str = 'thread',
+                    deadline: Optional[Deadline] = None):
+    """
+    face.decode -> face.detect -> face.embed. Returns (embedding, timings).
+    Raises DeadlineExceeded instead of starting a stage after the deadline.
+    """
+    # The caller's timer records these, so they count once even when run in a worker
+    timer = StageTimer(cpu_clock, record=False)
+    _check(deadline, 'face.decode')
+    with timer.stage('face.decode'):
+        img = stages['face.decode'](data)
+    _check(deadline, 'face.detect')
+    with timer.stage('face.detect'):
+        img = stages['face.detect'](img)
+    _check(deadline, 'face.embed')
+    with timer.stage('face.embed'):
+        embedding = stages['face.embed'](img)
+    return embedding, timer.as_dict()
+
+def run_voice_branch(stages: Dict[str, Callable], data: bytes, suffix: str = '.wav', cpu_clock: str = 'thread',
+                     deadline: Optional[Deadline] = None):
+    """voice.decode -> voice.embed. Returns (mfcc, timings)."""
+    timer = StageTimer(cpu_clock, record=False)
+    _check(deadline, 'voice.decode')
+    with timer.stage('voice.decode'):
+        signal = stages['voice.decode'](data, suffix)
+    _check(deadline, 'voice.embed')
+    with timer.stage('voice.embed'):
+        mfcc = stages['voice.embed'](signal)
+    return mfcc, timer.as_dict()
+
+# ============ MATCH STAGES ============
+# A match stage takes the probes dict ({'face': emb, 'voice': mfcc}; a key is
+# present only if that modality was submitted, its value is None if extraction
+# failed) and returns {'person_id', 'face', 'voice'} scores.
+
+class GalleryMatch:
+    """
+    1:N identification against the gallery of active persons. The face decides who.
+    Scores are normalized with the gallery's cohort statistics unless normalization is 'none'.
+    """
+    def __init__(self, normalization: str = 'none'):
+        self.normalization = normalization
+
+    def __call__(self, probes: Dict) -> Dict:
+        from models.gallery import get_gallery
+        from utils import database_manager as db
+
+        # Candidate identities come from metadata, templates from the gallery
+        active_ids = {p['id'] for p in db.get_all_persons(status='active')}
+        gallery = get_gallery()
+
+        result = {"person_id": None, "face": 0.0, "voice": 0.0}
+        if probes.get('face') is not None:
+            result['person_id'], result['face'] = gallery.match_face(probes['face'], active_ids, self.normalization)
+        if probes.get('voice') is not None:
+            _, result['voice'] = gallery.match_voice(probes['voice'], active_ids, self.normalization)
+        return result
+
+def feature_ids_path(features_path: str) -> str:
+    """Identity labels of a precomputed feature gallery's rows (pipeline/precompute.py)."""
+    return os.path.splitext(features_path)[0] + '_ids.npy'
+
+class FeatureFileMatch:
+    """
+    Best score against precomputed .npy feature galleries (legacy /api/verify and the
+    Streamlit demos). Falls back to a random demo score when a gallery file is missing.
+    When the gallery has an identity file (<features>_ids.npy), person_id is the identity
+    of the best face row, or of the best voice row without a face.
+    """
+    def __init__(self, face_path: str, voice_path: str, matcher=None, demo_fallback: bool = True):
+        from models.matcher import BiometricMatcher
+        self.face_path = face_path
+        self.voice_path = voice_path
+        self.matcher = matcher or BiometricMatcher()
+        self.demo_fallback = demo_fallback
+        self._loaded = {}
+
+    def _gallery(self, path):
+        """(vectors, identity labels or None), reloaded when the precompute job rewrites the files."""
+        ids_path = feature_ids_path(path)
+        stamp = (os.stat(path).st_mtime_ns, os.stat(ids_path).st_mtime_ns if os.path.exists(ids_path) else 0)
+        cached = self._loaded.get(path)
+        if cached is None or cached[0] != stamp:
+            vectors = np.load(path)
+            labels = np.load(ids_path) if stamp[1] else None
+            if labels is not None and len(labels) != len(vectors):
+                labels = None  # Caught between the two files being rewritten
+            cached = self._loaded[path] = (stamp, vectors, labels)
+        return cached[1], cached[2]
+
+    def _score(self, probe, path, score_fn, demo_range):
+        if not os.path.exists(path):
+            return (float(np.random.uniform(*demo_range)) if self.demo_fallback else 0.0), None
+        if probe is None:
+            return 0.0, None
+        vectors, labels = self._gallery(path)
+        scores = score_fn(probe, vectors)
+        if not len(scores):
+            return 0.0, None
+        best = int(np.argmax(scores))
+        return float(scores[best]), (str(labels[best]) if labels is not None else None)
+
+    def __call__(self, probes: Dict) -> Dict:
+        result = {"person_id": None, "face": 0.0, "voice": 0.0}
+        if 'voice' in probes:
+            result['voice'], result['person_id'] = self._score(probes['voice'], self.voice_path,
+                                                               self.matcher.match_voice_gallery, (0.5, 0.9))
+        if 'face' in probes:
+            result['face'], face_id = self._score(probes['face'], self.face_path,
+                                                  self.matcher.match_face_gallery, (0.6, 0.95))
+            result['person_id'] = face_id or result['person_id']
+        return result
+
+class AdminMatch:
+    """1:1 face match against the admin template."""
+    def __call__(self, probes: Dict) -> Dict:
+        from models.gallery import get_gallery
+        from utils import database_manager as db
+
+        result = {"person_id": None, "face": 0.0, "voice": 0.0}
+        admin = db.get_admin()
+        if admin and probes.get('face') is not None:
+            similarity = get_gallery().match_admin(probes['face'])
+            if similarity is not None:
+                result['person_id'] = admin['id']
+                result['face'] = float(similarity)
+        return result
+
+# ============ FUSE STAGES ============
+
+class WeightedFusion:
+    """Weighted-sum score fusion and threshold decision via FusionEngine."""
+    def __init__(self, fusion_engine, threshold: float = 0.7, require_identity: bool = False):
+        self.fusion_engine = fusion_engine
+        self.threshold = threshold
+        self.require_identity = require_identity
+
+    def __call__(self, match: Dict) -> Dict:
+        fused = self.fusion_engine.fuse_scores(match['face'], match['voice'])
+        verified = bool(self.fusion_engine.make_decision(fused, threshold=self.threshold))
+        if self.require_identity and not match['person_id']:
+            verified = False
+        return {"fused": float(fused), "verified": verified, "threshold": self.threshold}
+
+class FaceOnlyDecision:
+    """Decide on the face score alone (admin login)."""
+    def __init__(self, threshold: float = 0.7):
+        self.threshold = threshold
+
+    def __call__(self, match: Dict) -> Dict:
+        verified = bool(match['person_id']) and match['face'] >= self.threshold
+        return {"fused": float(match['face']), "verified": verified, "threshold": self.threshold}
+
+# ============ PERSIST STAGES ============
+
+class AttendancePersist:
+    """Log a check-in or check-out for the identified person."""
+    def __init__(self, action: str):
+        self.action = action
+
+    def __call__(self, result: Dict) -> Dict:
+        from utils import database_manager as db
+
+        attendance_record = db.log_attendance(result['person_id'], self.action)
+        person = db.get_person(result['person_id'])
+        return {
+            "person": {
+                "id": person['id'],
+                "name": person['name'],
+                "employee_id": person['employee_id'],
+                "department": person['department']
+            },
+            "attendance": attendance_record
+        }
+
+# ============ PIPELINE ============
+
+class VerificationPipeline:
+    """
+    decode/detect/embed per modality, then match, fuse and (if verified) persist.
+
+    match, fuse and persist are callables (see the stage classes above); persist may be
+    None. `stages` overrides any of the extraction stages in DEFAULT_STAGES; overrides
+    must be module-level functions when a process pool is used. With an executor the
+    two modality branches run concurrently; without one they run inline. `name`
+    labels this pipeline's outcome and latency metrics. With an `admission`
+    controller (pipeline/admission.py) extraction only starts once a slot is free,
+    and a deadline passed to extract()/run() bounds the whole extraction.
+    """
+    def __init__(self, match: Callable, fuse: Callable, persist: Optional[Callable] = None,
+                 stages: Optional[Dict[str, Callable]] = None, executor=None, name: str = 'verify',
+                 admission=None):
+        self.name = name
+        self.admission = admission
+        self.match = match
+        self.fuse = fuse
+        self.persist = persist
+        self.stages = dict(DEFAULT_STAGES, **(stages or {}))
+        self.executor = executor
+
+    @property
+    def _cpu_clock(self):
+        return 'process' if isinstance(self.executor, ProcessPoolExecutor) else 'thread'
+
+    def _branch_calls(self, face_data, voice_data, voice_suffix, deadline):
+        calls = {}
+        if face_data is not None:
+            calls['face'] = (run_face_branch, self.stages, face_data, self._cpu_clock, deadline)
+        if voice_data is not None:
+            calls['voice'] = (run_voice_branch, self.stages, voice_data, voice_suffix, self._cpu_clock, deadline)
+        return calls
+
+    @staticmethod
+    def _collect(modality, outcome, probes, timer):
+        if isinstance(outcome, DeadlineExceeded):
+            raise outcome
+        if isinstance(outcome, Exception):
+            print(f"{modality.capitalize()} processing error: {outcome}")
+            probes[modality] = None
+            return
+        probes[modality], stages = outcome
+        timer.update(stages)
+
+    def _admit(self, deadline):
+        if self.admission is None:
+            return nullcontext()
+        return self.admission.admit(deadline or Deadline.from_header(None))
+
+    def _admit_async(self, deadline):
+        if self.admission is None:
+            return nullcontext()
+        return self.admission.admit_async(deadline or Deadline.from_header(None))
+
+    @staticmethod
+    def _timeout(deadline):
+        return max(deadline.remaining(), 0) if deadline else None
+
+    def extract(self, face_data: Optional[bytes] = None, voice_data: Optional[bytes] = None,
+                voice_suffix: str = '.wav', timer: Optional[StageTimer] = None,
+                deadline: Optional[Deadline] = None) -> Dict:
+        """
+        Run the extraction branches. Returns probes {'face': emb, 'voice': mfcc} for submitted modalities.
+        Raises Overloaded if admission control refuses the request and DeadlineExceeded if the
+        deadline passes first; work that has not reached the model by then is cancelled.
+        Without a deadline extraction is unbounded (queueing still uses the default budget).
+        """
+        timer = timer or StageTimer()
+        calls = self._branch_calls(face_data, voice_data, voice_suffix, deadline)
+        probes = {}
+        try:
+            with self._admit(deadline):
+                if self.executor is None:
+                    for modality, (fn, *args) in calls.items():
+                        try:
+                            outcome = fn(*args)
+                        except Exception as e:
+                            outcome = e
+                        self._collect(modality, outcome, probes, timer)
+                    return probes
+
+                futures = {modality: self.executor.submit(fn, *args) for modality, (fn, *args) in calls.items()}
+                try:
+                    for modality, future in futures.items():
+                        try:
+                            outcome = future.result(timeout=self._timeout(deadline))
+                        except FutureTimeout:
+                            raise DeadlineExceeded(f"Deadline passed during {modality} extraction")
+                        except Exception as e:
+                            outcome = e
+                        self._collect(modality, outcome, probes, timer)
+                except DeadlineExceeded:
+                    # Pending work never reaches a worker; running work stops at its next stage
+                    for future in futures.values():
+                        future.cancel()
+                    raise
+        except DeadlineExceeded:
+            metrics.SHED_REQUESTS.inc(reason='deadline')
+            raise
+        return probes
+
+    async def extract_async(self, face_data: Optional[bytes] = None, voice_data: Optional[bytes] = None,
+                            voice_suffix: str = '.wav', timer: Optional[StageTimer] = None,
+                            deadline: Optional[Deadline] = None) -> Dict:
+        """Like extract(), awaiting the branches on the running event loop."""
+        timer = timer or StageTimer()
+        loop = asyncio.get_running_loop()
+        calls = self._branch_calls(face_data, voice_data, voice_suffix, deadline)
+        try:
+            async with self._admit_async(deadline):
+                branches = asyncio.gather(
+                    *[loop.run_in_executor(self.executor, fn, *args) for fn, *args in calls.values()],
+                    return_exceptions=True
+                )
+                try:
+                    # Timing out cancels the pool futures that have not started yet
+                    outcomes = await asyncio.wait_for(branches, self._timeout(deadline))
+                except asyncio.TimeoutError:
+                    raise DeadlineExceeded("Deadline passed during extraction")
+            probes = {}
+            for modality, outcome in zip(calls, outcomes):
+                self._collect(modality, outcome, probes, timer)
+        except DeadlineExceeded:
+            metrics.SHED_REQUESTS.inc(reason='deadline')
+            raise
+        return probes
+
+    def decide(self, probes: Dict, timer: Optional[StageTimer] = None) -> Dict:
+        """match -> fuse -> persist for already extracted probes."""
+        timer = timer or StageTimer()
+        with timer.stage('match'):
+            match = self.match(probes)
+        with timer.stage('fuse'):
+            decision = self.fuse(match)
+
+        result = {
+            "verified": decision['verified'],
+            "person_id": match['person_id'],
+            "scores": {
+                "face": float(match['face']),
+                "voice": float(match['voice']),
+                "fused": decision['fused']
+            },
+            "threshold": decision['threshold'],
+            "persisted": None
+        }
+        if self.persist is not None and result['verified']:
+            with timer.stage('persist'):
+                result['persisted'] = self.persist(result)
+        metrics.VERIFICATIONS.inc(pipeline=self.name, outcome='verified' if result['verified'] else 'rejected')
+        result['timings'] = timer.as_dict()
+        return result
+
+    def _finish(self, result: Dict, wall_start: float) -> Dict:
+        elapsed = time.perf_counter() - wall_start
+        metrics.VERIFICATION_SECONDS.observe(elapsed, pipeline=self.name)
+        result['timings']['total'] = {"wall_ms": round(elapsed * 1000, 3)}
+        profiling.note_timings(self.name, result['timings'])
+        return result
+
+    def run(self, face_data: Optional[bytes] = None, voice_data: Optional[bytes] = None,
+            voice_suffix: str = '.wav', deadline: Optional[Deadline] = None) -> Dict:
+        """Full pipeline. The result carries per-stage 'timings'."""
+        timer = StageTimer()
+        wall_start = time.perf_counter()
+        probes = self.extract(face_data, voice_data, voice_suffix, timer, deadline)
+        return self._finish(self.decide(probes, timer), wall_start)
+
+    async def run_async(self, face_data: Optional[bytes] = None, voice_data: Optional[bytes] = None,
+                        voice_suffix: str = '.wav', deadline: Optional[Deadline] = None) -> Dict:
+        """Full pipeline for async servers: extraction on the executor, the rest in a thread."""
+        timer = StageTimer()
+        wall_start = time.perf_counter()
+        probes = await self.extract_async(face_data, voice_data, voice_suffix, timer, deadline)
+        result = await asyncio.to_thread(self.decide, probes, timer)
+        return self._finish(result, wall_start)
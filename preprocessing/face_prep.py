@@ -1,13 +1,21 @@
 import cv2
 import numpy as np
 
+_face_cascade = None
+
+def _get_face_cascade():
+    global _face_cascade
+    if _face_cascade is None:
+        _face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    return _face_cascade
+
 def detect_and_align_face(image_path):
     """
-    Detects faces in an image and returns the aligned face region.
+    Detects faces in an image (path or BGR array) and returns the aligned face region.
     Using Haar Cascades for basic detection.
     """
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-    img = cv2.imread(image_path)
+    face_cascade = _get_face_cascade()
+    img = image_path if isinstance(image_path, np.ndarray) else cv2.imread(image_path)
     if img is None:
         return None
     
@@ -1,44 +1,229 @@
+import io
 import os
 import sys
-import numpy as np
-from flask import Flask, request, jsonify
+import time
+import zipfile
+from datetime import datetime
+from flask import Flask, Response, g, request, jsonify, send_file, stream_with_context
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
-from werkzeug.utils import secure_filename
 
 # Add project root to path to import existing modules
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 
-print("DEBUG: Importing face_prep...", flush=True)
-from preprocessing.face_prep import detect_and_align_face
-print("DEBUG: Importing voice_prep...", flush=True)
-from preprocessing.voice_prep import load_and_preprocess_audio
-print("DEBUG: Importing face_features...", flush=True)
-from feature_extraction.face_features import extract_face_embeddings
-print("DEBUG: Importing voice_features...", flush=True)
-from feature_extraction.voice_features import extract_mfcc
+print("DEBUG: Importing verification pipeline...", flush=True)
+from pipeline.verification import (
+    AdminMatch, AttendancePersist, FaceOnlyDecision, FeatureFileMatch, GalleryMatch,
+    VerificationPipeline, WeightedFusion
+)
+from feature_extraction import worker_pool
+from pipeline import batch, bulk_import, jobs
+from pipeline.admission import DEADLINE_HEADER, Deadline, DeadlineExceeded, Overloaded
 print("DEBUG: Importing FusionEngine...", flush=True)
+from fusion.fusion_config import load_fusion_config
 from fusion.fusion_engine import FusionEngine
+from models.gallery import get_gallery
+from analytics.attendance_frame import PERIODS, get_frame, valid_dates
 from utils import database_manager as db
+from utils import metrics, profiling, serialization
+from utils.attendance_export import gzip_stream, iter_attendance_csv
+from utils.pagination import decode_cursor, make_etag, paginate, parse_fields, parse_limit, project
 print("DEBUG: Imports complete.", flush=True)
 
+class FastJSONProvider(JSONProvider):
+    """jsonify() and request.json through utils/serialization (orjson when installed)."""
+    def dumps(self, obj, **kwargs):
+        return serialization.dumps(obj, sort_keys=kwargs.get('sort_keys', False)).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return serialization.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(serialization.dumps(obj), mimetype='application/json')
+
 app = Flask(__name__)
-CORS(app)  # Enable CORS for React Frontend
+app.json = FastJSONProvider(app)
+CORS(app, expose_headers=["Retry-After", "Location", "X-Profile-Id"])  # Enable CORS for React Frontend
 
 # --- Configuration ---
-UPLOAD_FOLDER = 'uploads'
 FEATURE_DIR = 'data/features'
 FACE_FEAT_PATH = os.path.join(FEATURE_DIR, "face_embeddings.npy")
 VOICE_FEAT_PATH = os.path.join(FEATURE_DIR, "voice_mfccs.npy")
+FACE_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+VOICE_EXTENSIONS = {'wav', 'mp3'}
+# Face-only threshold of the admin login
+ADMIN_THRESHOLD = 0.7
 
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Initialize Fusion Engine with the latest calibrated weights and threshold (fusion/calibration.py)
+fusion_config = load_fusion_config()
+fusion_engine = FusionEngine(face_weight=fusion_config['face_weight'], voice_weight=fusion_config['voice_weight'])
+DECISION_THRESHOLD = fusion_config['threshold']
 
-# Initialize Fusion Engine
-fusion_engine = FusionEngine(face_weight=0.6, voice_weight=0.4)
+# --- Verification Pipelines ---
+# All share the extraction stages and the worker pool; they differ in how they match, decide and persist.
+verify_pipeline = VerificationPipeline(
+    match=FeatureFileMatch(FACE_FEAT_PATH, VOICE_FEAT_PATH, matcher=fusion_engine.matcher),
+    fuse=WeightedFusion(fusion_engine, DECISION_THRESHOLD),
+    executor=worker_pool.get_executor(),
+    admission=worker_pool.get_admission(),
+    name='verify'
+)
+admin_pipeline = VerificationPipeline(
+    match=AdminMatch(),
+    fuse=FaceOnlyDecision(ADMIN_THRESHOLD),
+    executor=worker_pool.get_executor(),
+    admission=worker_pool.get_admission(),
+    name='admin'
+)
+attendance_pipelines = {
+    action: VerificationPipeline(
+        match=GalleryMatch(fusion_config['normalization']),
+        fuse=WeightedFusion(fusion_engine, DECISION_THRESHOLD, require_identity=True),
+        persist=AttendancePersist(action),
+        executor=worker_pool.get_executor(),
+        admission=worker_pool.get_admission(),
+        name=action
+    )
+    for action in ("checkin", "checkout")
+}
+
+# Build the gallery up front, so neither the first check-in nor the first metrics scrape loads it
+get_gallery()
 
 def allowed_file(filename, extensions):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in extensions
 
+def upload_args(face_file, voice_file):
+    """
+    Pipeline inputs (face_data, voice_data, voice_suffix) from uploaded files.
+    Unsupported formats are ignored, as if not sent.
+    """
+    face_ok = face_file and allowed_file(face_file.filename, FACE_EXTENSIONS)
+    voice_ok = voice_file and allowed_file(voice_file.filename, VOICE_EXTENSIONS)
+    face_data = face_file.read() if face_ok else None
+    voice_data = voice_file.read() if voice_ok else None
+    voice_suffix = '.' + voice_file.filename.rsplit('.', 1)[1].lower() if voice_ok else '.wav'
+    return face_data, voice_data, voice_suffix
+
+def wants_timings():
+    """Per-stage timings are returned when asked for with ?timings=1 or an X-Timings: 1 header."""
+    value = request.args.get('timings') or request.headers.get('X-Timings') or ''
+    return value.lower() in ('1', 'true', 'yes')
+
+def with_timings(payload, result):
+    if wants_timings():
+        payload['timings'] = result['timings']
+    return payload
+
+def page_args(key_types):
+    """
+    Read limit/cursor/fields query args; key_types are the types of the endpoint's sort key.
+    Raises ValueError on bad input.
+    """
+    limit = parse_limit(request.args.get('limit'))
+    cursor = request.args.get('cursor')
+    if cursor:
+        decode_cursor(cursor, key_types)
+    return limit, cursor, parse_fields(request.args.get('fields'))
+
+def conditional_json(etag, build_payload):
+    """
+    Answer 304 if the client already holds this ETag, otherwise build and send the payload.
+    The payload is only built when it is actually needed.
+    """
+    hit = request.if_none_match.contains(etag)
+    metrics.cache_lookup('http_etag', hit)
+    if hit:
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(build_payload())
+    response.set_etag(etag)
+    return response
+
+# --- Request Metrics ---
+
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    # Clients may send their remaining time budget; the clock starts on arrival
+    g.deadline = Deadline.from_header(request.headers.get(DEADLINE_HEADER))
+    metrics.HTTP_IN_FLIGHT.inc()
+
+@app.after_request
+def record_request_metrics(response):
+    # Label by route pattern, not raw path, to keep the series count bounded
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.HTTP_REQUESTS.inc(method=request.method, endpoint=endpoint, status=response.status_code)
+    metrics.HTTP_SECONDS.observe(time.perf_counter() - g.request_start, endpoint=endpoint)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    metrics.HTTP_IN_FLIGHT.dec()
+
+# --- Profiling ---
+
+@app.before_request
+def start_profile():
+    # Opt-in per request (admin token header) or sampled 1-in-N; see utils/profiling.py
+    g.profile = profiling.begin(request.method, request.path, request.headers.get(profiling.PROFILE_HEADER),
+                                request.headers.get(profiling.MODE_HEADER))
+
+@app.after_request
+def finish_profile(response):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile_id = profile.stop(response.status_code)
+        if profile_id:
+            response.headers['X-Profile-Id'] = profile_id
+    return response
+
+@app.teardown_request
+def abandon_profile(exc):
+    # Only still set when the request failed before a response was made
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile.stop(None)
+
+# --- Load Shedding ---
+
+def service_unavailable(message, retry_after):
+    response = jsonify({"error": message})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+@app.errorhandler(Overloaded)
+def handle_overloaded(e):
+    return service_unavailable("Server busy, please retry", e.retry_after)
+
+@app.errorhandler(DeadlineExceeded)
+def handle_deadline_exceeded(e):
+    return service_unavailable("Request deadline exceeded", worker_pool.get_admission().retry_after())
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus scrape endpoint."""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/api/profiles', methods=['GET'])
+def get_profiles():
+    """Recent request profiles (admin: needs the profiling token in X-Profile)."""
+    if not profiling.authorized(request.headers.get(profiling.PROFILE_HEADER)):
+        return jsonify({"error": "Profiling token required"}), 403
+    return jsonify({"profiles": profiling.list_profiles()})
+
+@app.route('/api/profiles/<name>', methods=['GET'])
+def download_profile(name):
+    """One stored profile file: <id>.json (summary and stage timeline), <id>.prof or <id>.folded."""
+    if not profiling.authorized(request.headers.get(profiling.PROFILE_HEADER)):
+        return jsonify({"error": "Profiling token required"}), 403
+    path = profiling.profile_file(name)
+    if path is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return send_file(os.path.abspath(path), as_attachment=True, download_name=name)
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """
@@ -51,7 +236,8 @@ def health_check():
         "database": {
             "face": "loaded" if face_status else "missing",
             "voice": "loaded" if voice_status else "missing"
-        }
+        },
+        "fusion": {key: fusion_config[key] for key in ("version", "face_weight", "voice_weight", "threshold", "normalization")}
     })
 
 @app.route('/api/verify', methods=['POST'])
@@ -69,69 +255,46 @@ def verify_identity():
 
     print(f"DEBUG: Rx Face: {face_file}, Voice: {voice_file}", flush=True)
 
-    face_score = 0.0
-    voice_score = 0.0
-    
-    # --- Process Face ---
-    if face_file and allowed_file(face_file.filename, {'png', 'jpg', 'jpeg'}):
-        filename = secure_filename(face_file.filename)
-        temp_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        face_file.save(temp_path)
-        
-        try:
-            # Extract
-            probe_emb = extract_face_embeddings(temp_path)
-            
-            # Match
-            if probe_emb is not None and os.path.exists(FACE_FEAT_PATH):
-                gallery_faces = np.load(FACE_FEAT_PATH)
-                scores = [fusion_engine.matcher.match_face(probe_emb, g_emb) for g_emb in gallery_faces]
-                face_score = max(scores) if scores else 0.0
-            elif not os.path.exists(FACE_FEAT_PATH):
-                # Fallback for demo if DB missing
-                face_score = np.random.uniform(0.6, 0.95)
-                
-        except Exception as e:
-            print(f"Face processing error: {e}")
-        finally:
-            if os.path.exists(temp_path): os.remove(temp_path)
-            
-    # --- Process Voice ---
-    if voice_file and allowed_file(voice_file.filename, {'wav', 'mp3'}):
-        filename = secure_filename(voice_file.filename)
-        temp_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        voice_file.save(temp_path)
-        
+    result = verify_pipeline.run(*upload_args(face_file, voice_file), deadline=g.deadline)
+    
+    return jsonify(with_timings({
+        "verified": result['verified'],
+        # Identity of the best gallery row, when the feature gallery has an identity file
+        "identity": result['person_id'],
+        "scores": result['scores'],
+        "threshold": result['threshold']
+    }, result))
+
+@app.route('/api/verify/batch', methods=['POST'])
+def verify_batch():
+    """
+    Verify many probes in one request for audits; results stream back as NDJSON, one line per probe.
+    Send either an 'archive' zip, or the probe files as 'files' plus an optional 'manifest' CSV
+    (see pipeline/batch.py for naming).
+    """
+    archive = request.files.get('archive')
+    if archive:
         try:
-            # Extract
-            probe_mfcc = extract_mfcc(temp_path)
-            
-            # Match
-            if probe_mfcc is not None and os.path.exists(VOICE_FEAT_PATH):
-                gallery_voices = np.load(VOICE_FEAT_PATH)
-                scores = [fusion_engine.matcher.match_voice(probe_mfcc, g_mfcc) for g_mfcc in gallery_voices]
-                voice_score = max(scores) if scores else 0.0
-            elif not os.path.exists(VOICE_FEAT_PATH):
-                voice_score = np.random.uniform(0.5, 0.9)
-                
-        except Exception as e:
-            print(f"Voice processing error: {e}")
-        finally:
-             if os.path.exists(temp_path): os.remove(temp_path)
-
-    # --- Fusion ---
-    fused_score = fusion_engine.fuse_scores(face_score, voice_score)
-    is_verified = fusion_engine.make_decision(fused_score)
-    
-    return jsonify({
-        "verified": bool(is_verified),
-        "scores": {
-            "face": float(face_score),
-            "voice": float(voice_score),
-            "fused": float(fused_score)
-        },
-        "threshold": 0.7
-    })
+            # Upload streams are closed once the view returns, before the response has streamed
+            probes, read = batch.open_zip(io.BytesIO(archive.read()))
+        except zipfile.BadZipFile:
+            return jsonify({"error": "Invalid zip archive"}), 400
+    else:
+        uploads = {f.filename: f.read() for f in request.files.getlist('files') if f.filename}
+        manifest = request.files.get('manifest')
+        claims = batch.read_manifest(manifest.read().decode('utf-8-sig')) if manifest else {}
+        probes = batch.collect_probes(uploads, claims)
+        read = uploads.__getitem__
+    
+    if not probes:
+        return jsonify({"error": "No probe files found"}), 400
+    
+    # Half the workers at most, so live check-ins are never stuck behind an audit
+    results = batch.verify_batch(probes, read, fusion_engine, DECISION_THRESHOLD, executor=worker_pool.get_executor(),
+                                 window=batch.server_window(worker_pool.MAX_WORKERS),
+                                 normalization=fusion_config['normalization'])
+    return Response(stream_with_context(batch.iter_ndjson(batch.summarize(results))),
+                    mimetype='application/x-ndjson')
 
 # ============ ADMIN ENDPOINTS ============
 
@@ -143,59 +306,47 @@ def admin_login():
     if not face_file:
         return jsonify({"error": "No face image provided"}), 400
     
-    # Save temp file
-    filename = secure_filename(face_file.filename)
-    temp_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    face_file.save(temp_path)
-    
     try:
-        # Extract admin face embedding
-        probe_emb = extract_face_embeddings(temp_path)
-        
-        # Get admin from database
-        admin = db.get_admin()
-        
-        if not admin or not probe_emb:
-            return jsonify({"error": "Authentication failed"}), 401
-        
-        # Match against admin embedding
-        admin_emb = np.array(admin['face_embedding'])
-        similarity = fusion_engine.matcher.match_face(probe_emb, admin_emb)
-        
-        if similarity >= 0.7:
-            return jsonify({
-                "success": True,
-                "admin": {
-                    "id": admin['id'],
-                    "name": admin['name']
-                }
-            })
-        else:
-            return jsonify({"error": "Face does not match admin"}), 401
-            
+        result = admin_pipeline.run(*upload_args(face_file, None), deadline=g.deadline)
+    except (Overloaded, DeadlineExceeded):
+        raise
     except Exception as e:
         print(f"Admin login error: {e}")
         return jsonify({"error": "Authentication failed"}), 500
-    finally:
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+    
+    if result['person_id'] is None:
+        return jsonify({"error": "Authentication failed"}), 401
+    if not result['verified']:
+        return jsonify({"error": "Face does not match admin"}), 401
+    
+    admin = db.get_admin()
+    return jsonify(with_timings({
+        "success": True,
+        "admin": {
+            "id": admin['id'],
+            "name": admin['name']
+        }
+    }, result))
 
 # ============ PERSON MANAGEMENT ENDPOINTS ============
 
 @app.route('/api/persons', methods=['GET'])
 def get_persons():
-    """Get all persons with optional filters."""
+    """Get persons with optional filters, cursor pagination and field projection."""
     status = request.args.get('status')
     department = request.args.get('department')
     
-    persons = db.get_all_persons(status=status, department=department)
+    try:
+        limit, cursor, fields = page_args((str,))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    # Remove embeddings from response (too large)
-    for person in persons:
-        person.pop('face_embedding', None)
-        person.pop('voice_mfcc', None)
+    def build():
+        persons = sorted(db.get_all_persons(status=status, department=department), key=lambda p: p['id'])
+        page, next_cursor = paginate(persons, lambda p: (p['id'],), limit, cursor)
+        return {"persons": project(page, fields), "next_cursor": next_cursor, "total": len(persons)}
     
-    return jsonify({"persons": persons})
+    return conditional_json(make_etag(db.get_version(), request.full_path), build)
 
 @app.route('/api/persons/<person_id>', methods=['GET'])
 def get_person(person_id):
@@ -205,15 +356,26 @@ def get_person(person_id):
     if not person:
         return jsonify({"error": "Person not found"}), 404
     
-    # Remove embeddings
-    person.pop('face_embedding', None)
-    person.pop('voice_mfcc', None)
-    
     return jsonify(person)
 
+def enroll_person(person_data, face_data, voice_data, voice_suffix, deadline=None):
+    """Extract enrollment templates and add the person; runs as a background job."""
+    # Enrollment templates come from the same extraction stages used to verify
+    probes = verify_pipeline.extract(face_data, voice_data, voice_suffix, deadline=deadline)
+    if probes.get('face') is not None:
+        person_data['face_embedding'] = probes['face']
+    if probes.get('voice') is not None:
+        person_data['voice_mfcc'] = probes['voice']
+    
+    # Templates are stored before the person record, so the gallery gains the person in one step
+    return db.add_person(person_data)
+
 @app.route('/api/persons', methods=['POST'])
 def add_person():
-    """Register a new person."""
+    """
+    Register a new person. Returns 202 with an enrollment job to poll at /api/jobs/<id>;
+    ?sync=1 waits for the enrollment instead.
+    """
     face_file = request.files.get('face')
     voice_file = request.files.get('voice')
     
@@ -228,322 +390,164 @@ def add_person():
         "phone": request.form.get('phone')
     }
     
-    # Extract face embedding
-    if face_file:
-        filename = secure_filename(face_file.filename)
-        temp_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        face_file.save(temp_path)
-        
-        try:
-            face_emb = extract_face_embeddings(temp_path)
-            if face_emb is not None:
-                person_data['face_embedding'] = face_emb.tolist()
-        finally:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-    
-    # Extract voice MFCC
-    if voice_file:
-        filename = secure_filename(voice_file.filename)
-        temp_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        voice_file.save(temp_path)
-        
-        try:
-            voice_mfcc = extract_mfcc(temp_path)
-            if voice_mfcc is not None:
-                person_data['voice_mfcc'] = voice_mfcc.tolist()
-        finally:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+    if request.args.get('sync', '').lower() in ('1', 'true', 'yes'):
+        person = enroll_person(person_data, *upload_args(face_file, voice_file), deadline=g.deadline)
+        return jsonify(person), 201
     
-    # Add to database
-    person = db.add_person(person_data)
+    job = jobs.submit('enrollment', enroll_person, person_data, *upload_args(face_file, voice_file))
+    return jsonify(job), 202, {"Location": f"/api/jobs/{job['id']}"}
+
+@app.route('/api/persons/import', methods=['POST'])
+def import_persons():
+    """
+    Bulk-enroll from an 'archive' zip holding manifest.csv plus the face and voice samples
+    (see pipeline/bulk_import.py). Progress streams back as NDJSON, then the result.
+    """
+    archive = request.files.get('archive')
+    if not archive:
+        return jsonify({"error": "No archive provided"}), 400
+    try:
+        rows, problems, read = bulk_import.open_zip(io.BytesIO(archive.read()))
+    except zipfile.BadZipFile:
+        return jsonify({"error": "Invalid zip archive"}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    events = bulk_import.run_import(rows, problems, read, executor=worker_pool.get_executor(),
+                                    window=worker_pool.MAX_WORKERS)
+    return Response(stream_with_context(batch.iter_ndjson(events)), mimetype='application/x-ndjson')
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status of a background job: queued, running, succeeded (with result) or failed (with error)."""
+    job = jobs.get_job(job_id)
     
-    # Remove embeddings from response
-    person.pop('face_embedding', None)
-    person.pop('voice_mfcc', None)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
     
-    return jsonify(person), 201
+    return jsonify(job)
 
 # ============ ATTENDANCE ENDPOINTS ============
 
-@app.route('/api/attendance/checkin', methods=['POST'])
-def checkin():
-    """Check-in with face and/or voice verification."""
+def identify_and_log(action):
+    """Shared check-in/check-out flow: identify against active persons and log attendance."""
     face_file = request.files.get('face')
     voice_file = request.files.get('voice')
     
     if not face_file and not voice_file:
         return jsonify({"error": "No biometric data provided"}), 400
     
-    face_score = 0.0
-    voice_score = 0.0
-    matched_person_id = None
-    best_match_score = 0.0
+    result = attendance_pipelines[action].run(*upload_args(face_file, voice_file), deadline=g.deadline)
     
-    # Get all persons
-    all_persons = db.get_all_persons(status='active')
-    
-    # Process Face
-    if face_file:
-        filename = secure_filename(face_file.filename)
-        temp_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        face_file.save(temp_path)
-        
-        try:
-            probe_emb = extract_face_embeddings(temp_path)
-            
-            if probe_emb is not None:
-                # Match against all persons
-                for person in all_persons:
-                    if person.get('face_embedding'):
-                        gallery_emb = np.array(person['face_embedding'])
-                        score = fusion_engine.matcher.match_face(probe_emb, gallery_emb)
-                        
-                        if score > face_score:
-                            face_score = score
-                            if score > best_match_score:
-                                best_match_score = score
-                                matched_person_id = person['id']
-        finally:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-    
-    # Process Voice
-    if voice_file:
-        filename = secure_filename(voice_file.filename)
-        temp_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        voice_file.save(temp_path)
-        
-        try:
-            probe_mfcc = extract_mfcc(temp_path)
-            
-            if probe_mfcc is not None:
-                # Match against all persons
-                for person in all_persons:
-                    if person.get('voice_mfcc'):
-                        gallery_mfcc = np.array(person['voice_mfcc'])
-                        score = fusion_engine.matcher.match_voice(probe_mfcc, gallery_mfcc)
-                        
-                        if score > voice_score:
-                            voice_score = score
-        finally:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-    
-    # Fusion
-    fused_score = fusion_engine.fuse_scores(face_score, voice_score)
-    is_verified = fusion_engine.make_decision(fused_score)
-    
-    # Log attendance if verified
-    if is_verified and matched_person_id:
-        attendance_record = db.log_attendance(matched_person_id, "checkin")
-        person = db.get_person(matched_person_id)
-        
-        return jsonify({
+    if result['verified']:
+        return jsonify(with_timings({
             "verified": True,
-            "person": {
-                "id": person['id'],
-                "name": person['name'],
-                "employee_id": person['employee_id'],
-                "department": person['department']
-            },
-            "attendance": attendance_record,
-            "scores": {
-                "face": float(face_score),
-                "voice": float(voice_score),
-                "fused": float(fused_score)
-            }
-        })
+            "person": result['persisted']['person'],
+            "attendance": result['persisted']['attendance'],
+            "scores": result['scores']
+        }, result))
     else:
-        return jsonify({
+        return jsonify(with_timings({
             "verified": False,
             "message": "No matching person found",
-            "scores": {
-                "face": float(face_score),
-                "voice": float(voice_score),
-                "fused": float(fused_score)
-            }
-        }), 401
+            "scores": result['scores']
+        }, result)), 401
+
+@app.route('/api/attendance/checkin', methods=['POST'])
+def checkin():
+    """Check-in with face and/or voice verification."""
+    return identify_and_log("checkin")
 
 @app.route('/api/attendance/checkout', methods=['POST'])
 def checkout():
     """Check-out with face and/or voice verification."""
-    face_file = request.files.get('face')
-    voice_file = request.files.get('voice')
-    
-    if not face_file and not voice_file:
-        return jsonify({"error": "No biometric data provided"}), 400
-    
-    face_score = 0.0
-    voice_score = 0.0
-    matched_person_id = None
-    best_match_score = 0.0
-    
-    # Get all persons
-    all_persons = db.get_all_persons(status='active')
-    
-    # Process Face
-    if face_file:
-        filename = secure_filename(face_file.filename)
-        temp_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        face_file.save(temp_path)
-        
-        try:
-            probe_emb = extract_face_embeddings(temp_path)
-            
-            if probe_emb is not None:
-                # Match against all persons
-                for person in all_persons:
-                    if person.get('face_embedding'):
-                        gallery_emb = np.array(person['face_embedding'])
-                        score = fusion_engine.matcher.match_face(probe_emb, gallery_emb)
-                        
-                        if score > face_score:
-                            face_score = score
-                            if score > best_match_score:
-                                best_match_score = score
-                                matched_person_id = person['id']
-        finally:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-    
-    # Process Voice
-    if voice_file:
-        filename = secure_filename(voice_file.filename)
-        temp_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        voice_file.save(temp_path)
-        
-        try:
-            probe_mfcc = extract_mfcc(temp_path)
-            
-            if probe_mfcc is not None:
-                # Match against all persons
-                for person in all_persons:
-                    if person.get('voice_mfcc'):
-                        gallery_mfcc = np.array(person['voice_mfcc'])
-                        score = fusion_engine.matcher.match_voice(probe_mfcc, gallery_mfcc)
-                        
-                        if score > voice_score:
-                            voice_score = score
-        finally:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-    
-    # Fusion
-    fused_score = fusion_engine.fuse_scores(face_score, voice_score)
-    is_verified = fusion_engine.make_decision(fused_score)
-    
-    # Log attendance if verified
-    if is_verified and matched_person_id:
-        attendance_record = db.log_attendance(matched_person_id, "checkout")
-        person = db.get_person(matched_person_id)
-        
-        return jsonify({
-            "verified": True,
-            "person": {
-                "id": person['id'],
-                "name": person['name'],
-                "employee_id": person['employee_id'],
-                "department": person['department']
-            },
-            "attendance": attendance_record,
-            "scores": {
-                "face": float(face_score),
-                "voice": float(voice_score),
-                "fused": float(fused_score)
-            }
-        })
-    else:
-        return jsonify({
-            "verified": False,
-            "message": "No matching person found",
-            "scores": {
-                "face": float(face_score),
-                "voice": float(voice_score),
-                "fused": float(fused_score)
-            }
-        }), 401
+    return identify_and_log("checkout")
 
 @app.route('/api/attendance/export', methods=['GET'])
 def export_attendance():
-    """Export attendance history to CSV."""
+    """
+    Stream attendance history as CSV, optionally gzip-compressed (?gzip=1).
+    Filters: start_date, end_date, department.
+    """
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
-    
-    records = db.get_attendance_history(start_date=start_date, end_date=end_date)
-    
-    # Create CSV in memory
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow(['ID', 'Person ID', 'Name', 'Department', 'Date', 'Check In', 'Check Out', 'Status'])
-    
-    # Write data
-    for record in records:
-        person = db.get_person(record['person_id'])
-        name = person['name'] if person else "Unknown"
-        dept = person['department'] if person else "Unknown"
-        
-        writer.writerow([
-            record['id'],
-            record['person_id'],
-            name,
-            dept,
-            record['date'],
-            record['check_in'] or '',
-            record['check_out'] or '',
-            record['status']
-        ])
-    
-    output.seek(0)
-    
-    return send_file(
-        io.BytesIO(output.getvalue().encode('utf-8')),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=f'attendance_export_{datetime.now().strftime("%Y%m%d")}.csv'
+    department = request.args.get('department')
+    use_gzip = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    
+    # Person join table built once, instead of a database load per row
+    lookup = db.get_person_lookup()
+    person_ids = {pid for pid, p in lookup.items() if p['department'] == department} if department else None
+    
+    records = db.iter_attendance(start_date=start_date, end_date=end_date, person_ids=person_ids)
+    body = iter_attendance_csv(records, lookup)
+    
+    filename = f'attendance_export_{datetime.now().strftime("%Y%m%d")}.csv'
+    mimetype = 'text/csv'
+    if use_gzip:
+        body = gzip_stream(body)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
     )
 
 @app.route('/api/attendance/today', methods=['GET'])
 def get_today_attendance():
     """Get today's attendance."""
-    records = db.get_attendance_today()
+    today = datetime.now().strftime("%Y-%m-%d")
     
-    # Enrich with person names
-    for record in records:
-        person = db.get_person(record['person_id'])
-        if person:
-            record['person_name'] = person['name']
-            record['department'] = person['department']
+    def build():
+        records = db.get_attendance_today()
+        lookup = db.get_person_lookup()
+        
+        # Enrich with person names
+        for record in records:
+            person = lookup.get(record['person_id'])
+            if person:
+                record['person_name'] = person['name']
+                record['department'] = person['department']
+        
+        return {"attendance": records}
     
-    return jsonify({"attendance": records})
+    return conditional_json(make_etag(db.get_version(), request.full_path, today), build)
 
 @app.route('/api/attendance/history', methods=['GET'])
 def get_attendance_history():
-    """Get attendance history with filters."""
+    """Get attendance history (newest first) with filters, cursor pagination and field projection."""
     person_id = request.args.get('person_id')
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     
-    records = db.get_attendance_history(person_id, start_date, end_date)
+    try:
+        limit, cursor, fields = page_args((str, str, str))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    def build():
+        records = db.get_attendance_history(person_id, start_date, end_date)
+        page, next_cursor = paginate(records, lambda r: (r['date'], r['id'], r['person_id']), limit, cursor, descending=True)
+        return {"attendance": project(page, fields), "next_cursor": next_cursor, "total": len(records)}
     
-    return jsonify({"attendance": records, "total": len(records)})
+    return conditional_json(make_etag(db.get_version(), request.full_path), build)
 
 # ============ ANALYTICS ENDPOINTS ============
 
 @app.route('/api/analytics/overview', methods=['GET'])
 def get_analytics_overview():
     """Get dashboard overview statistics."""
-    overview = db.get_dashboard_overview()
-    return jsonify(overview)
+    today = datetime.now().strftime("%Y-%m-%d")
+    return conditional_json(make_etag(db.get_version(), request.full_path, today), db.get_dashboard_overview)
 
 @app.route('/api/analytics/person/<person_id>', methods=['GET'])
 def get_person_analytics(person_id):
     """Get analytics for a specific person."""
     start_date = request.args.get('start_date', '2025-08-01')
     end_date = request.args.get('end_date', '2026-02-04')
+    if not valid_dates(start_date, end_date):
+        return jsonify({"error": "start_date and end_date must be YYYY-MM-DD"}), 400
     
     stats = db.calculate_attendance_stats(person_id, start_date, end_date)
     history = db.get_attendance_history(person_id, start_date, end_date)
@@ -553,6 +557,50 @@ def get_person_analytics(person_id):
         "history": history
     })
 
+@app.route('/api/analytics/late-trends', methods=['GET'])
+def get_late_trends():
+    """Late arrivals and late rate per department, bucketed by day, week or month."""
+    period = request.args.get('period', 'week')
+    if period not in PERIODS:
+        return jsonify({"error": f"period must be one of {', '.join(PERIODS)}"}), 400
+    if not valid_dates(request.args.get('start_date'), request.args.get('end_date')):
+        return jsonify({"error": "start_date and end_date must be YYYY-MM-DD"}), 400
+    
+    def build():
+        return get_frame().late_trends(request.args.get('start_date'), request.args.get('end_date'), period)
+    
+    return conditional_json(make_etag(db.get_version(), request.full_path), build)
+
+@app.route('/api/analytics/weekly-rates', methods=['GET'])
+def get_weekly_rates():
+    """Week-over-week on-time and late rates, optionally for one department."""
+    if not valid_dates(request.args.get('start_date'), request.args.get('end_date')):
+        return jsonify({"error": "start_date and end_date must be YYYY-MM-DD"}), 400
+    
+    def build():
+        return {"weeks": get_frame().weekly_rates(
+            request.args.get('start_date'), request.args.get('end_date'), request.args.get('department')
+        )}
+    
+    return conditional_json(make_etag(db.get_version(), request.full_path), build)
+
+@app.route('/api/analytics/punctuality', methods=['GET'])
+def get_punctuality():
+    """Per-person punctuality ranking, optionally for one department."""
+    if not valid_dates(request.args.get('start_date'), request.args.get('end_date')):
+        return jsonify({"error": "start_date and end_date must be YYYY-MM-DD"}), 400
+    
+    def build():
+        report = get_frame().punctuality(
+            request.args.get('start_date'), request.args.get('end_date'), request.args.get('department')
+        )
+        lookup = db.get_person_lookup()
+        for row in report:
+            row['name'] = lookup.get(row['person_id'], {}).get('name')
+        return {"persons": report}
+    
+    return conditional_json(make_etag(db.get_version(), request.full_path), build)
+
 
 if __name__ == '__main__':
     # Run on 0.0.0.0 to be accessible, port 5001
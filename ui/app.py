@@ -1,5 +1,4 @@
 import streamlit as st
-import numpy as np
 import os
 import sys
 from PIL import Image
@@ -7,12 +6,11 @@ from PIL import Image
 # Add project root to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__))))
 
-from preprocessing.face_prep import detect_and_align_face
-from preprocessing.voice_prep import load_and_preprocess_audio
-from feature_extraction.face_features import extract_face_embeddings
-from feature_extraction.voice_features import extract_mfcc
+from pipeline.verification import FeatureFileMatch, VerificationPipeline, WeightedFusion
+from fusion.fusion_config import load_fusion_config
 from fusion.fusion_engine import FusionEngine
-from evaluation.metrics import calculate_biometric_metrics, plot_roc_curve
+from evaluation.metrics import plot_det_curve, plot_roc_curve
+from evaluation.runner import load_report
 
 # --- Page Config ---
 st.set_page_config(page_title="IDentix - Multi-Biometric System", layout="wide")
@@ -35,7 +33,8 @@ st.markdown("---")
 tab1, tab2 = st.tabs(["🔐 Live Authentication", "📊 Evaluation Dashboard"])
 
 # --- Initialize Engines ---
-fusion_engine = FusionEngine(face_weight=0.6, voice_weight=0.4)
+fusion_config = load_fusion_config()
+fusion_engine = FusionEngine(face_weight=fusion_config['face_weight'], voice_weight=fusion_config['voice_weight'])
 
 with tab1:
     col1, col2 = st.columns(2)
@@ -60,57 +59,26 @@ with tab1:
             FACE_FEAT_PATH = "data/features/face_embeddings.npy"
             VOICE_FEAT_PATH = "data/features/voice_mfccs.npy"
             
-            # --- Face Matching ---
-            face_score = 0.0
-            if uploaded_face:
-                # Save temp file for DeepFace (requires path)
-                with open("temp_face.jpg", "wb") as f:
-                    f.write(uploaded_face.getbuffer())
-                
-                probe_emb = extract_face_embeddings("temp_face.jpg")
-                
-                if probe_emb is not None:
-                    if os.path.exists(FACE_FEAT_PATH):
-                        try:
-                            gallery_faces = np.load(FACE_FEAT_PATH)
-                            # Compare probe with all gallery faces and take max similarity
-                            scores = [fusion_engine.matcher.match_face(probe_emb, g_emb) for g_emb in gallery_faces]
-                            face_score = max(scores) if scores else 0.0
-                        except Exception as e:
-                            st.warning(f"Could not load face gallery: {e}")
-                            face_score = 0.0 # Fallback
-                    else:
-                        st.info("No precomputed face gallery found. Using demo score.")
-                        face_score = np.random.uniform(0.6, 0.95) # Demo fallback
+            # --- Matching & Decision ---
+            pipeline = VerificationPipeline(
+                match=FeatureFileMatch(FACE_FEAT_PATH, VOICE_FEAT_PATH, matcher=fusion_engine.matcher),
+                fuse=WeightedFusion(fusion_engine, fusion_config['threshold'])
+            )
+            if uploaded_face and not os.path.exists(FACE_FEAT_PATH):
+                st.info("No precomputed face gallery found. Using demo score.")
+            if uploaded_voice and not os.path.exists(VOICE_FEAT_PATH):
+                st.info("No precomputed voice gallery found. Using demo score.")
             
-            # --- Voice Matching ---
-            voice_score = 0.0
-            if uploaded_voice:
-                with open("temp_voice.wav", "wb") as f:
-                    f.write(uploaded_voice.getbuffer())
-                
-                probe_mfcc = extract_mfcc("temp_voice.wav")
-                
-                if probe_mfcc is not None:
-                    if os.path.exists(VOICE_FEAT_PATH):
-                        try:
-                            gallery_voices = np.load(VOICE_FEAT_PATH)
-                            # Compare probe with all gallery voices
-                            # Note: Logic assumes gallery is 'allowed users'
-                            scores = [fusion_engine.matcher.match_voice(probe_mfcc, g_mfcc) for g_mfcc in gallery_voices]
-                            voice_score = max(scores) if scores else 0.0
-                        except:
-                            voice_score = 0.0
-                    else:
-                         st.info("No precomputed voice gallery found. Using demo score.")
-                         voice_score = np.random.uniform(0.5, 0.9) # Demo fallback
-            
-            # Clean up temp files
-            if os.path.exists("temp_face.jpg"): os.remove("temp_face.jpg")
-            if os.path.exists("temp_voice.wav"): os.remove("temp_voice.wav")
-            
-            fused_score = fusion_engine.fuse_scores(face_score, voice_score)
-            is_verified = fusion_engine.make_decision(fused_score)
+            voice_suffix = os.path.splitext(uploaded_voice.name)[1].lower() if uploaded_voice else '.wav'
+            result = pipeline.run(
+                uploaded_face.getvalue() if uploaded_face else None,
+                uploaded_voice.getvalue() if uploaded_voice else None,
+                voice_suffix
+            )
+            face_score = result['scores']['face']
+            voice_score = result['scores']['voice']
+            fused_score = result['scores']['fused']
+            is_verified = result['verified']
             
             st.markdown("### Authentication Results")
             res_col1, res_col2, res_col3 = st.columns(3)
@@ -127,35 +95,38 @@ with tab1:
 with tab2:
     st.subheader("📈 Performance Metrics")
     
-    # Generate Synthetic Evaluation Data for Demonstration
-    n_samples = 100
-    y_true = np.array([1]*50 + [0]*50)
-    
-    # High quality fusion scores for demo
-    face_scores = np.concatenate([np.random.normal(0.8, 0.1, 50), np.random.normal(0.3, 0.1, 50)])
-    voice_scores = np.concatenate([np.random.normal(0.7, 0.15, 50), np.random.normal(0.4, 0.15, 50)])
-    
-    face_scores = np.clip(face_scores, 0, 1)
-    voice_scores = np.clip(voice_scores, 0, 1)
-    
-    fused_scores = [fusion_engine.fuse_scores(f, v) for f, v in zip(face_scores, voice_scores)]
-    
-    m_face = calculate_biometric_metrics(y_true, face_scores)
-    m_voice = calculate_biometric_metrics(y_true, voice_scores)
-    m_fused = calculate_biometric_metrics(y_true, fused_scores)
+    # Written by the offline evaluation runner (python -m evaluation.runner)
+    report = load_report()
     
-    m_cols = st.columns(3)
-    m_cols[0].write("**Face Only**")
-    m_cols[0].json({"Acc": f"{m_face['accuracy']:.2f}", "EER": f"{m_face['eer']:.2f}"})
-    
-    m_cols[1].write("**Voice Only**")
-    m_cols[1].json({"Acc": f"{m_voice['accuracy']:.2f}", "EER": f"{m_voice['eer']:.2f}"})
-    
-    m_cols[2].write("**Multi-Modal Fusion**")
-    m_cols[2].json({"Acc": f"{m_fused['accuracy']:.2f}", "EER": f"{m_fused['eer']:.2f}"})
-    
-    st.markdown("#### ROC Curve Comparison")
-    fig = plot_roc_curve(m_fused['fpr'], m_fused['tpr'], m_fused['auc'], title="Multi-Modal ROC Analysis")
-    st.pyplot(fig)
-    
-    st.info("💡 Note: Multi-modal fusion consistently outperforms single modalities by reducing False Acceptance Rates.")
+    if not report or not report['modalities']:
+        st.info("No evaluation report yet. Configure the datasets in `config/paths_config.py` and run "
+                "`python -m evaluation.runner`.")
+    else:
+        labels = {"face": "Face Only", "voice": "Voice Only", "fused": "Multi-Modal Fusion"}
+        m_cols = st.columns(3)
+        for col, (modality, label) in zip(m_cols, labels.items()):
+            col.write(f"**{label}**")
+            summary = report['modalities'].get(modality)
+            if summary:
+                values = {"Acc": f"{summary['accuracy']:.2f}", "EER": f"{summary['eer']:.2f}"}
+                point = summary.get('operating_points', {}).get('0.001')
+                if point:
+                    values["FRR@FAR=0.1%"] = f"{point['frr']:.2f}"
+                col.json(values)
+            else:
+                col.caption("Not evaluated")
+        
+        st.markdown("#### ROC Curve Comparison")
+        modality = 'fused' if 'fused' in report['modalities'] else next(iter(report['modalities']))
+        summary = report['modalities'][modality]
+        fig = plot_roc_curve(summary['roc']['fpr'], summary['roc']['tpr'], summary['auc'],
+                             title=f"{labels[modality]} ROC Analysis")
+        st.pyplot(fig)
+        if 'det' in summary:
+            st.markdown("#### DET Curve")
+            st.pyplot(plot_det_curve(summary['det']['far'], summary['det']['frr'],
+                                     title=f"{labels[modality]} DET Analysis"))
+        st.caption(f"{summary['genuine']:,} genuine and {summary['impostor']:,} impostor comparisons, "
+                   f"evaluated {report['generated_at'][:16].replace('T', ' ')}.")
+        
+        st.info("💡 Note: Multi-modal fusion consistently outperforms single modalities by reducing False Acceptance Rates.")
@@ -0,0 +1,147 @@
+"""
+Materialized attendance aggregates.
+
+Dashboards read these counters instead of scanning raw attendance. They are
+kept in their own small file next to the database and updated incrementally by
+database_manager.log_attendance; anything else that rewrites the database
+leaves them stale, and they are rebuilt from the raw records on next read.
+"""
+
+import os
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, Optional
+
+from utils import serialization
+
+AGGREGATES_PATH = 'data/aggregates.json'
+
+DEFAULT_WORK_DAYS = [0, 1, 2, 3, 4]  # Monday .. Friday
+
+# One character per day of month in a person's month code string
+STATUS_CODES = {"on_time": "O", "late": "L", "incomplete": "I"}
+NO_RECORD = "."
+OTHER_STATUS = "P"
+
+def empty_counters() -> Dict:
+    return {"present": 0, "on_time": 0, "late": 0, "incomplete": 0}
+
+def _count(counters: Dict, status: str) -> None:
+    counters['present'] += 1
+    if status in counters:
+        counters[status] += 1
+
+def empty_aggregates() -> Dict:
+    return {
+        "version": 0,
+        "active_persons": 0,
+        "persons": {},
+        "daily": {}
+    }
+
+def apply_record(aggs: Dict, record: Dict, department: Optional[str]) -> None:
+    """Fold one new attendance record into the aggregates."""
+    day = record['date']
+    status = record['status']
+    department = department or "Unknown"
+
+    daily = aggs['daily'].setdefault(day, dict(empty_counters(), departments={}))
+    _count(daily, status)
+    _count(daily['departments'].setdefault(department, empty_counters()), status)
+
+    person = aggs['persons'].setdefault(
+        record['person_id'], dict(empty_counters(), registered=None, months={})
+    )
+    _count(person, status)
+    month = person['months'].setdefault(day[:7], NO_RECORD * 31)
+    index = int(day[8:10]) - 1
+    person['months'][day[:7]] = month[:index] + STATUS_CODES.get(status, OTHER_STATUS) + month[index + 1:]
+
+def build_aggregates(db: Dict) -> Dict:
+    """Rebuild all aggregates from the raw database."""
+    aggs = empty_aggregates()
+    aggs['version'] = db.get('version', 0)
+
+    departments = {}
+    for person in db['persons']:
+        departments[person['id']] = person.get('department')
+        if person.get('status') == 'active':
+            aggs['active_persons'] += 1
+        aggs['persons'][person['id']] = dict(
+            empty_counters(), registered=(person.get('registered_at') or '')[:10] or None, months={}
+        )
+
+    for record in db['attendance']:
+        apply_record(aggs, record, departments.get(record['person_id']))
+    return aggs
+
+def read_aggregates() -> Optional[Dict]:
+    """Read the aggregates file, or None if there is none."""
+    if not os.path.exists(AGGREGATES_PATH):
+        return None
+    return serialization.load_file(AGGREGATES_PATH)
+
+def write_aggregates(aggs: Dict) -> None:
+    os.makedirs(os.path.dirname(AGGREGATES_PATH), exist_ok=True)
+    tmp_path = AGGREGATES_PATH + '.tmp'
+    serialization.dump_file(aggs, tmp_path)
+    os.replace(tmp_path, AGGREGATES_PATH)
+
+# ============ WORKING-DAY CALENDAR ============
+
+def working_days(start: date, end: date, settings: Dict, now: Optional[datetime] = None) -> Iterator[date]:
+    """
+    Yield the days in [start, end] on which attendance is expected.
+    Days must fall on settings['work_days'] (default Mon-Fri) and not be listed in
+    settings['holidays']. Future days never count; today only counts once the late
+    threshold has passed, since nobody is absent before they could still arrive on time.
+    """
+    now = now or datetime.now()
+    work_days = set(settings.get('work_days', DEFAULT_WORK_DAYS))
+    holidays = set(settings.get('holidays', []))
+
+    last = min(end, now.date())
+    if last == now.date() and now.strftime("%H:%M:%S") <= settings.get('late_threshold', '09:00:00'):
+        last -= timedelta(days=1)
+
+    day = start
+    while day <= last:
+        if day.weekday() in work_days and day.isoformat() not in holidays:
+            yield day
+        day += timedelta(days=1)
+
+def person_range_stats(person: Dict, start: date, end: date, settings: Dict,
+                       now: Optional[datetime] = None) -> Dict:
+    """Status counts and absences of one person between two dates, read from month code strings."""
+    counts = empty_counters()
+    present_on_working_days = 0
+    expected = 0
+
+    months = person.get('months', {})
+    # Nobody is absent before they were registered
+    if person.get('registered'):
+        registered = date.fromisoformat(person['registered'])
+    else:
+        registered = start
+
+    for day in working_days(max(start, registered), end, settings, now):
+        expected += 1
+        code = months.get(day.isoformat()[:7], '')[day.day - 1:day.day]
+        if code and code != NO_RECORD:
+            present_on_working_days += 1
+
+    month = date(start.year, start.month, 1)
+    while month <= end:
+        codes = months.get(month.isoformat()[:7])
+        if codes:
+            first = start.day - 1 if (month.year, month.month) == (start.year, start.month) else 0
+            last = end.day if (month.year, month.month) == (end.year, end.month) else 31
+            window = codes[first:last]
+            counts['on_time'] += window.count(STATUS_CODES['on_time'])
+            counts['late'] += window.count(STATUS_CODES['late'])
+            counts['incomplete'] += window.count(STATUS_CODES['incomplete'])
+            counts['present'] += len(window) - window.count(NO_RECORD)
+        month = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+    counts['absent'] = expected - present_on_working_days
+    counts['expected'] = expected
+    return counts
@@ -0,0 +1,47 @@
+import csv
+import zlib
+from typing import Dict, Iterable, Iterator
+
+EXPORT_HEADER = ['ID', 'Person ID', 'Name', 'Department', 'Date', 'Check In', 'Check Out', 'Status']
+
+class _LineBuffer:
+    """File-like sink that hands each CSV line back instead of storing it."""
+    def write(self, value):
+        return value
+
+def iter_attendance_csv(records: Iterable[Dict], person_lookup: Dict[str, Dict],
+                        chunk_rows: int = 500) -> Iterator[bytes]:
+    """
+    Yield the attendance CSV as UTF-8 chunks of up to chunk_rows rows.
+    Only one chunk is held in memory at a time.
+    """
+    writer = csv.writer(_LineBuffer())
+    chunk = [writer.writerow(EXPORT_HEADER)]
+    
+    for record in records:
+        person = person_lookup.get(record['person_id'])
+        chunk.append(writer.writerow([
+            record['id'],
+            record['person_id'],
+            person['name'] if person else "Unknown",
+            person['department'] if person else "Unknown",
+            record['date'],
+            record['check_in'] or '',
+            record['check_out'] or '',
+            record['status']
+        ]))
+        if len(chunk) >= chunk_rows:
+            yield ''.join(chunk).encode('utf-8')
+            chunk = []
+    
+    if chunk:
+        yield ''.join(chunk).encode('utf-8')
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Compress a byte stream into a gzip stream incrementally."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
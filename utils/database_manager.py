@@ -1,27 +1,98 @@
-import json
 import os
+import numpy as np
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Set
+
+from utils import attendance_aggregates as aggregates
+from utils import metrics, serialization, store_lock, template_store
 
 DATABASE_PATH = 'data/database.json'
 
+# Biometric templates live in utils/template_store, never in person metadata
+TEMPLATE_FIELDS = ('face_embedding', 'voice_mfcc')
+
 def load_database() -> Dict:
     """Load the database from JSON file."""
     if not os.path.exists(DATABASE_PATH):
         return initialize_database()
     
-    with open(DATABASE_PATH, 'r') as f:
-        return json.load(f)
+    stamp = _file_stamp()
+    db = serialization.load_file(DATABASE_PATH)
+    _version_cache.update(stamp=stamp, version=db.get('version', 0))
+    
+    if _has_inline_templates(db):
+        db = _migrate_inline_templates(db)
+    return db
+
+def _has_inline_templates(db: Dict) -> bool:
+    """Check for a legacy database that stores templates inside person records."""
+    admin = db.get('admin') or {}
+    return 'face_embedding' in admin or any(
+        field in person for person in db['persons'] for field in TEMPLATE_FIELDS
+    )
+
+def _migrate_inline_templates(db: Dict) -> Dict:
+    """Move legacy inline templates into the template store."""
+    with store_lock.locked():
+        # Another writer may have migrated (and changed) the file since it was read
+        db = serialization.load_file(DATABASE_PATH)
+        if not _has_inline_templates(db):
+            return db
+        return _move_inline_templates(db)
+
+def _move_inline_templates(db: Dict) -> Dict:
+    templates = template_store.load_templates()
+    for person in db['persons']:
+        face_embedding = person.pop('face_embedding', None)
+        voice_mfcc = person.pop('voice_mfcc', None)
+        template_store.set_person_templates(templates, person['id'], face_embedding, voice_mfcc)
+    
+    admin = db.get('admin') or {}
+    if admin.get('face_embedding'):
+        templates['admin_face'] = np.asarray(admin['face_embedding'], dtype=np.float64)
+    admin.pop('face_embedding', None)
+    
+    template_store.save_templates(templates)
+    save_database(db)
+    return db
 
 def save_database(data: Dict) -> None:
-    """Save the database to JSON file."""
+    """
+    Save the database to JSON file, bumping its version counter.
+    Callers that loaded data hold store_lock.locked() around the load and the save.
+    """
     os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
-    with open(DATABASE_PATH, 'w') as f:
-        json.dump(data, f, indent=2)
+    data['version'] = data.get('version', 0) + 1
+    # Write next to the target and swap in, so readers never see a partial file
+    tmp_path = DATABASE_PATH + '.tmp'
+    serialization.dump_file(data, tmp_path)
+    os.replace(tmp_path, DATABASE_PATH)
+    _version_cache.update(stamp=_file_stamp(), version=data['version'])
+
+# Last seen (mtime, size) of the database file and the version stored in it
+_version_cache = {"stamp": None, "version": 0}
+
+def _file_stamp():
+    st = os.stat(DATABASE_PATH)
+    return (st.st_mtime_ns, st.st_size)
+
+def get_version() -> int:
+    """
+    Get the database version counter.
+    Only reparses the file when it changed on disk, so it is cheap enough for every conditional GET.
+    """
+    if not os.path.exists(DATABASE_PATH):
+        return 0
+    changed = _file_stamp() != _version_cache['stamp']
+    metrics.cache_lookup('database_version', not changed)
+    if changed:
+        load_database()
+    return _version_cache['version']
 
 def initialize_database() -> Dict:
     """Initialize empty database structure."""
     return {
+        "version": 0,
         "admin": None,
         "persons": [],
         "attendance": [],
@@ -36,49 +107,92 @@ def initialize_database() -> Dict:
 
 def set_admin(name: str, face_embedding: list) -> Dict:
     """Set admin credentials."""
-    db = load_database()
-    db['admin'] = {
-        "id": "admin_001",
-        "name": name,
-        "face_embedding": face_embedding,
-        "created_at": datetime.now().isoformat()
-    }
-    save_database(db)
+    with store_lock.locked():
+        db = load_database()
+        db['admin'] = {
+            "id": "admin_001",
+            "name": name,
+            "created_at": datetime.now().isoformat()
+        }
+        template_store.set_admin_template(face_embedding)
+        save_database(db)
     return db['admin']
 
 def get_admin() -> Optional[Dict]:
-    """Get admin data."""
+    """Get admin metadata (the face template is held by the gallery)."""
     db = load_database()
     return db.get('admin')
 
 # ============ PERSON OPERATIONS ============
 
-def add_person(person_data: Dict) -> Dict:
-    """Add a new person to the database."""
-    db = load_database()
-    
-    # Generate ID
-    person_id = f"P{len(db['persons']) + 1:03d}"
-    
-    person = {
+def _next_person_number(db: Dict) -> int:
+    """
+    Next free numeric suffix for a P### ID. Counts both stores, so an ID is
+    never reused, even one whose template rows outlived an interrupted commit.
+    """
+    numbers = [0]
+    ids = [p['id'] for p in db['persons']] + [str(i) for i in template_store.load_templates()['person_ids']]
+    for person_id in ids:
+        if person_id[:1] == 'P' and person_id[1:].isdigit():
+            numbers.append(int(person_id[1:]))
+    return max(numbers) + 1
+
+def _new_person(person_id: str, person_data: Dict) -> Dict:
+    return {
         "id": person_id,
         "name": person_data['name'],
-        "employee_id": person_data.get('employee_id', person_id),
+        "employee_id": person_data.get('employee_id') or person_id,
         "date_of_birth": person_data.get('date_of_birth'),
         "gender": person_data.get('gender'),
-        "department": person_data.get('department', 'General'),
+        "department": person_data.get('department') or 'General',
         "email": person_data.get('email'),
         "phone": person_data.get('phone'),
-        "face_embedding": person_data.get('face_embedding', []),
-        "voice_mfcc": person_data.get('voice_mfcc', []),
         "registered_at": datetime.now().isoformat(),
-        "status": "active"
+        "status": "active",
+        **({"import_key": person_data['import_key']} if person_data.get('import_key') else {})
     }
-    
-    db['persons'].append(person)
-    save_database(db)
+
+def add_person(person_data: Dict) -> Dict:
+    """Add a new person to the database, storing any templates in the template store."""
+    with store_lock.locked():
+        db = load_database()
+        
+        # Generate ID
+        person_id = f"P{_next_person_number(db):03d}"
+        person = _new_person(person_id, person_data)
+        
+        template_store.add_person_templates(
+            person_id,
+            face_embedding=person_data.get('face_embedding'),
+            voice_mfcc=person_data.get('voice_mfcc')
+        )
+        db['persons'].append(person)
+        save_database(db)
     return person
 
+def add_persons(persons_data: List[Dict]) -> List[Dict]:
+    """
+    Add many persons at once: one template store write and one database write.
+    The template store is written first; the database write is the commit point,
+    so a crash in between leaves only template rows that no person refers to.
+    The store lock is held throughout, so no other writer can take the same IDs.
+    """
+    with store_lock.locked():
+        db = load_database()
+        first = _next_person_number(db)
+        persons = [_new_person(f"P{first + i:03d}", data) for i, data in enumerate(persons_data)]
+        
+        templates = template_store.load_templates()
+        template_store.append_person_templates(templates, [
+            (person['id'], data.get('face_embedding'), data.get('voice_mfcc'))
+            for person, data in zip(persons, persons_data)
+        ])
+        template_store.save_templates(templates)
+        
+        db['persons'].extend(persons)
+        save_database(db)
+    return persons
+
 def get_person(person_id: str) -> Optional[Dict]:
     """Get person by ID."""
     db = load_database()
@@ -99,14 +213,21 @@ def get_all_persons(status: Optional[str] = None, department: Optional[str] = No
     
     return persons
 
+def get_person_lookup() -> Dict[str, Dict]:
+    """Map person ID -> {name, department}, built from a single database load."""
+    db = load_database()
+    return {p['id']: {"name": p['name'], "department": p['department']} for p in db['persons']}
+
 def update_person(person_id: str, updates: Dict) -> Optional[Dict]:
     """Update person information."""
-    db = load_database()
-    for i, person in enumerate(db['persons']):
-        if person['id'] == person_id:
-            db['persons'][i].update(updates)
-            save_database(db)
-            return db['persons'][i]
+    updates = {k: v for k, v in updates.items() if k not in TEMPLATE_FIELDS}
+    with store_lock.locked():
+        db = load_database()
+        for i, person in enumerate(db['persons']):
+            if person['id'] == person_id:
+                db['persons'][i].update(updates)
+                save_database(db)
+                return db['persons'][i]
     return None
 
 def deactivate_person(person_id: str) -> bool:
@@ -117,6 +238,10 @@ def deactivate_person(person_id: str) -> bool:
 
 def log_attendance(person_id: str, action: str, verification_method: str = "face_voice") -> Dict:
     """Log attendance (check-in or check-out)."""
+    with store_lock.locked():
+        return _log_attendance(person_id, action, verification_method)
+
+def _log_attendance(person_id: str, action: str, verification_method: str) -> Dict:
     db = load_database()
     
     now = datetime.now()
@@ -125,6 +250,7 @@ def log_attendance(person_id: str, action: str, verification_method: str = "face
     
     # Find today's attendance record
     attendance_record = None
+    created = False
     for record in db['attendance']:
         if record['person_id'] == person_id and record['date'] == today:
             attendance_record = record
@@ -150,6 +276,7 @@ def log_attendance(person_id: str, action: str, verification_method: str = "face
                 "verification_method": verification_method
             }
             db['attendance'].append(attendance_record)
+            created = True
     
     elif action == "checkout":
         if attendance_record:
@@ -167,8 +294,18 @@ def log_attendance(person_id: str, action: str, verification_method: str = "face
                 "verification_method": verification_method
             }
             db['attendance'].append(attendance_record)
+            created = True
     
+    aggs = load_aggregates()
     save_database(db)
+    
+    # Only a newly created record changes the counters
+    if created:
+        department = next((p['department'] for p in db['persons'] if p['id'] == person_id), None)
+        aggregates.apply_record(aggs, attendance_record, department)
+    aggs['version'] = db['version']
+    aggregates.write_aggregates(aggs)
+    
     return attendance_record
 
 def get_attendance_today() -> List[Dict]:
@@ -191,41 +328,81 @@ def get_attendance_history(person_id: Optional[str] = None,
     if end_date:
         records = [r for r in records if r['date'] <= end_date]
     
-    return sorted(records, key=lambda x: x['date'], reverse=True)
+    return sorted(records, key=lambda x: (x['date'], x['id'], x['person_id']), reverse=True)
+
+def iter_attendance(start_date: Optional[str] = None,
+                    end_date: Optional[str] = None,
+                    person_ids: Optional[Set[str]] = None) -> Iterator[Dict]:
+    """
+    Yield attendance records in store order, filtered lazily.
+    Unlike get_attendance_history this builds no intermediate or sorted lists.
+    """
+    db = load_database()
+    for record in db['attendance']:
+        if start_date and record['date'] < start_date:
+            continue
+        if end_date and record['date'] > end_date:
+            continue
+        if person_ids is not None and record['person_id'] not in person_ids:
+            continue
+        yield record
 
 # ============ ANALYTICS ============
 
+def load_aggregates() -> Dict:
+    """
+    Load the materialized attendance aggregates.
+    They are rebuilt from raw records if they lag behind the database version.
+    """
+    aggs = aggregates.read_aggregates()
+    stale = aggs is None or aggs['version'] != get_version()
+    metrics.cache_lookup('aggregates', not stale)
+    if stale:
+        db = load_database()
+        aggs = aggregates.build_aggregates(db)
+        aggs['settings'] = db['settings']
+        aggregates.write_aggregates(aggs)
+    return aggs
+
 def calculate_attendance_stats(person_id: str, start_date: str, end_date: str) -> Dict:
-    """Calculate attendance statistics for a person."""
-    records = get_attendance_history(person_id, start_date, end_date)
+    """Calculate attendance statistics for a person, with absences from the working-day calendar."""
+    aggs = load_aggregates()
+    person = aggs['persons'].get(person_id, {})
+    counts = aggregates.person_range_stats(
+        person,
+        datetime.strptime(start_date, "%Y-%m-%d").date(),
+        datetime.strptime(end_date, "%Y-%m-%d").date(),
+        aggs['settings']
+    )
     
-    total_days = len(records)
-    on_time = len([r for r in records if r['status'] == 'on_time'])
-    late = len([r for r in records if r['status'] == 'late'])
-    absent = 0  # Calculate based on expected working days
+    total_days = counts['present']
+    absent = counts['absent']
     
     attendance_percentage = (total_days / (total_days + absent) * 100) if (total_days + absent) > 0 else 0
     
     return {
         "total_days_present": total_days,
-        "on_time_count": on_time,
-        "late_count": late,
+        "on_time_count": counts['on_time'],
+        "late_count": counts['late'],
         "absent_count": absent,
+        "expected_working_days": counts['expected'],
         "attendance_percentage": round(attendance_percentage, 2)
     }
 
 def get_dashboard_overview() -> Dict:
-    """Get overview statistics for dashboard."""
-    db = load_database()
-    today_attendance = get_attendance_today()
+    """Get overview statistics for dashboard, read from the materialized aggregates."""
+    aggs = load_aggregates()
+    today = datetime.now().strftime("%Y-%m-%d")
+    day = aggs['daily'].get(today, dict(aggregates.empty_counters(), departments={}))
     
-    total_persons = len([p for p in db['persons'] if p['status'] == 'active'])
-    present_today = len(today_attendance)
-    late_today = len([a for a in today_attendance if a['status'] == 'late'])
+    total_persons = aggs['active_persons']
+    present_today = day['present']
     
     return {
         "total_persons": total_persons,
         "present_today": present_today,
-        "late_today": late_today,
+        "late_today": day['late'],
+        "on_time_today": day['on_time'],
+        "departments": day['departments'],
         "attendance_rate": round((present_today / total_persons * 100) if total_persons > 0 else 0, 2)
     }
@@ -1,174 +1,408 @@
 """
 Generate fake data for the attendance management system.
-Creates 20 people with realistic 6-month attendance history.
+
+By default: 20 people with a realistic 6-month attendance history, written to
+data/database.json and data/templates.npz. Everything is parameterized for
+benchmarking (persons, days, attendance pattern mix, embedding dimension) and
+seeded: the same seed gives the same data, and persons, templates and
+attendance draw from separate streams, so e.g. changing --days leaves the
+embeddings as they were.
+
+Persons, templates and attendance are generated in vectorized chunks and
+handed to a sink as they are produced:
+
+- StoreSink: the application's own store (database_manager / template_store).
+  The JSON database is one document, so it is written once at the end.
+- JsonlSink: a directory of persons.jsonl and attendance.jsonl, appended chunk
+  by chunk, and face.npy / voice.npy filled in place, so memory stays flat for
+  millions of rows.
+
+Any object with the same methods works as a sink.
+
+With --clustered, templates have a genuine/impostor structure: each identity
+has a center, identities of one cluster share part of it (similar-looking or
+-sounding people), and every template or probe is its identity's center plus
+noise. --probes-per-person also writes that many extra genuine samples per
+person (probes.npz), for scoring genuine and impostor pairs.
+
+CLI:
+    python utils/fake_data_generator.py
+    python -m utils.fake_data_generator --persons 100000 --days 365 --clustered --sink jsonl --out /tmp/identix
+    python -m utils.fake_data_generator --persons 1000 --patterns perfect=1 poor=1 --face-dim 512 --seed 7
 """
 
-import json
-import random
+import argparse
+import os
+import sys
+from collections import Counter
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
 import numpy as np
-from datetime import datetime, timedelta
 from faker import Faker
-import sys
-import os
 
 # Add project root to path
 sys.path.append(os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
 
 from utils.database_manager import initialize_database, save_database
-
-fake = Faker()
+from utils import serialization, template_store
 
 # Departments
 DEPARTMENTS = ['Engineering', 'Marketing', 'Sales', 'HR', 'Finance', 'Operations']
 
-# Attendance patterns
+# Attendance patterns; share: default fraction of persons (5, 8, 5 and 2 of 20)
 PATTERNS = {
-    'perfect': {'late_prob': 0.0, 'absent_prob': 0.0},      # 5 people
-    'good': {'late_prob': 0.1, 'absent_prob': 0.05},        # 8 people
-    'average': {'late_prob': 0.25, 'absent_prob': 0.15},    # 5 people
-    'poor': {'late_prob': 0.4, 'absent_prob': 0.3}          # 2 people
+    'perfect': {'late_prob': 0.0, 'absent_prob': 0.0, 'share': 0.25},
+    'good': {'late_prob': 0.1, 'absent_prob': 0.05, 'share': 0.4},
+    'average': {'late_prob': 0.25, 'absent_prob': 0.15, 'share': 0.25},
+    'poor': {'late_prob': 0.4, 'absent_prob': 0.3, 'share': 0.1}
 }
 
-def generate_fake_embedding(dim=2622):
-    """Generate fake face embedding."""
-    return np.random.randn(dim).tolist()
-
-def generate_fake_mfcc(n_mfcc=13):
-    """Generate fake voice MFCC."""
-    return np.random.randn(n_mfcc).tolist()
-
-def generate_check_in_time(is_late=False):
-    """Generate realistic check-in time."""
-    if is_late:
-        # Late: 9:00 AM - 10:30 AM
-        hour = random.randint(9, 10)
-        minute = random.randint(0, 59) if hour == 9 else random.randint(0, 30)
-    else:
-        # On time: 7:30 AM - 8:59 AM
-        hour = random.randint(7, 8)
-        minute = random.randint(30, 59) if hour == 7 else random.randint(0, 59)
-    
-    return f"{hour:02d}:{minute:02d}:{random.randint(0, 59):02d}"
-
-def generate_check_out_time():
-    """Generate realistic check-out time."""
-    hour = random.randint(17, 19)
-    minute = random.randint(0, 59)
-    return f"{hour:02d}:{minute:02d}:{random.randint(0, 59):02d}"
-
-def generate_person(person_id, pattern_type):
-    """Generate a fake person."""
-    gender = random.choice(['Male', 'Female'])
-    first_name = fake.first_name_male() if gender == 'Male' else fake.first_name_female()
-    last_name = fake.last_name()
-    
-    return {
-        "id": f"P{person_id:03d}",
-        "name": f"{first_name} {last_name}",
-        "employee_id": f"EMP{person_id:03d}",
-        "date_of_birth": fake.date_of_birth(minimum_age=22, maximum_age=60).strftime("%Y-%m-%d"),
-        "gender": gender,
-        "department": random.choice(DEPARTMENTS),
-        "email": f"{first_name.lower()}.{last_name.lower()}@company.com",
-        "phone": fake.phone_number(),
-        "face_embedding": generate_fake_embedding(),
-        "voice_mfcc": generate_fake_mfcc(),
-        "registered_at": "2025-08-01T10:00:00Z",
-        "status": "active",
-        "pattern": pattern_type  # For tracking (will be removed before saving)
-    }
-
-def generate_attendance_history(person, start_date, end_date):
-    """Generate attendance history for a person."""
-    pattern = PATTERNS[person['pattern']]
-    attendance_records = []
-    
-    current_date = start_date
-    attendance_id = 1
-    
-    while current_date <= end_date:
-        # Skip weekends
-        if current_date.weekday() < 5:  # Monday = 0, Friday = 4
-            # Determine if absent
-            if random.random() > pattern['absent_prob']:
-                # Present
-                is_late = random.random() < pattern['late_prob']
-                
-                record = {
-                    "id": f"ATT{attendance_id:05d}",
-                    "person_id": person['id'],
-                    "date": current_date.strftime("%Y-%m-%d"),
-                    "check_in": generate_check_in_time(is_late),
-                    "check_out": generate_check_out_time(),
-                    "status": "late" if is_late else "on_time",
-                    "verification_method": "face_voice"
-                }
-                attendance_records.append(record)
-                attendance_id += 1
-        
-        current_date += timedelta(days=1)
-    
-    return attendance_records
-
-def generate_fake_data():
-    """Generate complete fake database."""
-    print("🔧 Generating fake data...")
-    
-    # Initialize database
-    db = initialize_database()
-    
-    # Set admin
-    print("👤 Creating admin...")
-    db['admin'] = {
-        "id": "admin_001",
-        "name": "Admin User",
-        "face_embedding": generate_fake_embedding(),
-        "created_at": "2025-08-01T09:00:00Z"
-    }
-    
-    # Generate 20 persons
-    print("👥 Generating 20 persons...")
-    pattern_distribution = (
-        ['perfect'] * 5 +
-        ['good'] * 8 +
-        ['average'] * 5 +
-        ['poor'] * 2
-    )
-    random.shuffle(pattern_distribution)
-    
+FACE_DIM = 2622  # VGG-Face
+N_MFCC = 13
+START_DATE = date(2025, 8, 1)
+DAYS = 188  # Aug 2025 - Feb 2026
+# Check-in/out windows in seconds of the day: on time 7:30-8:59, late 9:00-10:30, out 17:00-19:59
+ON_TIME = (7 * 3600 + 30 * 60, 9 * 3600)
+LATE = (9 * 3600, 10 * 3600 + 30 * 60 + 60)
+CHECK_OUT = (17 * 3600, 20 * 3600)
+# Rows generated at once: persons per template chunk, person-days per attendance chunk
+TEMPLATE_CHUNK = 4096
+ATTENDANCE_CHUNK = 200_000
+# Distinct Faker names and phone numbers drawn from; larger runs reuse them
+NAME_POOL = 1000
+# Clustered templates: share of an identity's center that comes from its cluster, within-identity noise
+CLUSTER_WEIGHT = 0.5
+FACE_NOISE = 0.6
+VOICE_NOISE = 0.4
+VOICE_SCALE = 20.0  # Spread of MFCC means, so voice distances land in the matcher's range
+
+# ============ PERSONS ============
+
+def pattern_counts(n: int, mix: Dict[str, float]) -> Dict[str, int]:
+    """Split n persons over the patterns in proportion to mix (largest remainder, so they add up to n)."""
+    names = list(mix)
+    shares = np.array([mix[name] for name in names], dtype=np.float64)
+    exact = n * shares / shares.sum()
+    counts = np.floor(exact).astype(int)
+    counts[np.argsort(counts - exact)[:n - counts.sum()]] += 1
+    return dict(zip(names, counts.tolist()))
+
+def generate_persons(n: int, mix: Dict[str, float], start: date, rng, seed: int) -> Tuple[List[Dict], np.ndarray]:
+    """n person records and the pattern name of each."""
+    fake = Faker()
+    fake.seed_instance(seed)
+    pool = min(n, NAME_POOL)
+    male = np.array([fake.first_name_male() for _ in range(pool)])
+    female = np.array([fake.first_name_female() for _ in range(pool)])
+    last = np.array([fake.last_name() for _ in range(pool)])
+    phones = np.array([fake.phone_number() for _ in range(pool)])
+
+    counts = pattern_counts(n, mix)
+    patterns = rng.permutation(np.repeat(list(counts), list(counts.values())))
+    is_male = rng.random(n) < 0.5
+    first = np.where(is_male, male[rng.integers(0, pool, n)], female[rng.integers(0, pool, n)])
+    last = last[rng.integers(0, pool, n)]
+    departments = np.array(DEPARTMENTS)[rng.integers(0, len(DEPARTMENTS), n)]
+    phones = phones[rng.integers(0, pool, n)]
+    # Ages 22-60 on the first day
+    born = np.datetime64(start) - rng.integers(22 * 365, 60 * 365, n).astype('timedelta64[D]')
+    born = np.datetime_as_string(born, unit='D')
+
+    emails = np.char.add(np.char.add(np.char.lower(first), '.'), np.char.lower(last))
+    seen = Counter(emails.tolist())
+    registered = f"{start.isoformat()}T10:00:00Z"
     persons = []
-    for i, pattern in enumerate(pattern_distribution, 1):
-        person = generate_person(i, pattern)
-        persons.append(person)
-        print(f"  ✓ {person['name']} ({person['department']}) - {pattern} attendance")
-    
-    db['persons'] = persons
-    
-    # Generate 6 months of attendance (Aug 2025 - Feb 2026)
-    print("📅 Generating 6 months of attendance history...")
-    start_date = datetime(2025, 8, 1)
-    end_date = datetime(2026, 2, 4)
-    
-    all_attendance = []
-    for person in persons:
-        attendance = generate_attendance_history(person, start_date, end_date)
-        all_attendance.extend(attendance)
-        print(f"  ✓ {person['name']}: {len(attendance)} records")
-        # Remove pattern field before saving
-        del person['pattern']
-    
-    db['attendance'] = all_attendance
-    
-    # Save to file
-    print("💾 Saving to database.json...")
-    save_database(db)
-    
-    # Print summary
-    print("\n✅ Fake data generation complete!")
-    print(f"   📊 Total Persons: {len(db['persons'])}")
-    print(f"   📊 Total Attendance Records: {len(db['attendance'])}")
-    print(f"   📊 Date Range: {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}")
-    print(f"   📂 Saved to: data/database.json")
+    for i in range(n):
+        email = emails[i] if seen[emails[i]] == 1 else f"{emails[i]}{i + 1}"
+        persons.append({
+            "id": f"P{i + 1:03d}",
+            "name": f"{first[i]} {last[i]}",
+            "employee_id": f"EMP{i + 1:03d}",
+            "date_of_birth": str(born[i]),
+            "gender": "Male" if is_male[i] else "Female",
+            "department": str(departments[i]),
+            "email": f"{email}@company.com",
+            "phone": str(phones[i]),
+            "registered_at": registered,
+            "status": "active"
+        })
+    return persons, patterns
+
+# ============ TEMPLATES ============
+
+def _unit(x: np.ndarray) -> np.ndarray:
+    return x / np.linalg.norm(x, axis=-1, keepdims=True)
+
+class TemplateModel:
+    """
+    Draws face and voice templates. Unclustered, every vector is independent standard
+    normal noise. Clustered, person i's samples scatter around a center that is
+    CLUSTER_WEIGHT its cluster's direction and the rest its own.
+    """
+    def __init__(self, face_dim: int, rng, clustered: bool = False, clusters: int = 1):
+        self.face_dim = face_dim
+        self.rng = rng
+        self.clustered = clustered
+        if clustered:
+            self.cluster_face = _unit(rng.normal(size=(clusters, face_dim)))
+            self.cluster_voice = _unit(rng.normal(size=(clusters, N_MFCC)))
+
+    def centers(self, n: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Face and voice centers of the next n identities (clustered only)."""
+        if not self.clustered:
+            return None
+        cluster = self.rng.integers(0, len(self.cluster_face), n)
+        w = CLUSTER_WEIGHT
+        face = _unit(w * self.cluster_face[cluster] + np.sqrt(1 - w ** 2) * _unit(self.rng.normal(size=(n, self.face_dim))))
+        voice = _unit(w * self.cluster_voice[cluster] + np.sqrt(1 - w ** 2) * _unit(self.rng.normal(size=(n, N_MFCC))))
+        return face, voice
+
+    def samples(self, centers, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """One face and voice sample for each of n identities with the given centers."""
+        if centers is None:
+            return self.rng.normal(size=(n, self.face_dim)), self.rng.normal(size=(n, N_MFCC))
+        face_center, voice_center = centers
+        # Noise of total norm FACE_NOISE: genuine cosine about 1 / (1 + FACE_NOISE^2)
+        face = _unit(face_center + self.rng.normal(scale=FACE_NOISE / np.sqrt(self.face_dim), size=face_center.shape))
+        voice = VOICE_SCALE * (voice_center + self.rng.normal(scale=VOICE_NOISE / np.sqrt(N_MFCC), size=voice_center.shape))
+        return face, voice
+
+def iter_templates(person_ids: List[str], model: TemplateModel, probes_per_person: int = 0) -> Iterator[Dict]:
+    """Chunks of {ids, face, voice, probe_ids, probe_face, probe_voice} in person order."""
+    for start in range(0, len(person_ids), TEMPLATE_CHUNK):
+        ids = np.array(person_ids[start:start + TEMPLATE_CHUNK])
+        centers = model.centers(len(ids))
+        face, voice = model.samples(centers, len(ids))
+        chunk = {"ids": ids, "face": face, "voice": voice}
+        if probes_per_person:
+            repeated = None if centers is None else tuple(np.repeat(c, probes_per_person, axis=0) for c in centers)
+            chunk['probe_ids'] = np.repeat(ids, probes_per_person)
+            chunk['probe_face'], chunk['probe_voice'] = model.samples(repeated, len(chunk['probe_ids']))
+        yield chunk
+
+# ============ ATTENDANCE ============
+
+_time_strings = None
+
+def _times() -> np.ndarray:
+    """'HH:MM:SS' for every second of the day, so formatting times is an index lookup."""
+    global _time_strings
+    if _time_strings is None:
+        seconds = np.arange(86400)
+        _time_strings = np.array([f"{h:02d}:{m:02d}:{s:02d}" for h, m, s in
+                                  zip(seconds // 3600, seconds // 60 % 60, seconds % 60)])
+    return _time_strings
+
+def working_days(start: date, days: int) -> List[str]:
+    """ISO dates of the weekdays among `days` days from start."""
+    dates = np.datetime64(start) + np.arange(days).astype('timedelta64[D]')
+    weekday = (dates.view("int64") + 3) % 7  # Monday = 0; 1970-01-01 was a Thursday
+    return np.datetime_as_string(dates[weekday < 5], unit='D').tolist()
+
+def iter_attendance(person_ids: List[str], patterns: np.ndarray, workdays: List[str], rng) -> Iterator[List[Dict]]:
+    """
+    Chunks of attendance records in date order, a block of days at a time: each person
+    is present on a working day unless absent with its pattern's probability, and late
+    with its pattern's late probability.
+    """
+    absent = np.array([PATTERNS[p]['absent_prob'] for p in patterns])
+    late = np.array([PATTERNS[p]['late_prob'] for p in patterns])
+    ids = np.asarray(person_ids)
+    times = _times()
+    block = max(1, ATTENDANCE_CHUNK // max(len(ids), 1))
+    number = 1
+    for first in range(0, len(workdays), block):
+        days = workdays[first:first + block]
+        shape = (len(days), len(ids))
+        present = rng.random(shape) >= absent
+        is_late = rng.random(shape) < late
+        check_in = np.where(is_late, rng.integers(*LATE, shape), rng.integers(*ON_TIME, shape))
+        check_out = rng.integers(*CHECK_OUT, shape)
+        day, person = np.nonzero(present)
+        records = [{
+            "id": f"ATT{number + k:05d}",
+            "person_id": p,
+            "date": days[d],
+            "check_in": t_in,
+            "check_out": t_out,
+            "status": "late" if l else "on_time",
+            "verification_method": "face_voice"
+        } for k, (d, p, t_in, t_out, l) in enumerate(zip(
+            day.tolist(), ids[person].tolist(), times[check_in[day, person]].tolist(),
+            times[check_out[day, person]].tolist(), is_late[day, person].tolist()))]
+        number += len(records)
+        yield records
+
+# ============ SINKS ============
+
+class StoreSink:
+    """The application's store: database.json and templates.npz (and probes.npz next to them)."""
+    def begin(self, n_persons: int, face_dim: int, admin: Dict, admin_face: np.ndarray) -> None:
+        self.db = initialize_database()
+        self.db['admin'] = admin
+        self.templates = template_store.initialize_templates()
+        self.templates['admin_face'] = admin_face
+        self.chunks, self.probes = [], []
+
+    def persons(self, persons: List[Dict]) -> None:
+        self.db['persons'].extend(persons)
+
+    def templates_chunk(self, chunk: Dict) -> None:
+        self.chunks.append(chunk)
+        if 'probe_ids' in chunk:
+            self.probes.append(chunk)
+
+    def attendance(self, records: List[Dict]) -> None:
+        self.db['attendance'].extend(records)
+
+    def close(self) -> List[str]:
+        ids = np.concatenate([c['ids'] for c in self.chunks])
+        self.templates.update(person_ids=ids, face=np.concatenate([c['face'] for c in self.chunks]),
+                              voice=np.concatenate([c['voice'] for c in self.chunks]),
+                              face_mask=np.ones(len(ids), dtype=bool), voice_mask=np.ones(len(ids), dtype=bool))
+        save_database(self.db)
+        template_store.save_templates(self.templates)
+        paths = [os.path.abspath(template_store.TEMPLATES_PATH)]
+        if self.probes:
+            path = os.path.splitext(template_store.TEMPLATES_PATH)[0] + '_probes.npz'
+            _save_probes(path, self.probes)
+            paths.append(os.path.abspath(path))
+        from utils import database_manager
+        return [os.path.abspath(database_manager.DATABASE_PATH)] + paths
+
+class JsonlSink:
+    """A directory of persons.jsonl, attendance.jsonl, admin.json, person_ids.npy, face.npy, voice.npy."""
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def begin(self, n_persons: int, face_dim: int, admin: Dict, admin_face: np.ndarray) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path('admin.json'), 'wb') as f:
+            f.write(serialization.dumps(dict(admin, face_embedding=admin_face)))
+        self.person_file = open(self._path('persons.jsonl'), 'wb')
+        self.attendance_file = open(self._path('attendance.jsonl'), 'wb')
+        # Filled in place chunk by chunk, never held in memory as a whole
+        self.ids = np.lib.format.open_memmap(self._path('person_ids.npy'), mode='w+', dtype='<U16', shape=(n_persons,))
+        self.face = np.lib.format.open_memmap(self._path('face.npy'), mode='w+', shape=(n_persons, face_dim))
+        self.voice = np.lib.format.open_memmap(self._path('voice.npy'), mode='w+', shape=(n_persons, N_MFCC))
+        self.rows, self.probes = 0, []
+
+    def persons(self, persons: List[Dict]) -> None:
+        self.person_file.write(b''.join(serialization.dumps(p) + b'\n' for p in persons))
+
+    def templates_chunk(self, chunk: Dict) -> None:
+        rows = slice(self.rows, self.rows + len(chunk['ids']))
+        self.ids[rows], self.face[rows], self.voice[rows] = chunk['ids'], chunk['face'], chunk['voice']
+        self.rows = rows.stop
+        if 'probe_ids' in chunk:
+            self.probes.append(chunk)
+
+    def attendance(self, records: List[Dict]) -> None:
+        self.attendance_file.write(b''.join(serialization.dumps(r) + b'\n' for r in records))
+
+    def close(self) -> List[str]:
+        self.person_file.close()
+        self.attendance_file.close()
+        for array in (self.ids, self.face, self.voice):
+            array.flush()
+        del self.ids, self.face, self.voice
+        if self.probes:
+            _save_probes(self._path('probes.npz'), self.probes)
+        return [os.path.abspath(self.directory)]
+
+def _save_probes(path: str, chunks: List[Dict]) -> None:
+    np.savez(path, person_ids=np.concatenate([c['probe_ids'] for c in chunks]),
+             face=np.concatenate([c['probe_face'] for c in chunks]),
+             voice=np.concatenate([c['probe_voice'] for c in chunks]))
+
+# ============ GENERATION ============
+
+def generate_fake_data(persons: int = 20, days: int = DAYS, start: date = START_DATE,
+                       patterns: Optional[Dict[str, float]] = None, face_dim: int = FACE_DIM, seed: int = 0,
+                       clustered: bool = False, clusters: Optional[int] = None, probes_per_person: int = 0,
+                       sink=None, verbose: bool = True) -> Dict:
+    """Generate a complete fake database into sink (the application's store by default); returns a summary."""
+    log = print if verbose else (lambda *args: None)
+    sink = sink or StoreSink()
+    mix = patterns or {name: p['share'] for name, p in PATTERNS.items()}
+    unknown = set(mix) - set(PATTERNS)
+    if unknown:
+        raise ValueError(f"Unknown attendance pattern(s): {', '.join(sorted(unknown))}")
+    if probes_per_person and not clustered:
+        raise ValueError("Probes are genuine samples of an identity; generate them with clustered templates")
+    # Independent streams: changing one part (e.g. days) leaves the others as they were
+    person_rng, template_rng, attendance_rng = (np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(3))
+
+    log("🔧 Generating fake data...")
+    people, person_patterns = generate_persons(persons, mix, start, person_rng, seed)
+    ids = [p['id'] for p in people]
+    clusters = clusters or max(1, persons // 50)
+    model = TemplateModel(face_dim, template_rng, clustered, clusters)
+    admin = {"id": "admin_001", "name": "Admin User", "created_at": f"{start.isoformat()}T09:00:00Z"}
+    admin_face = model.samples(model.centers(1), 1)[0][0]
+    sink.begin(persons, face_dim, admin, admin_face)
+
+    log(f"👥 Generating {persons} persons ({', '.join(f'{n} {p}' for p, n in pattern_counts(persons, mix).items())})...")
+    sink.persons(people)
+    del people
+    log(f"🧬 Generating {'clustered ' if clustered else ''}face ({face_dim}-d) and voice templates...")
+    for chunk in iter_templates(ids, model, probes_per_person):
+        sink.templates_chunk(chunk)
+
+    workdays = working_days(start, days)
+    log(f"📅 Generating attendance over {days} days ({len(workdays)} working days)...")
+    records = 0
+    for chunk in iter_attendance(ids, person_patterns, workdays, attendance_rng):
+        sink.attendance(chunk)
+        records += len(chunk)
+
+    log("💾 Saving...")
+    paths = sink.close()
+    end = start + timedelta(days=days - 1)
+    summary = {"persons": persons, "attendance": records, "start": start.isoformat(), "end": end.isoformat(),
+               "face_dim": face_dim, "clustered": clustered, "seed": seed, "paths": paths}
+
+    log("\n✅ Fake data generation complete!")
+    log(f"   📊 Total Persons: {persons}")
+    log(f"   📊 Total Attendance Records: {records}")
+    log(f"   📊 Date Range: {summary['start']} to {summary['end']}")
+    log(f"   📂 Saved to: {', '.join(paths)}")
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate fake persons, templates and attendance.")
+    parser.add_argument('--persons', type=int, default=20)
+    parser.add_argument('--days', type=int, default=DAYS, help="calendar days of attendance history")
+    parser.add_argument('--start', type=date.fromisoformat, default=START_DATE, help="first day (YYYY-MM-DD)")
+    parser.add_argument('--patterns', nargs='+', metavar='NAME=SHARE',
+                        help=f"attendance pattern mix, e.g. good=3 poor=1 (patterns: {', '.join(PATTERNS)})")
+    parser.add_argument('--face-dim', type=int, default=FACE_DIM)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--clustered', action='store_true', help="templates with genuine/impostor structure")
+    parser.add_argument('--clusters', type=int, help="identity clusters (default persons / 50)")
+    parser.add_argument('--probes-per-person', type=int, default=0, help="extra genuine samples (clustered)")
+    parser.add_argument('--sink', choices=('store', 'jsonl'), default='store')
+    parser.add_argument('--out', help="output directory of the jsonl sink")
+    args = parser.parse_args(argv)
+
+    mix = None
+    if args.patterns:
+        mix = {}
+        for value in args.patterns:
+            name, _, share = value.partition('=')
+            mix[name] = float(share) if share else 1.0
+    if args.sink == 'jsonl' and not args.out:
+        parser.error("--sink jsonl needs --out")
+    sink = JsonlSink(args.out) if args.sink == 'jsonl' else StoreSink()
+    try:
+        generate_fake_data(args.persons, args.days, args.start, mix, args.face_dim, args.seed, args.clustered,
+                           args.clusters, args.probes_per_person, sink)
+    except ValueError as e:
+        parser.error(str(e))
 
 if __name__ == "__main__":
-    generate_fake_data()
+    main()
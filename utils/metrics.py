@@ -0,0 +1,201 @@
+"""
+In-process metrics in Prometheus text exposition format.
+
+Recording is a label lookup and a few additions under one lock, cheap enough to
+leave on in production. Each server process keeps its own registry; stage
+timings measured inside extraction pool workers are returned with the result
+and recorded by the serving process, so one scrape of /api/metrics covers them.
+"""
+
+import bisect
+import threading
+from typing import Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; spans a cached lookup up to a cold face model on a slow CPU
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_registry = []
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        """Yield (suffix, formatted labels, value) for every recorded series."""
+        with _lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield '', _format_labels(self.labels, key), value
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}']
+        for suffix, labels, value in self.samples():
+            lines.append(f'{self.name}{suffix}{labels} {_format_value(value)}')
+        return '\n'.join(lines)
+
+class Counter(_Metric):
+    """Monotonic count. Name it with a _total suffix."""
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    """
+    Value that goes up and down. A gauge can instead be computed at scrape time
+    with set_function(fn), where fn returns {label values tuple: value}.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        super().__init__(name, description, labels)
+        self._function = None
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = value
+
+    def set_function(self, function: Callable[[], Dict[Tuple[str, ...], float]]):
+        self._function = function
+
+    def samples(self):
+        if self._function is None:
+            yield from super().samples()
+            return
+        try:
+            values = self._function()
+        except Exception as e:
+            print(f"Metrics: could not compute {self.name}: {e}")
+            return
+        for key, value in sorted(values.items()):
+            yield '', _format_labels(self.labels, key), value
+
+class Histogram(_Metric):
+    """Distribution of observations (seconds) over fixed buckets."""
+    kind = 'histogram'
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            series = self._values.get(key)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, the last one is +Inf; then sum and count
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with _lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                yield '_bucket', _format_labels(self.labels, key, ('le', _format_value(bound))), cumulative
+            yield '_sum', _format_labels(self.labels, key), total
+            yield '_count', _format_labels(self.labels, key), count
+
+def render() -> str:
+    """All registered metrics in Prometheus text format."""
+    return '\n'.join(metric.render() for metric in _registry) + '\n'
+
+# ============ METRICS ============
+
+STAGE_SECONDS = Histogram(
+    'identix_stage_duration_seconds',
+    'Wall time of each verification pipeline stage.',
+    ('stage',)
+)
+VERIFICATION_SECONDS = Histogram(
+    'identix_verification_duration_seconds',
+    'End-to-end wall time of a verification pipeline run.',
+    ('pipeline',)
+)
+VERIFICATIONS = Counter(
+    'identix_verifications_total',
+    'Verification decisions by pipeline and outcome.',
+    ('pipeline', 'outcome')
+)
+CACHE_REQUESTS = Counter(
+    'identix_cache_requests_total',
+    'Cache lookups by cache and result (hit or miss).',
+    ('cache', 'result')
+)
+GALLERY_TEMPLATES = Gauge(
+    'identix_gallery_templates',
+    'Enrolled templates in the in-memory gallery, by modality.',
+    ('modality',)
+)
+SHED_REQUESTS = Counter(
+    'identix_shed_requests_total',
+    'Verification requests refused by admission control, by reason (queue_full or deadline).',
+    ('reason',)
+)
+ADMISSION_REQUESTS = Gauge(
+    'identix_admission_requests',
+    'Requests holding (running) or waiting for (waiting) an extraction slot.',
+    ('state',)
+)
+HTTP_REQUESTS = Counter(
+    'identix_http_requests_total',
+    'Handled HTTP requests by method, route and status.',
+    ('method', 'endpoint', 'status')
+)
+HTTP_SECONDS = Histogram(
+    'identix_http_request_duration_seconds',
+    'HTTP request latency by route.',
+    ('endpoint',)
+)
+HTTP_IN_FLIGHT = Gauge(
+    'identix_http_requests_in_flight',
+    'HTTP requests currently being handled.'
+)
+
+def cache_lookup(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
@@ -0,0 +1,99 @@
+import base64
+import hashlib
+import json
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+
+def encode_cursor(key: Sequence) -> str:
+    """Encode a sort key as an opaque, URL-safe cursor."""
+    raw = json.dumps(list(key), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str, key_types: Optional[Sequence[type]] = None) -> Tuple:
+    """
+    Decode a cursor produced by encode_cursor. With key_types, the key must also have
+    one element of each of those types, so it compares with the sort key.
+    Raises ValueError if malformed.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(key, list):
+        raise ValueError("Invalid cursor")
+    if key_types is not None and (len(key) != len(key_types) or
+                                  not all(isinstance(k, t) for k, t in zip(key, key_types))):
+        raise ValueError("Invalid cursor")
+    return tuple(key)
+
+def parse_limit(value: Optional[str], default: int = DEFAULT_PAGE_LIMIT) -> int:
+    """Parse a ?limit= value, clamped to [1, MAX_PAGE_LIMIT]. Raises ValueError if not an integer."""
+    if value is None or value == '':
+        return default
+    try:
+        return max(1, min(int(value), MAX_PAGE_LIMIT))
+    except ValueError:
+        raise ValueError("Invalid limit")
+
+def paginate(items: List[Dict], key: Callable[[Dict], Tuple], limit: int,
+             cursor: Optional[str] = None, descending: bool = False) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Slice one page out of items, which must already be sorted by key.
+    Returns (page, next_cursor); next_cursor is None on the last page.
+    """
+    start = 0
+    if cursor:
+        after = decode_cursor(cursor)
+        # Binary search for the first item strictly past the cursor
+        lo, hi = 0, len(items)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_key = tuple(key(items[mid]))
+            past = mid_key < after if descending else mid_key > after
+            if past:
+                hi = mid
+            else:
+                lo = mid + 1
+        start = lo
+
+    page = items[start:start + limit]
+    has_more = start + limit < len(items)
+    next_cursor = encode_cursor(key(page[-1])) if page and has_more else None
+    return page, next_cursor
+
+def parse_fields(value: Optional[str]) -> Optional[List[str]]:
+    """Parse a ?fields=a,b,c projection; None means all fields."""
+    if not value:
+        return None
+    return [f.strip() for f in value.split(',') if f.strip()]
+
+def project(records: Iterable[Dict], fields: Optional[List[str]]) -> List[Dict]:
+    """Keep only the requested fields of each record."""
+    if fields is None:
+        return list(records)
+    return [{f: r[f] for f in fields if f in r} for r in records]
+
+def make_etag(version: int, *parts) -> str:
+    """
+    ETag (unquoted) derived from the store version and whatever else shapes the response,
+    e.g. the request path and query string.
+    """
+    digest = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:12]
+    return f"v{version}-{digest}"
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header value against an (unquoted) ETag."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate.strip('"') == etag:
+            return True
+    return False
@@ -0,0 +1,229 @@
+"""
+On-demand profiling of single HTTP requests.
+
+Off unless configured. A request is profiled when it either
+
+- carries the admin profiling token in the X-Profile header
+  (IDENTIX_PROFILE_TOKEN; X-Profile-Mode picks the profiler), or
+- is the N-th request since the last sampled one (IDENTIX_PROFILE_SAMPLE=N).
+
+Two profilers:
+
+- cprofile: deterministic, every call of the request's thread (.prof, open
+  with `python -m pstats` or snakeviz),
+- sampling: the request's stack every SAMPLE_INTERVAL seconds, in folded-stack
+  format (.folded, open with flamegraph.pl or speedscope). Cheaper, and
+  optionally covers every thread of the process.
+
+Extraction runs in the worker pool's processes, which neither profiler sees;
+the pipeline's stage timings (wall and CPU per stage, wherever it ran) are
+saved next to each profile to cover them. Each profile is a .json summary plus
+the profiler output under IDENTIX_PROFILE_DIR, keeping the newest
+IDENTIX_PROFILE_KEEP profiles.
+"""
+
+import contextvars
+import cProfile
+import hmac
+import io
+import itertools
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from utils import serialization
+
+PROFILE_HEADER = 'X-Profile'
+MODE_HEADER = 'X-Profile-Mode'
+PROFILE_DIR = os.environ.get('IDENTIX_PROFILE_DIR', 'data/profiles')
+PROFILE_TOKEN = os.environ.get('IDENTIX_PROFILE_TOKEN', '')
+# Profile one request in every SAMPLE_EVERY (0: only on request)
+SAMPLE_EVERY = int(os.environ.get('IDENTIX_PROFILE_SAMPLE', 0))
+DEFAULT_MODE = os.environ.get('IDENTIX_PROFILE_MODE', 'cprofile')
+KEEP = int(os.environ.get('IDENTIX_PROFILE_KEEP', 50))
+MODES = ('cprofile', 'sampling')
+# The profile listing itself is never profiled
+PROFILES_ROUTE = '/api/profiles'
+SAMPLE_INTERVAL = 0.005
+# Functions listed in the summary, by cumulative time
+TOP_FUNCTIONS = 25
+
+_NAME = re.compile(r'^[\w.-]+$')
+_requests = itertools.count(1)
+_current = contextvars.ContextVar('identix_profile', default=None)
+
+def authorized(token: Optional[str]) -> bool:
+    """Whether token is the configured profiling token (never true when none is configured)."""
+    return bool(PROFILE_TOKEN) and bool(token) and hmac.compare_digest(token, PROFILE_TOKEN)
+
+def requested_mode(token: Optional[str], mode: Optional[str]) -> Optional[str]:
+    """Profiler to run for a request with these header values, or None to not profile it."""
+    if authorized(token):
+        return mode if mode in MODES else DEFAULT_MODE
+    if SAMPLE_EVERY > 0 and next(_requests) % SAMPLE_EVERY == 0:
+        return DEFAULT_MODE
+    return None
+
+# ============ PROFILERS ============
+
+class _Sampler:
+    """Folded stacks of one thread (or all but itself) sampled on a background thread."""
+    def __init__(self, thread_id: Optional[int]):
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='identix-profiler', daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            frames = sys._current_frames()
+            targets = [self.thread_id] if self.thread_id is not None else [t for t in frames if t != own]
+            for thread_id in targets:
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if stack:
+                    self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+class RequestProfile:
+    """Profiler, stage timeline and metadata of one request."""
+    def __init__(self, mode: str, method: str, path: str, trigger: str, all_threads: bool = False):
+        self.mode = mode
+        self.id = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.info = {"id": self.id, "mode": mode, "method": method, "path": path, "trigger": trigger,
+                     "started_at": datetime.now().isoformat()}
+        self.timeline = []
+        self.all_threads = all_threads
+        self._profiler = None
+        self._token = None
+
+    def start(self) -> 'RequestProfile':
+        self._token = _current.set(self)
+        self._start = time.perf_counter()
+        if self.mode == 'sampling':
+            self._profiler = _Sampler(None if self.all_threads else threading.get_ident())
+            self._profiler.start()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return self
+
+    def note(self, pipeline: str, timings: Dict) -> None:
+        self.timeline.append({"pipeline": pipeline, "at_ms": round((time.perf_counter() - self._start) * 1000, 3),
+                              "stages": timings})
+
+    def stop(self, status: Optional[int]) -> Optional[str]:
+        """Stop profiling, save the profile and return its name (None if it could not be written)."""
+        wall_ms = round((time.perf_counter() - self._start) * 1000, 3)
+        if self.mode == 'sampling':
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # Stopped from another context than the one it started in; nothing left to reset there
+            pass
+        self.info.update(status=status, wall_ms=wall_ms, timeline=self.timeline)
+        try:
+            return self._save()
+        except OSError as e:
+            print(f"Could not save profile {self.id}: {e}")
+            return None
+
+    def _save(self) -> str:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, self.id)
+        if self.mode == 'sampling':
+            data_file = self.id + '.folded'
+            with open(base + '.folded', 'w') as f:
+                f.write(self._profiler.folded())
+            self.info['samples'] = self._profiler.samples
+            self.info['top_stacks'] = [{"stack": s, "samples": n} for s, n in self._profiler.stacks.most_common(10)]
+        else:
+            data_file = self.id + '.prof'
+            self._profiler.dump_stats(base + '.prof')
+            text = io.StringIO()
+            pstats.Stats(self._profiler, stream=text).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+            self.info['top_functions'] = text.getvalue()
+        self.info['file'] = data_file
+        with open(base + '.json', 'wb') as f:
+            f.write(serialization.dumps(self.info, indent=True))
+        _rotate()
+        return self.id
+
+def begin(method: str, path: str, token: Optional[str], mode: Optional[str],
+          all_threads: bool = False) -> Optional[RequestProfile]:
+    """Start profiling this request if it asked for it or is sampled; None otherwise."""
+    if path.startswith(PROFILES_ROUTE):
+        return None
+    chosen = requested_mode(token, mode)
+    if chosen is None:
+        return None
+    if chosen == 'cprofile' and sys.getprofile() is not None:
+        # One deterministic profiler per thread: a concurrent request on this thread (async servers) already has it
+        chosen = 'sampling'
+    return RequestProfile(chosen, method, path, 'header' if authorized(token) else 'sampled', all_threads).start()
+
+def note_timings(pipeline: str, timings: Dict) -> None:
+    """Add a pipeline's stage timings to the timeline of the request being profiled, if any."""
+    profile = _current.get()
+    if profile is not None:
+        profile.note(pipeline, timings)
+
+# ============ STORED PROFILES ============
+
+def _rotate() -> None:
+    """Delete all but the newest KEEP profiles."""
+    summaries = sorted((name for name in os.listdir(PROFILE_DIR) if name.endswith('.json')), reverse=True)
+    for name in summaries[KEEP:]:
+        stem = name[:-len('.json')]
+        for suffix in ('.json', '.prof', '.folded'):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, stem + suffix))
+            except FileNotFoundError:
+                pass
+
+def list_profiles() -> List[Dict]:
+    """Summaries of the stored profiles, newest first (without the per-function detail)."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted((n for n in os.listdir(PROFILE_DIR) if n.endswith('.json')), reverse=True):
+        try:
+            info = serialization.load_file(os.path.join(PROFILE_DIR, name))
+        except (OSError, ValueError):
+            continue
+        profiles.append({key: info.get(key) for key in
+                         ('id', 'mode', 'method', 'path', 'trigger', 'started_at', 'status', 'wall_ms', 'file')})
+    return profiles
+
+def profile_file(name: str) -> Optional[str]:
+    """Path of a stored profile file (<id>.json, .prof or .folded), or None. Rejects anything else."""
+    if not _NAME.match(name) or not name.endswith(('.json', '.prof', '.folded')):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
@@ -0,0 +1,61 @@
+"""
+JSON encoding for the data store and API responses.
+
+Uses orjson when it is installed, which encodes and parses several times
+faster than the standard library, and falls back to the json module
+otherwise; both produce the same JSON. NumPy arrays and scalars are encoded
+natively, so callers hand them over without .tolist().
+"""
+
+import json
+from datetime import date, datetime
+from typing import Any, Union
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+def _default(obj):
+    """Types neither backend encodes on its own (orjson only takes contiguous numeric arrays)."""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(obj: Any, indent: bool = False, sort_keys: bool = False) -> bytes:
+    """Encode obj as UTF-8 JSON; compact unless indent is set."""
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=_default, option=option)
+    return json.dumps(
+        obj, default=_default, ensure_ascii=False, sort_keys=sort_keys,
+        indent=2 if indent else None, separators=None if indent else (',', ':')
+    ).encode('utf-8')
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Decode JSON from bytes or str."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dump_file(obj: Any, path: str) -> None:
+    """Write obj to path as compact JSON."""
+    with open(path, 'wb') as f:
+        f.write(dumps(obj))
+
+def load_file(path: str) -> Any:
+    """Read a JSON file."""
+    with open(path, 'rb') as f:
+        return loads(f.read())
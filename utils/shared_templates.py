@@ -0,0 +1,152 @@
+"""
+Template store published in shared memory.
+
+Every server process (gunicorn workers, uvicorn workers) matches against the
+same gallery, so instead of each one loading templates.npz into its own heap
+the arrays are published once into a shared memory segment and attached as
+read-only NumPy views.
+
+Layout:
+    header segment  "<SHM_NAME>"            uint64 magic, uint64 current version
+    data segment    "<SHM_NAME>_<version>"  uint64 descriptor length, JSON
+                                            descriptor, then the arrays at
+                                            64-byte aligned offsets
+
+A writer fills a fresh data segment and then stores its version in the header;
+that single aligned 8-byte store is the switch, so readers see either the old
+gallery or the new one, never a mix. Segments outlive the process that created
+them (like templates.npz itself); call unlink() to remove them.
+"""
+
+import json
+import os
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Tuple
+
+import numpy as np
+
+SHM_NAME = os.environ.get('IDENTIX_GALLERY_SHM', 'identix_gallery')
+ENABLED = os.environ.get('IDENTIX_SHARED_GALLERY', '1').lower() not in ('0', 'false', 'no')
+
+MAGIC = 0x49445458474C5259  # "IDTXGLRY"
+ALIGNMENT = 64
+
+_header = None
+
+def _open(name: str, create: bool = False, size: int = 0) -> shared_memory.SharedMemory:
+    """
+    Open a segment without handing it to the resource tracker, which would
+    otherwise destroy it when whichever process touched it first exits.
+    """
+    shm = shared_memory.SharedMemory(name, create=create, size=size)
+    if os.name == 'posix':
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+def _segment_name(version: int) -> str:
+    return f"{SHM_NAME}_{version}"
+
+def _header_view() -> np.ndarray:
+    """[magic, version] of the header segment, creating it on first use."""
+    global _header
+    if _header is None:
+        try:
+            _header = _open(SHM_NAME, create=True, size=16)
+            view = np.ndarray((2,), dtype=np.uint64, buffer=_header.buf)
+            view[1] = 0
+            view[0] = MAGIC
+        except FileExistsError:
+            _header = _open(SHM_NAME)
+    view = np.ndarray((2,), dtype=np.uint64, buffer=_header.buf)
+    if view[0] != MAGIC:
+        raise RuntimeError(f"Shared memory segment {SHM_NAME} is not an IDentix gallery header")
+    return view
+
+def current_version() -> int:
+    """Version currently published (0 if nothing has been published yet)."""
+    return int(_header_view()[1])
+
+def publish(templates: Dict[str, np.ndarray], source_stamp: int = 0) -> int:
+    """
+    Publish templates as a new version and switch readers to it.
+    source_stamp identifies the templates.npz write this was built from.
+    Returns the published version.
+    """
+    header = _header_view()
+    arrays = {key: np.ascontiguousarray(value) for key, value in templates.items()}
+
+    descriptor = {"source_stamp": int(source_stamp), "arrays": {}}
+    offset = 0
+    for key, array in arrays.items():
+        descriptor['arrays'][key] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    encoded = json.dumps(descriptor).encode()
+    data_start = -(-(8 + len(encoded)) // ALIGNMENT) * ALIGNMENT
+
+    # Another process may be publishing at the same time; take the next free version
+    version = int(header[1]) + 1
+    while True:
+        try:
+            shm = _open(_segment_name(version), create=True, size=data_start + max(offset, ALIGNMENT))
+            break
+        except FileExistsError:
+            version += 1
+
+    np.ndarray((1,), dtype=np.uint64, buffer=shm.buf)[0] = len(encoded)
+    shm.buf[8:8 + len(encoded)] = encoded
+    for key, array in arrays.items():
+        start = data_start + descriptor['arrays'][key]['offset']
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf, offset=start)[...] = array
+    shm.close()
+
+    previous = int(header[1])
+    if version < previous:
+        # A newer version was published meanwhile; ours is already stale
+        _unlink_segment(version)
+        return previous
+    header[1] = version
+    if previous:
+        # Attached readers keep their mapping; only the name goes away
+        _unlink_segment(previous)
+    return version
+
+def attach(version: int) -> Tuple[Dict[str, np.ndarray], int, shared_memory.SharedMemory]:
+    """
+    Attach a published version zero-copy.
+    Returns (templates as read-only views, source_stamp, segment). The segment
+    must stay open while the views are in use.
+    """
+    shm = _open(_segment_name(version))
+    length = int(np.ndarray((1,), dtype=np.uint64, buffer=shm.buf)[0])
+    descriptor = json.loads(bytes(shm.buf[8:8 + length]))
+    data_start = -(-(8 + length) // ALIGNMENT) * ALIGNMENT
+
+    templates = {}
+    for key, spec in descriptor['arrays'].items():
+        view = np.ndarray(tuple(spec['shape']), dtype=np.dtype(spec['dtype']),
+                          buffer=shm.buf, offset=data_start + spec['offset'])
+        view.flags.writeable = False
+        templates[key] = view
+    return templates, descriptor['source_stamp'], shm
+
+def _unlink(shm: shared_memory.SharedMemory) -> None:
+    shm.close()
+    if os.name == 'posix':
+        # unlink() also unregisters from the tracker; register first to keep it balanced
+        resource_tracker.register(shm._name, 'shared_memory')
+    shm.unlink()
+
+def _unlink_segment(version: int) -> None:
+    try:
+        _unlink(_open(_segment_name(version)))
+    except FileNotFoundError:
+        pass
+
+def unlink() -> None:
+    """Remove the published gallery and its header (e.g. when decommissioning a host)."""
+    global _header
+    version = current_version()
+    if version:
+        _unlink_segment(version)
+    _unlink(_header)
+    _header = None
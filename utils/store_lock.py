@@ -0,0 +1,69 @@
+"""
+Exclusive lock around every read-modify-write of the data store.
+
+database.json and templates.npz are each loaded, changed and written back
+whole, so two writers running at once (enrollment jobs, a bulk import, several
+server processes) would hand out the same IDs and overwrite each other's
+changes. Writers hold this lock for the whole load-modify-save; readers need
+no lock because both files are swapped in atomically.
+
+The lock is a file lock (flock, or msvcrt on Windows), so it holds across
+processes, and is reentrant within a thread, so locked functions can call
+each other.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+LOCK_PATH = os.environ.get('IDENTIX_STORE_LOCK', 'data/.store.lock')
+
+_thread_lock = threading.RLock()
+_state = threading.local()
+
+def _acquire(f) -> None:
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    else:
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                # LK_LOCK gives up after about ten seconds; keep waiting
+                continue
+
+def _release(f) -> None:
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+@contextmanager
+def locked():
+    """Hold the store lock for the duration of the block."""
+    with _thread_lock:
+        depth = getattr(_state, 'depth', 0)
+        if depth == 0:
+            os.makedirs(os.path.dirname(LOCK_PATH) or '.', exist_ok=True)
+            _state.file = open(LOCK_PATH, 'a+b')
+            try:
+                _acquire(_state.file)
+            except BaseException:
+                _state.file.close()
+                raise
+        _state.depth = depth + 1
+        try:
+            yield
+        finally:
+            _state.depth -= 1
+            if _state.depth == 0:
+                _release(_state.file)
+                _state.file.close()
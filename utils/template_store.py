@@ -0,0 +1,128 @@
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils import shared_templates, store_lock
+
+TEMPLATES_PATH = 'data/templates.npz'
+
+# Keys stored in the template archive. Persons without a given modality keep a
+# zero row in that matrix and a False entry in the matching mask.
+TEMPLATE_KEYS = ('person_ids', 'face', 'face_mask', 'voice', 'voice_mask', 'admin_face')
+
+def initialize_templates() -> Dict[str, np.ndarray]:
+    """Initialize empty template store."""
+    return {
+        "person_ids": np.array([], dtype=str),
+        "face": np.zeros((0, 0)),
+        "face_mask": np.zeros(0, dtype=bool),
+        "voice": np.zeros((0, 0)),
+        "voice_mask": np.zeros(0, dtype=bool),
+        "admin_face": np.zeros(0)
+    }
+
+def load_templates() -> Dict[str, np.ndarray]:
+    """Load biometric templates from the binary template store."""
+    if not os.path.exists(TEMPLATES_PATH):
+        return initialize_templates()
+
+    with np.load(TEMPLATES_PATH, allow_pickle=False) as archive:
+        return {key: archive[key] for key in TEMPLATE_KEYS}
+
+def save_templates(templates: Dict[str, np.ndarray]) -> None:
+    """Save biometric templates to the binary template store."""
+    os.makedirs(os.path.dirname(TEMPLATES_PATH), exist_ok=True)
+    # Write next to the target and swap in, so readers never see a partial file
+    tmp_path = TEMPLATES_PATH + '.tmp.npz'
+    np.savez(tmp_path, **{key: templates[key] for key in TEMPLATE_KEYS})
+    os.replace(tmp_path, TEMPLATES_PATH)
+
+    # Switch every server process to the new templates right away
+    if shared_templates.ENABLED:
+        try:
+            shared_templates.publish({key: templates[key] for key in TEMPLATE_KEYS}, store_stamp())
+        except Exception as e:
+            print(f"Could not publish templates to shared memory: {e}")
+
+def store_stamp() -> int:
+    """Modification stamp of the template store file (0 if there is none)."""
+    if not os.path.exists(TEMPLATES_PATH):
+        return 0
+    return os.stat(TEMPLATES_PATH).st_mtime_ns
+
+def _put_row(matrix: np.ndarray, mask: np.ndarray, index: int, vector) -> np.ndarray:
+    """Write one template row, widening an empty matrix to the vector's dimension."""
+    if vector is None or len(vector) == 0:
+        return matrix
+    vector = np.asarray(vector, dtype=np.float64)
+    if matrix.shape[1] == 0:
+        matrix = np.zeros((matrix.shape[0], vector.shape[0]))
+    matrix[index] = vector
+    mask[index] = True
+    return matrix
+
+def set_person_templates(templates: Dict[str, np.ndarray], person_id: str,
+                         face_embedding=None, voice_mfcc=None) -> Dict[str, np.ndarray]:
+    """Insert or replace the templates of one person (in memory)."""
+    ids = templates['person_ids']
+    matches = np.flatnonzero(ids == person_id)
+
+    if len(matches) > 0:
+        index = int(matches[0])
+    else:
+        index = len(ids)
+        templates['person_ids'] = np.append(ids, person_id)
+        for key in ('face', 'voice'):
+            matrix = templates[key]
+            templates[key] = np.vstack([matrix, np.zeros((1, matrix.shape[1]))])
+            templates[f'{key}_mask'] = np.append(templates[f'{key}_mask'], False)
+
+    templates['face'] = _put_row(templates['face'], templates['face_mask'], index, face_embedding)
+    templates['voice'] = _put_row(templates['voice'], templates['voice_mask'], index, voice_mfcc)
+    return templates
+
+def append_person_templates(templates: Dict[str, np.ndarray], entries: List[Tuple]) -> Dict[str, np.ndarray]:
+    """
+    Append many new persons (in memory) from (person_id, face_embedding, voice_mfcc) entries.
+    Grows each matrix once instead of once per person; IDs already present are replaced in place.
+    """
+    existing = set(str(i) for i in templates['person_ids'])
+    new = [entry for entry in entries if entry[0] not in existing]
+    for entry in entries:
+        if entry[0] in existing:
+            set_person_templates(templates, *entry)
+
+    start = len(templates['person_ids'])
+    templates['person_ids'] = np.append(templates['person_ids'], [entry[0] for entry in new])
+    for key, position in (('face', 1), ('voice', 2)):
+        vectors = [entry[position] for entry in new]
+        matrix = templates[key]
+        dim = matrix.shape[1] or next((len(v) for v in vectors if v is not None and len(v) > 0), 0)
+        grown = np.zeros((start + len(new), dim))
+        grown[:start, :matrix.shape[1]] = matrix
+        mask = np.append(templates[f'{key}_mask'], np.zeros(len(new), dtype=bool))
+        for offset, vector in enumerate(vectors):
+            grown = _put_row(grown, mask, start + offset, vector)
+        templates[key] = grown
+        templates[f'{key}_mask'] = mask
+    return templates
+
+def add_person_templates(person_id: str, face_embedding=None, voice_mfcc=None) -> None:
+    """Store the templates of one person."""
+    with store_lock.locked():
+        templates = load_templates()
+        set_person_templates(templates, person_id, face_embedding, voice_mfcc)
+        save_templates(templates)
+
+def set_admin_template(face_embedding) -> None:
+    """Store the admin face template."""
+    with store_lock.locked():
+        templates = load_templates()
+        templates['admin_face'] = np.asarray(face_embedding, dtype=np.float64)
+        save_templates(templates)
+
+def get_admin_template() -> Optional[np.ndarray]:
+    """Get the admin face template, if one is enrolled."""
+    admin_face = load_templates()['admin_face']
+    return admin_face if admin_face.size > 0 else None